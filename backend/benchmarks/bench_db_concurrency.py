@@ -0,0 +1,201 @@
+# File: backend/benchmarks/bench_db_concurrency.py
+
+# Do consumers and workers block each other on the database?
+#
+# Runs what each side does to the database at the same time, for --duration
+# seconds:
+#   workers    --writers processes, each upserting --batch results into the
+#              index in a loop (index_results, as after every scrape)
+#   consumers  --readers concurrent index searches in one event loop, going
+#              through sync_to_async on one thread the way Daphne does
+# and reports the latency and the failures ("database is locked") of both.
+#
+# The database comes from the usual DB_* settings (see settings.py). For
+# SQLite it defaults to a fresh file in the temp folder; --legacy runs it
+# with the pre-WAL settings (rollback journal, deferred transactions, 5 s
+# timeout) for comparison. For Postgres point DB_NAME at a scratch database:
+# the script migrates it, and removes its bench site and rows at the end.
+#
+# Run from the backend folder:
+#   python benchmarks/bench_db_concurrency.py --legacy --output benchmarks/results/db-legacy.json
+#   python benchmarks/bench_db_concurrency.py --compare benchmarks/results/db-legacy.json
+#   DB_ENGINE=postgres DB_NAME=scraper_bench python benchmarks/bench_db_concurrency.py
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench_pipeline import RESULTS_DIR, compare, git_commit, print_stats, summarize  # noqa: E402
+
+WORDS = [
+    'dune', 'part', 'two', 'oppenheimer', 'interstellar', 'prisoners', 'arrival', 'sicario',
+    'blade', 'runner', 'enemy', 'incendies', 'polytechnique', 'heat', 'collateral', 'alien',
+]
+SITE_NAME = 'DB concurrency bench'
+
+
+def configure(args):
+    """Sets the DB_* environment before Django starts; child processes inherit it."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+    if os.environ.get('DB_ENGINE', 'sqlite') == 'sqlite' and 'DB_NAME' not in os.environ:
+        path = Path(tempfile.gettempdir()) / 'scraper_db_bench.sqlite3'
+        for suffix in ('', '-wal', '-shm'):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+        os.environ['DB_NAME'] = str(path)
+    if args.legacy:
+        os.environ['DB_SQLITE_WAL'] = '0'
+
+
+def make_results(batch, pool_size):
+    """batch scraped results, some new and some already indexed."""
+    results = []
+    for _ in range(batch):
+        n = random.randrange(pool_size)
+        title = ' '.join(random.sample(WORDS, 3)) + f" {n}"
+        results.append({'title': title.title(), 'link': f"https://bench.example/{n}/", 'poster': ''})
+    return results
+
+
+def writer(site_id, duration, batch, queue):
+    """One worker process: upserts results until duration is over."""
+    import django
+    django.setup()
+    from scraper_api.index import index_results
+    from scraper_api.models import SiteSource
+
+    site = SiteSource.objects.get(id=site_id)
+    latencies, failures = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        results = make_results(batch, batch * 20)
+        started = time.perf_counter()
+        if index_results(site, results):
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures += 1
+    queue.put((latencies, failures))
+
+
+async def read_loop(site, duration, rows):
+    from asgiref.sync import sync_to_async
+    from django.db import DatabaseError
+    from scraper_api.index import matching_results
+
+    def search(term):
+        try:
+            return list(matching_results(term).filter(source_id=site.id).order_by('-last_seen')[:50])
+        except DatabaseError:
+            return None
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        hits = await sync_to_async(search)(' '.join(random.sample(WORDS, 2)))
+        rows.append((time.perf_counter() - started, hits is not None))
+
+
+async def run_readers(site, args):
+    rows = []
+    await asyncio.gather(*(read_loop(site, args.duration, rows) for _ in range(args.readers)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database contention between consumers and workers.')
+    parser.add_argument('--writers', type=int, default=4, help="Worker processes upserting results")
+    parser.add_argument('--readers', type=int, default=8, help="Concurrent consumer searches")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds")
+    parser.add_argument('--batch', type=int, default=60, help="Results per upsert")
+    parser.add_argument('--legacy', action='store_true', help="SQLite without WAL (the old settings)")
+    parser.add_argument('--output', type=Path, help="JSON file for the results")
+    parser.add_argument('--compare', type=Path, help="Earlier results JSON to compare with")
+    args = parser.parse_args()
+
+    configure(args)
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from scraper_api.index import index_results
+    from scraper_api.models import SiteSource
+
+    call_command('migrate', verbosity=0)
+    SiteSource.objects.filter(name=SITE_NAME).delete()
+    site = SiteSource.objects.create(
+        name=SITE_NAME, base_url='https://bench.example', search_endpoint='/?s=%QUERY%', is_active=False,
+        result_container_selector='article', result_title_selector='h2 a',
+        result_link_selector='h2 a', result_poster_selector='img',
+    )
+    index_results(site, make_results(args.batch * 20, args.batch * 20))
+    database = settings.DATABASES['default']
+    print(f"{connection.vendor} {database['NAME']} {database.get('OPTIONS') or ''}")
+    # Readers and writers open their own connections
+    connection.close()
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    writers = [
+        context.Process(target=writer, args=(site.id, args.duration, args.batch, queue))
+        for _ in range(args.writers)
+    ]
+    for process in writers:
+        process.start()
+    reads = asyncio.run(run_readers(site, args))
+    writes = [queue.get() for _ in writers]
+    for process in writers:
+        process.join()
+
+    write_latencies = [latency for latencies, _ in writes for latency in latencies]
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'args': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        'database': {'vendor': connection.vendor, 'options': {k: str(v) for k, v in (database.get('OPTIONS') or {}).items()}},
+        'scenarios': {
+            'consumers': {
+                'searches': len(reads),
+                'failures': sum(not ok for _, ok in reads),
+                'throughput_per_s': round(len(reads) / args.duration, 2),
+                'search_ms': summarize([latency for latency, ok in reads if ok]),
+            },
+            'workers': {
+                'upserts': len(write_latencies),
+                'failures': sum(failures for _, failures in writes),
+                'throughput_per_s': round(len(write_latencies) / args.duration, 2),
+                'upsert_ms': summarize(write_latencies),
+            },
+        },
+    }
+
+    for name, result in report['scenarios'].items():
+        count = result.get('searches', result.get('upserts'))
+        print(f"\n{name}: {count} ok, {result['failures']} failed, {result['throughput_per_s']} /s")
+        for key, stats in result.items():
+            if key.endswith('_ms'):
+                print_stats(key, stats)
+
+    SiteSource.objects.filter(id=site.id).delete()
+
+    output = args.output or RESULTS_DIR / f"db-concurrency-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# File: backend/benchmarks/bench_parsers.py
+
+# Side-by-side benchmark of the extraction backends in scraper_api/extraction.py
+# on the saved HTML fixtures in benchmarks/fixtures/.
+#
+# Run from the backend folder:
+#   python benchmarks/bench_parsers.py
+#   python benchmarks/bench_parsers.py --repeat 200
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from scraper_api.extraction import PARSER_BACKENDS, compile_plan  # noqa: E402
+
+
+# SiteSource defaults for fields the fixtures don't set
+SITE_DEFAULTS = {
+    'max_pages': 1,
+    'page_url_template': '',
+    'next_page_selector': '',
+}
+
+
+def load_fixtures():
+    """Yields (fixture name, fake SiteSource, html) for every configured fixture."""
+    configs = json.loads((FIXTURES_DIR / 'sites.json').read_text())
+    for filename, config in configs.items():
+        site = SimpleNamespace(id=filename, updated_at=None, **{**SITE_DEFAULTS, **config})
+        yield filename, site, (FIXTURES_DIR / filename).read_text()
+
+
+def bench(plan, html, repeat):
+    """Best and mean milliseconds per extract() call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan.extract(html)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    for filename, site, html in load_fixtures():
+        print(f"\n{filename} ({len(html) / 1024:.0f} KB)")
+        results = {}
+        means = {}
+        # bs4 (the original html.parser path) first, as the baseline
+        for backend in sorted(PARSER_BACKENDS, key=lambda name: name != 'bs4'):
+            plan = compile_plan(site, backend)
+            results[backend] = plan.extract(html)
+            best, means[backend] = bench(plan, html, args.repeat)
+            print(f"  {backend:<5} {len(results[backend]):>4} results  best {best:7.2f} ms  "
+                  f"mean {means[backend]:7.2f} ms  ({means['bs4'] / means[backend]:4.1f}x)")
+
+        for backend in PARSER_BACKENDS:
+            if results[backend] != results['bs4']:
+                print(f"  WARNING: {backend} results differ from bs4")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,549 @@
+# File: backend/benchmarks/bench_pipeline.py
+
+# Offline benchmark / load test of the scrape and delivery pipeline.
+#
+# The sites and FlareSolverr are replaced by local servers replaying the
+# fixtures in benchmarks/fixtures/ (see fake_servers.py), with configurable
+# latency, bandwidth and failures. Every fixture becomes one SiteSource per
+# kind (a GET page, a POST JSON API, a FlareSolverr site, and a GET page
+# rendered by the Playwright pool if Playwright is installed),
+# --sites-per-kind times, each on its own port. Scenarios:
+#   fetch   get_page_html + parse_results per site, --concurrency at a time
+#   scrape  the scrape_site task, timed to its first and last results
+#           message on the channel layer
+#   ws      --clients concurrent WebSocket searches against SearchConsumer
+#           (in process, through the ASGI app), timed to the first and last
+#           results frame, with the bytes sent in --wire format
+# The Celery jobs the consumer sends run in this process instead of on a
+# broker (InlineWorkers below), --workers at a time, so the numbers don't
+# depend on how many workers happen to be running. Priorities are ignored.
+#
+# Needs a local Redis: everything uses BENCH_REDIS_URL (default db 15),
+# which is emptied first (see bench_settings.py). Nothing leaves the machine.
+#
+# Run from the backend folder:
+#   python benchmarks/bench_pipeline.py
+#   python benchmarks/bench_pipeline.py --scenario ws --clients 50 --searches 200 --latency 0.3
+#   python benchmarks/bench_pipeline.py --scenario ws --wire msgpack --compare benchmarks/results/ws-json.json
+#   python benchmarks/bench_pipeline.py --mode async_fanout --compare benchmarks/results/before.json
+# Results are written to benchmarks/results/pipeline-<time>.json (or --output).
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fake_servers import FIXTURES_DIR, FakeFlareSolverr, FakeSiteServer, Faults, load_fixture_pages  # noqa: E402
+
+KINDS = ('get', 'post', 'flaresolverr', 'playwright')
+DEFAULT_KINDS = [kind for kind in KINDS if kind != 'playwright' or importlib.util.find_spec('playwright')]
+
+
+# --- Stats ---
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(seconds):
+    """count/mean/p50/p95/p99/max in milliseconds."""
+    values = sorted(value * 1000 for value in seconds)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 2),
+        'p50': round(percentile(values, 0.50), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+        'max': round(values[-1], 2),
+    }
+
+
+def print_stats(label, stats):
+    if not stats.get('count'):
+        print(f"  {label:<22} -")
+        return
+    print(f"  {label:<22} p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms  max {stats['max']:8.1f} ms")
+
+
+# --- Setup ---
+
+def start_servers(args, pages):
+    faults = Faults(args.latency, args.jitter, args.bandwidth, args.failure_rate, args.failure_mode)
+    flaresolverr_faults = Faults(args.solve_time, args.jitter, 0, args.failure_rate, args.failure_mode)
+    sites = {}
+    for fixture in pages:
+        for kind in args.kinds:
+            for n in range(args.sites_per_kind):
+                sites[(fixture, kind, n)] = FakeSiteServer(faults, pages).start()
+    return sites, FakeFlareSolverr(flaresolverr_faults, pages).start()
+
+
+def setup_django(args, flaresolverr):
+    """Points the project at the fake servers and the throwaway database + Redis."""
+    os.environ['SCRAPER_FLARESOLVERR_URL'] = flaresolverr.api_url
+    if args.mode:
+        os.environ['SCRAPER_EXECUTION_MODE'] = args.mode
+    if args.parser:
+        os.environ['SCRAPER_PARSER_BACKEND'] = args.parser
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.bench_settings')
+
+    import django
+    django.setup()
+
+    import redis
+    from django.conf import settings
+    from django.core.management import call_command
+
+    shutil.rmtree(settings.BENCH_DIR, ignore_errors=True)
+    settings.BENCH_DIR.mkdir(parents=True)
+    call_command('migrate', verbosity=0)
+    redis.Redis.from_url(settings.BENCH_REDIS_URL).flushdb()
+
+
+def create_sites(servers):
+    """One SiteSource per fake server, configured like its fixture in sites.json."""
+    from scraper_api.models import SiteSource
+
+    configs = json.loads((FIXTURES_DIR / 'sites.json').read_text())
+    sites = []
+    for (fixture, kind, n), server in servers.items():
+        config = dict(configs[fixture], name=f"{configs[fixture]['name']} [{kind} {n + 1}]")
+        config['base_url'] = server.site_url(fixture)
+        if kind == 'post':
+            config.update(search_type='POST', search_endpoint='/search', post_payload_template='{"s": "%QUERY%"}')
+        else:
+            config.update(search_type='GET', search_endpoint='/?s=%QUERY%')
+        config['renderer'] = kind if kind in ('flaresolverr', 'playwright') else 'none'
+        site = SiteSource.objects.create(**config)
+        site.kind = kind
+        sites.append(site)
+    return sites
+
+
+class InlineWorkers:
+    """
+    Stands in for the Celery workers: the jobs dispatch_scrapes sends run in
+    this process, at most size at a time.
+    """
+
+    def __init__(self, size):
+        self.slots = asyncio.Semaphore(size)
+        self.jobs = set()
+        self.failures = 0
+
+    def install(self):
+        from scraper_api import tasks
+
+        for task in (tasks.scrape_site, tasks.scrape_search):
+            task.apply_async = partial(self.submit, task)
+
+    def submit(self, task, args, kwargs=None, **options):
+        job = asyncio.ensure_future(self.run(task, args, kwargs or {}))
+        self.jobs.add(job)
+        job.add_done_callback(self.jobs.discard)
+
+    async def run(self, task, args, kwargs):
+        from asgiref.sync import sync_to_async
+
+        async with self.slots:
+            try:
+                await sync_to_async(task.run, thread_sensitive=False)(*args, **kwargs)
+            except Exception as e:
+                self.failures += 1
+                print(f"[Bench] {task.name} failed: {e}")
+
+    async def drain(self):
+        while self.jobs:
+            await asyncio.gather(*self.jobs)
+
+
+def by_kind(sites, rows, build):
+    """build(rows) for all rows, and for each site kind's rows."""
+    kinds = {site.id: site.kind for site in sites}
+    report = {'all': build(rows)}
+    for kind in sorted(set(kinds.values())):
+        report[kind] = build([row for row in rows if kinds[row['site']] == kind])
+    return report
+
+
+# --- Scenarios ---
+
+def bench_fetch(sites, args):
+    """get_page_html + parse_results, the non-streaming path of both modes."""
+    from scraper_api.resilience import get_site_health
+    from scraper_api.scraping import parse_results
+    from scraper_api.tasks import get_page_html
+
+    def fetch(site, term):
+        started = time.perf_counter()
+        html = get_page_html(site, term, get_site_health(site))
+        fetched = time.perf_counter()
+        results = parse_results(site, html) if html else None
+        return {
+            'site': site.id,
+            'fetch': fetched - started,
+            'parse': time.perf_counter() - fetched,
+            'results': len(results) if results is not None else None,
+        }
+
+    jobs = [(site, f"bench fetch {i}") for i in range(args.iterations) for site in sites]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        rows = list(pool.map(lambda job: fetch(*job), jobs))
+    wall = time.perf_counter() - started
+
+    def build(rows):
+        ok = [row for row in rows if row['results'] is not None]
+        return {
+            'requests': len(rows),
+            'failures': len(rows) - len(ok),
+            'results_per_page': round(sum(row['results'] for row in ok) / len(ok), 1) if ok else 0,
+            'fetch_ms': summarize([row['fetch'] for row in ok]),
+            'parse_ms': summarize([row['parse'] for row in ok]),
+            'first_result_ms': summarize([row['fetch'] + row['parse'] for row in ok]),
+        }
+
+    report = by_kind(sites, rows, build)
+    report['wall_s'] = round(wall, 3)
+    report['throughput_per_s'] = round(len(rows) / wall, 2)
+    return report
+
+
+async def scrape_once(layer, site, term, run):
+    """Runs scrape_site for one site and times the results messages it sends."""
+    from scraper_api.cancellation import end_search, start_search
+
+    channel = await layer.new_channel()
+    await start_search(channel, uuid.uuid4().hex, term)
+    row = {'site': site.id, 'first': None, 'last': None, 'results': 0, 'errors': 0}
+
+    started = time.perf_counter()
+    scrape = asyncio.ensure_future(run(site.id, term, channel, time.time()))
+    receive = None
+    while True:
+        receive = receive or asyncio.ensure_future(layer.receive(channel))
+        await asyncio.wait({scrape, receive}, return_when=asyncio.FIRST_COMPLETED)
+        if not receive.done():
+            # The scrape is over; anything it sent is already in the layer
+            try:
+                await asyncio.wait_for(receive, 0.2)
+            except asyncio.TimeoutError:
+                break
+        message, receive = receive.result(), None
+        elapsed = time.perf_counter() - started
+        if message['type'] == 'send_error_message':
+            row['errors'] += 1
+            continue
+        if message['type'] != 'send_search_results':
+            # Progress events (see progress.py) carry no results
+            continue
+        row['results'] += len(message['results'])
+        row['first'] = row['first'] if row['first'] is not None else elapsed
+        row['last'] = elapsed
+
+    await scrape
+    row['total'] = time.perf_counter() - started
+    await end_search(channel)
+    return row
+
+
+async def bench_scrape(sites, args):
+    """The whole scrape_site task: fetch, parse, cache, index, send."""
+    from asgiref.sync import sync_to_async
+    from channels.layers import get_channel_layer
+    from scraper_api.tasks import scrape_site
+
+    layer = get_channel_layer()
+    run = sync_to_async(scrape_site.run, thread_sensitive=False)
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def limited(site, term):
+        async with slots:
+            return await scrape_once(layer, site, term, run)
+
+    started = time.perf_counter()
+    rows = await asyncio.gather(*(
+        limited(site, f"bench scrape {i}") for i in range(args.iterations) for site in sites
+    ))
+    wall = time.perf_counter() - started
+
+    def build(rows):
+        ok = [row for row in rows if row['first'] is not None]
+        return {
+            'scrapes': len(rows),
+            'failures': len(rows) - len(ok),
+            'results_per_scrape': round(sum(row['results'] for row in ok) / len(ok), 1) if ok else 0,
+            'first_result_ms': summarize([row['first'] for row in ok]),
+            'last_result_ms': summarize([row['last'] for row in ok]),
+            'total_ms': summarize([row['total'] for row in rows]),
+        }
+
+    report = by_kind(sites, rows, build)
+    report['wall_s'] = round(wall, 3)
+    report['throughput_per_s'] = round(len(rows) / wall, 2)
+    return report
+
+
+class WireDecoder:
+    """Reads scraper.msgpack.v1 frames, like frontend/src/wire.js (see scraper_api/wire.py)."""
+
+    def __init__(self):
+        self.strings = []
+
+    def expand(self, value, key=None):
+        from scraper_api.wire import INTERNED_FIELDS, URL_FIELDS
+
+        if isinstance(value, dict):
+            return {k: self.expand(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            if key in URL_FIELDS and len(value) == 2 and isinstance(value[0], int):
+                return self.strings[value[0]] + value[1]
+            return [self.expand(item) for item in value]
+        if key in INTERNED_FIELDS and isinstance(value, int):
+            return self.strings[value]
+        return value
+
+    def decode(self, frame):
+        import msgpack
+
+        body = zlib.decompress(frame[1:]) if frame[:1] == b'\x01' else frame[1:]
+        packed = msgpack.unpackb(body, raw=False)
+        self.strings.extend(packed['d'])
+        return self.expand(packed['m'])
+
+
+async def search_once(application, term, args):
+    """
+    One WebSocket search, until its search_complete frame (or no frame
+    for --idle seconds).
+    """
+    from channels.testing import WebsocketCommunicator
+    from scraper_api.wire import JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL
+
+    subprotocol = MSGPACK_SUBPROTOCOL if args.wire == 'msgpack' else JSON_SUBPROTOCOL
+    communicator = WebsocketCommunicator(
+        application, '/ws/search/', headers=[(b'host', b'localhost:8000')], subprotocols=[subprotocol]
+    )
+    connected, accepted = await communicator.connect()
+    row = {'first': None, 'last': None, 'cards': 0, 'updates': 0, 'errors': 0, 'timed_out': False, 'bytes': 0}
+    if not connected:
+        row['errors'] += 1
+        return row
+    if accepted != subprotocol:
+        raise RuntimeError(f"Asked for {subprotocol}, the server picked {accepted}")
+    decoder = WireDecoder()
+
+    started = time.perf_counter()
+    await communicator.send_json_to({'action': 'search', 'term': term})
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed > args.timeout:
+            row['timed_out'] = True
+            break
+        if await communicator.receive_nothing(timeout=args.idle, interval=0.002):
+            break
+        message = await communicator.receive_output()
+        elapsed = time.perf_counter() - started
+        if message.get('bytes') is not None:
+            row['bytes'] += len(message['bytes'])
+            frame = decoder.decode(message['bytes'])
+        else:
+            row['bytes'] += len(message['text'].encode())
+            frame = json.loads(message['text'])
+        if isinstance(frame, list):
+            row['cards'] += len(frame)
+        elif 'updates' in frame:
+            row['updates'] += len(frame['updates'])
+        elif 'search_complete' in frame:
+            break
+        else:
+            row['errors'] += bool(frame.get('error'))
+            continue
+        row['first'] = row['first'] if row['first'] is not None else elapsed
+        row['last'] = elapsed
+
+    await communicator.disconnect()
+    return row
+
+
+async def bench_ws(sites, args):
+    """Concurrent searches through the consumer, the way the page runs them."""
+    from scraper_project.asgi import application
+
+    workers = InlineWorkers(args.workers)
+    workers.install()
+    slots = asyncio.Semaphore(args.clients)
+    terms = [f"bench search {i % (args.distinct_terms or args.searches)}" for i in range(args.searches)]
+
+    async def limited(term):
+        async with slots:
+            return await search_once(application, term, args)
+
+    started = time.perf_counter()
+    rows = await asyncio.gather(*(limited(term) for term in terms))
+    wall = time.perf_counter() - started
+    await workers.drain()
+
+    ok = [row for row in rows if row['first'] is not None]
+    return {
+        'searches': len(rows),
+        'without_results': len(rows) - len(ok),
+        'timed_out': sum(row['timed_out'] for row in rows),
+        'error_frames': sum(row['errors'] for row in rows),
+        'job_failures': workers.failures,
+        'cards_per_search': round(sum(row['cards'] for row in ok) / len(ok), 1) if ok else 0,
+        'updates_per_search': round(sum(row['updates'] for row in ok) / len(ok), 1) if ok else 0,
+        'bytes_per_search': round(sum(row['bytes'] for row in rows) / len(rows)) if rows else 0,
+        'bytes_per_card': round(sum(row['bytes'] for row in ok) / max(1, sum(row['cards'] for row in ok)), 1),
+        'first_result_ms': summarize([row['first'] for row in ok]),
+        'last_result_ms': summarize([row['last'] for row in ok]),
+        'wall_s': round(wall, 3),
+        'throughput_per_s': round(len(rows) / wall, 2),
+    }
+
+
+async def run_async_scenarios(sites, args, scenarios):
+    report = {}
+    if 'scrape' in scenarios:
+        report['scrape'] = await bench_scrape(sites, args)
+    if 'ws' in scenarios:
+        report['ws'] = await bench_ws(sites, args)
+    return report
+
+
+# --- Output ---
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pipeline_settings():
+    from django.conf import settings
+
+    return {
+        name: getattr(settings, name) for name in (
+            'SCRAPER_EXECUTION_MODE', 'SCRAPER_PARSER_BACKEND', 'SCRAPER_STREAM_PARSING', 'SCRAPER_HTTP2',
+            'SCRAPER_MERGE_RESULTS', 'SCRAPER_POSTER_PROXY', 'SCRAPER_CANCEL_SCRAPES', 'SCRAPER_COALESCE_SEARCHES',
+            'SCRAPER_RATE_LIMITS', 'SCRAPER_RESULT_BATCH_SIZE', 'SCRAPER_RESULT_BATCH_INTERVAL',
+            'SCRAPER_WIRE_COMPRESS_MIN',
+        )
+    }
+
+
+def flatten(report, prefix=''):
+    """{'ws.first_result_ms.p50': 12.3, ...} for every number in report."""
+    numbers = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            numbers.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            numbers[prefix + key] = value
+    return numbers
+
+
+def compare(baseline, report):
+    """Prints the change in every percentile and throughput figure since baseline."""
+    before, after = flatten(baseline['scenarios']), flatten(report['scenarios'])
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created')}):")
+    for key, value in after.items():
+        if key not in before or not key.endswith(('.p50', '.p95', 'throughput_per_s')):
+            continue
+        change = (value - before[key]) / before[key] * 100 if before[key] else 0.0
+        print(f"  {key:<40} {before[key]:>10.1f} -> {value:>10.1f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the scrape and delivery pipeline.')
+    parser.add_argument('--scenario', default='fetch,scrape,ws', help="Comma-separated: fetch, scrape, ws")
+    parser.add_argument('--kinds', default=','.join(DEFAULT_KINDS), help="Comma-separated site kinds: get, post, flaresolverr, playwright")
+    parser.add_argument('--sites-per-kind', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=10, help="fetch/scrape rounds over every site")
+    parser.add_argument('--concurrency', type=int, default=8, help="fetch/scrape calls at a time")
+    parser.add_argument('--searches', type=int, default=20, help="ws: searches in total")
+    parser.add_argument('--clients', type=int, default=10, help="ws: concurrent WebSocket clients")
+    parser.add_argument('--distinct-terms', type=int, default=0, help="ws: cycle through this many terms (0 = all distinct)")
+    parser.add_argument('--workers', type=int, default=8, help="ws: scrape jobs run at a time")
+    parser.add_argument('--idle', type=float, default=2.0, help="ws: seconds without a frame that end a search")
+    parser.add_argument('--timeout', type=float, default=60.0, help="ws: seconds before a search is given up on")
+    parser.add_argument('--wire', choices=['json', 'msgpack'], default='json', help="ws: frame format (see scraper_api/wire.py)")
+    parser.add_argument('--mode', choices=['per_site', 'async_fanout'], help="SCRAPER_EXECUTION_MODE")
+    parser.add_argument('--parser', choices=['lxml', 'bs4'], help="SCRAPER_PARSER_BACKEND")
+    parser.add_argument('--latency', type=float, default=0.05, help="Site response latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--bandwidth', type=int, default=0, help="Site body bytes per second (0 = unlimited)")
+    parser.add_argument('--solve-time', type=float, default=0.5, help="FlareSolverr solve time, seconds")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of site/solve requests that fail")
+    parser.add_argument('--failure-mode', choices=['error', 'reset'], default='error')
+    parser.add_argument('--output', type=Path, help="JSON file for the results")
+    parser.add_argument('--compare', type=Path, help="Earlier results JSON to compare with")
+    args = parser.parse_args()
+    args.kinds = [kind for kind in args.kinds.split(',') if kind in KINDS]
+    scenarios = args.scenario.split(',')
+
+    pages = load_fixture_pages()
+    servers, flaresolverr = start_servers(args, pages)
+    setup_django(args, flaresolverr)
+    sites = create_sites(servers)
+    print(f"{len(sites)} fake sites ({', '.join(args.kinds)}) on {len(pages)} fixture(s)")
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'args': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        'settings': pipeline_settings(),
+        'scenarios': {},
+    }
+    if 'fetch' in scenarios:
+        report['scenarios']['fetch'] = bench_fetch(sites, args)
+    # One event loop for both: the async Redis clients are kept per loop
+    report['scenarios'].update(asyncio.run(run_async_scenarios(sites, args, scenarios)))
+
+    for name, result in report['scenarios'].items():
+        print(f"\n{name}: {result['throughput_per_s']} /s over {result['wall_s']} s")
+        overall = result.get('all', result)
+        for key, stats in overall.items():
+            if key.endswith('_ms'):
+                print_stats(key, stats)
+
+    report['servers'] = {
+        'sites': {kind: sum(server.counts.get(kind, 0) for server in servers.values()) for kind in ('page', 'poster', 'failed')},
+        'flaresolverr': flaresolverr.counts,
+    }
+
+    output = args.output or RESULTS_DIR / f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+    for server in [*servers.values(), flaresolverr]:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
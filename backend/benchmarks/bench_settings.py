@@ -0,0 +1,52 @@
+# File: backend/benchmarks/bench_settings.py
+
+# Django settings for bench_pipeline.py: the project's settings, with
+# everything stateful moved out of the way so a run neither reads nor
+# clobbers real data:
+#   - a throwaway SQLite database and poster cache in the temp folder
+#   - every Redis user (result cache, channel layer, flights, health,
+#     rate limits, trending, queue load) on BENCH_REDIS_URL, which the
+#     benchmark empties before each run
+# Per-domain rate limits are off by default: every fake site shares one
+# host, and the benchmark should measure the pipeline, not the limiter.
+# Any SCRAPER_* variable set in the environment still wins.
+
+import os
+import tempfile
+from pathlib import Path
+
+BENCH_REDIS_URL = os.environ.get('BENCH_REDIS_URL', 'redis://127.0.0.1:6379/15')
+BENCH_DIR = Path(os.environ.get('BENCH_DIR', Path(tempfile.gettempdir()) / 'scraper_bench'))
+
+for name in (
+    'CACHE_REDIS_URL',
+    'SCRAPER_COALESCE_REDIS_URL',
+    'SCRAPER_HEALTH_REDIS_URL',
+    'SCRAPER_CLEARANCE_REDIS_URL',
+    'SCRAPER_RATE_LIMIT_REDIS_URL',
+    'SCRAPER_TRENDING_REDIS_URL',
+    'SCRAPER_SITE_CONFIG_REDIS_URL',
+    'SCRAPER_QUEUE_STATS_REDIS_URL',
+    'CELERY_BROKER_URL',
+):
+    os.environ[name] = BENCH_REDIS_URL
+os.environ.setdefault('SCRAPER_RATE_LIMITS', '0')
+os.environ.setdefault('SCRAPER_POSTER_CACHE_DIR', str(BENCH_DIR / 'poster_cache'))
+
+from scraper_project.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCH_DIR / 'bench.sqlite3',
+    }
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            "hosts": [BENCH_REDIS_URL],
+        },
+    },
+}
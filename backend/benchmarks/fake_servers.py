@@ -0,0 +1,229 @@
+# File: backend/benchmarks/fake_servers.py
+
+# Local stand-ins for the sites and FlareSolverr, so the pipeline can be
+# benchmarked without touching the network (see bench_pipeline.py).
+#
+# FakeSiteServer replays the saved pages in benchmarks/fixtures/. Every
+# fixture is served under its own prefix, whatever the query:
+#   GET  /<fixture>/...    the page as HTML
+#   POST /<fixture>/...    the page as a JSON API answer ({"data": {"results": html}})
+#   GET  *.jpg|png|webp    a small generated poster
+# FakeFlareSolverr answers the FlareSolverr v1 API (sessions.create/destroy,
+# request.get/post) with the same pages, after a simulated solve.
+#
+# Both take a Faults: fixed latency plus random jitter before answering,
+# a bandwidth cap (the body goes out in chunks, so streaming parse has
+# something to overlap with), and a failure rate. A failed request gets a
+# 503, or with mode='reset' the connection is closed without an answer.
+
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+CHUNK_SIZE = 16 * 1024
+POSTER_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # Seconds before the answer starts
+    jitter: float = 0.0  # Up to this many extra seconds, at random
+    bandwidth: int = 0  # Bytes per second for the body, 0 = unlimited
+    failure_rate: float = 0.0  # Share of requests that fail
+    failure_mode: str = 'error'  # 'error' (503) or 'reset'
+
+    def wait(self):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def fails(self):
+        return random.random() < self.failure_rate
+
+
+def load_fixture_pages():
+    """{fixture name: html} for every fixture listed in sites.json."""
+    configs = json.loads((FIXTURES_DIR / 'sites.json').read_text())
+    return {filename: (FIXTURES_DIR / filename).read_text() for filename in configs}
+
+
+def make_poster():
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 450), (90, 60, 120)).save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def fail_or_wait(self):
+        """False if this request was picked to fail (and has been answered)."""
+        faults = self.server.faults
+        faults.wait()
+        if not faults.fails():
+            return True
+        self.server.count('failed')
+        if faults.failure_mode == 'reset':
+            self.close_connection = True
+            self.connection.close()
+        else:
+            self.reply(503, b'Service Unavailable', 'text/plain')
+        return False
+
+    def reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        bandwidth = self.server.faults.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / bandwidth)
+
+
+class _ServerBase(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, faults, pages):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.faults = faults
+        self.pages = pages
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, what):
+        with self._lock:
+            self.counts[what] = self.counts.get(what, 0) + 1
+
+    def page_for(self, url_path):
+        """The fixture page served under url_path, or None."""
+        fixture = urllib.parse.unquote(url_path).lstrip('/').split('/', 1)[0]
+        return self.pages.get(fixture)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SiteHandler(_Handler):
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path.lower().endswith(POSTER_EXTENSIONS):
+            self.server.count('poster')
+            self.reply(200, self.server.poster, 'image/jpeg')
+            return
+        self.answer(json_api=False)
+
+    def do_POST(self):
+        self.read_body()
+        self.answer(json_api=True)
+
+    def answer(self, json_api):
+        html = self.server.page_for(urllib.parse.urlsplit(self.path).path)
+        if html is None:
+            self.reply(404, b'Not Found', 'text/plain')
+            return
+        if not self.fail_or_wait():
+            return
+        self.server.count('page')
+        if json_api:
+            self.reply(200, json.dumps({'data': {'results': html}}).encode(), 'application/json')
+        else:
+            self.reply(200, html.encode(), 'text/html; charset=UTF-8')
+
+
+class FakeSiteServer(_ServerBase):
+    """Serves the fixture pages (and posters) as if it were every configured site."""
+
+    def __init__(self, faults, pages=None):
+        super().__init__(_SiteHandler, faults, pages or load_fixture_pages())
+        self.poster = make_poster()
+
+    def site_url(self, fixture):
+        """The base_url a SiteSource replaying fixture should use."""
+        return f"{self.url}/{urllib.parse.quote(fixture)}"
+
+
+class _FlareSolverrHandler(_Handler):
+
+    def do_POST(self):
+        try:
+            payload = json.loads(self.read_body())
+        except ValueError:
+            self.reply(400, b'{"status": "error", "message": "Bad JSON"}', 'application/json')
+            return
+
+        command = payload.get('cmd')
+        if command in ('sessions.create', 'sessions.destroy'):
+            self.server.count(command)
+            self.send_json({'status': 'ok', 'message': 'Session created successfully.'})
+            return
+        if command not in ('request.get', 'request.post'):
+            self.send_json({'status': 'error', 'message': f"Unknown cmd {command}"})
+            return
+
+        if not self.fail_or_wait():
+            return
+        html = self.server.page_for(urllib.parse.urlsplit(payload.get('url', '')).path)
+        if html is None:
+            self.send_json({'status': 'error', 'message': 'Error solving the challenge. Page not found.'})
+            return
+        self.server.count('solved')
+        self.send_json({
+            'status': 'ok',
+            'message': 'Challenge not detected!',
+            'solution': {
+                'url': payload['url'],
+                'status': 200,
+                'response': html,
+                'userAgent': 'Mozilla/5.0 (bench)',
+                'cookies': [{'name': 'cf_clearance', 'value': 'bench', 'expires': time.time() + 3600}],
+            },
+        })
+
+    def send_json(self, data):
+        self.reply(200, json.dumps(data).encode(), 'application/json')
+
+
+class FakeFlareSolverr(_ServerBase):
+    """
+    FlareSolverr's v1 API, answering with the fixture page the requested URL
+    points at. faults.latency stands in for the browser's solve time.
+    """
+
+    def __init__(self, faults, pages=None):
+        super().__init__(_FlareSolverrHandler, faults, pages or load_fixture_pages())
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v1"
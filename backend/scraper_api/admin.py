@@ -1,15 +1,20 @@
 
 # Register your models here.
 from django.contrib import admin
-from .models import SiteSource
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+
+from .metrics import get_stage_percentiles
+from .models import ScrapedResult, SiteSource
+from .resilience import CLOSED, get_site_health
 
 # This "registers" your SiteSource model with the Django admin page
 @admin.register(SiteSource)
 class SiteSourceAdmin(admin.ModelAdmin):
     # Columns to display in the list view
-    list_display = ('name', 'is_active', 'search_type', 'requires_playwright', 'base_url')
+    list_display = ('name', 'is_active', 'search_type', 'renderer', 'base_url', 'breaker_state', 'latency', 'stage_latency')
     # Filters on the right-hand side
-    list_filter = ('is_active', 'search_type', 'requires_playwright')
+    list_filter = ('is_active', 'search_type', 'renderer')
     # Search bar fields
     search_fields = ('name', 'base_url')
     
@@ -19,9 +24,58 @@ class SiteSourceAdmin(admin.ModelAdmin):
             'fields': ('name', 'base_url', 'is_active')
         }),
         ('Search Logic', {
-            'fields': ('search_type', 'search_endpoint', 'post_payload_template', 'requires_playwright')
+            'fields': ('search_type', 'search_endpoint', 'post_payload_template', 'renderer')
+        }),
+        ('Mirrors', {
+            'fields': ('alternate_base_url', 'hedge_requests')
         }),
         ('Result Pattern (CSS Selectors)', {
-            'fields': ('result_container_selector', 'result_title_selector', 'result_link_selector', 'result_poster_selector', 'result_poster_attribute')
+            'fields': ('result_container_selector', 'result_title_selector', 'result_link_selector', 'result_poster_selector', 'result_poster_attribute', 'max_results')
+        }),
+        ('Pagination', {
+            'fields': ('max_pages', 'page_url_template', 'next_page_selector')
+        }),
+        ('Caching', {
+            'fields': ('cache_ttl',)
         }),
     )
+
+    # --- Live health columns (from Redis, see resilience.py) ---
+
+    @admin.display(description='Breaker')
+    def breaker_state(self, obj):
+        health = get_site_health(obj)
+        if health.state == CLOSED and health.failures:
+            return f"{health.state} ({health.failures} failures)"
+        return health.state
+
+    @admin.display(description='Latency p50 / p95')
+    def latency(self, obj):
+        health = get_site_health(obj)
+        if not health.samples:
+            return '-'
+        return f"{health.p50:.2f}s / {health.p95:.2f}s ({health.samples} samples)"
+
+    @admin.display(description='Stages p50 / p95')
+    def stage_latency(self, obj):
+        # One line per stage with samples (see metrics.py)
+        stages = get_stage_percentiles(obj)
+        if not stages:
+            return '-'
+        return format_html_join(
+            mark_safe('<br>'), '{}: {}s / {}s',
+            ((stage, f"{p50:.3f}", f"{p95:.3f}") for stage, (p50, p95, _) in stages.items()),
+        )
+
+
+# The result index is filled by the scrapers; the admin only browses it
+@admin.register(ScrapedResult)
+class ScrapedResultAdmin(admin.ModelAdmin):
+    list_display = ('title', 'source', 'first_seen', 'last_seen')
+    list_filter = ('source',)
+    search_fields = ('normalized_title', 'link')
+    list_select_related = ('source',)
+    readonly_fields = ('source', 'title', 'normalized_title', 'link', 'poster', 'first_seen', 'last_seen')
+
+    def has_add_permission(self, request):
+        return False
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class ScraperApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'scraper_api'
\ No newline at end of file
+    name = 'scraper_api'
+
+    def ready(self):
+        # Connect the SiteSource cache-invalidation signals
+        from . import signals  # noqa: F401
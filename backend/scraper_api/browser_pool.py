@@ -0,0 +1,159 @@
+# File: backend/scraper_api/browser_pool.py
+
+# Warm Playwright browser contexts, for sites with renderer=playwright.
+#
+# FlareSolverr drives a full browser over HTTP and waits for the whole page;
+# that is needed to get past Cloudflare, but sites that only render their
+# results with JS don't need it. For those, each worker process keeps one
+# headless Chromium and SCRAPER_BROWSER_POOL_SIZE contexts in it:
+#   - a render borrows an idle context, opens a page, and returns the DOM
+#     as soon as the site's result_container_selector is attached (or the
+#     network went idle without it: no results), not at the load event
+#   - images, fonts and media, and requests to SCRAPER_BROWSER_BLOCKED_DOMAINS
+#     (ads, analytics), are aborted before they leave the browser
+#   - a context is closed and replaced after SCRAPER_BROWSER_MAX_PAGES
+#     renders, or after an error, so cookies and leaks don't pile up
+# The browser starts on the first render and lives on the worker's event
+# loop (see http_pool.run_on_worker_loop), so both execution modes share it.
+#
+# Needs `pip install playwright` and `playwright install chromium`. Without
+# them playwright sites fail like an unreachable site would.
+
+import asyncio
+import os
+import urllib.parse
+
+from django.conf import settings
+
+try:
+    from playwright.async_api import Error as PlaywrightError
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+_pools = {}
+
+
+def is_blocked(resource_type, url):
+    """True for requests the page can do without."""
+    if resource_type in settings.SCRAPER_BROWSER_BLOCKED_TYPES:
+        return True
+    host = urllib.parse.urlsplit(url).hostname or ''
+    return any(host == domain or host.endswith('.' + domain) for domain in settings.SCRAPER_BROWSER_BLOCKED_DOMAINS)
+
+
+async def _route(route):
+    request = route.request
+    if is_blocked(request.resource_type, request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class PooledContext:
+
+    def __init__(self, context):
+        self.context = context
+        self.pages = 0
+
+
+class BrowserPool:
+    """One process's browser and its contexts. Only used from one event loop."""
+
+    def __init__(self, size, max_pages):
+        self.size = size
+        self.max_pages = max_pages
+        self.playwright = None
+        self.browser = None
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+        self.starting = asyncio.Lock()
+
+    async def _browser(self):
+        async with self.starting:
+            if self.browser is None or not self.browser.is_connected():
+                if self.playwright is None:
+                    self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(headless=settings.SCRAPER_BROWSER_HEADLESS)
+                self.idle = []
+                print(f"[Browser] Launched Chromium ({self.size} contexts, {self.max_pages} pages each)")
+            return self.browser
+
+    async def _new_context(self):
+        browser = await self._browser()
+        context = await browser.new_context(service_workers='block')
+        await context.route('**/*', _route)
+        return PooledContext(context)
+
+    async def _discard(self, pooled):
+        try:
+            await pooled.context.close()
+        except PlaywrightError:
+            pass  # The browser is already gone
+
+    async def render(self, url, selector, timeout):
+        """The page's HTML once selector is attached. None if the page failed to load."""
+        async with self.slots:
+            pooled = self.idle.pop() if self.idle else await self._new_context()
+            try:
+                html = await self._render(pooled.context, url, selector, timeout)
+            except Exception as e:
+                # Playwright errors, but also anything else: the context can't be trusted after either
+                print(f"[Browser] Render of {url} failed: {e!r}")
+                await self._discard(pooled)
+                return None
+            except asyncio.CancelledError:
+                # Abandoned mid-render (see cancellation.py): the page may still be loading
+                await self._discard(pooled)
+                raise
+
+            pooled.pages += 1
+            if pooled.pages >= self.max_pages:
+                await self._discard(pooled)
+            else:
+                self.idle.append(pooled)
+            return html
+
+    async def _render(self, context, url, selector, timeout):
+        page = await context.new_page()
+        try:
+            await page.goto(url, wait_until='commit', timeout=timeout * 1000)
+            # Whichever comes first: the results, or a page that has stopped loading without them
+            waits = [
+                asyncio.ensure_future(page.wait_for_selector(selector, state='attached', timeout=timeout * 1000)),
+                asyncio.ensure_future(page.wait_for_load_state('networkidle', timeout=timeout * 1000)),
+            ]
+            done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            for wait in pending:
+                wait.cancel()
+            await asyncio.gather(*waits, return_exceptions=True)
+            if all(wait.exception() for wait in done):
+                raise next(iter(done)).exception()
+            return await page.content()
+        finally:
+            await page.close()
+
+
+def get_pool():
+    """This process's pool for the running event loop."""
+    key = (os.getpid(), asyncio.get_running_loop())
+    if key not in _pools:
+        # Pools of ended loops, or inherited from the parent of a fork, can't be used again
+        for stale in [other for other in _pools if other[0] != key[0] or other[1].is_closed()]:
+            del _pools[stale]
+        _pools[key] = BrowserPool(settings.SCRAPER_BROWSER_POOL_SIZE, settings.SCRAPER_BROWSER_MAX_PAGES)
+    return _pools[key]
+
+
+async def render_page(site, url, timeout):
+    """Renders url in a pooled context and returns the HTML, or None."""
+    if not PLAYWRIGHT_AVAILABLE:
+        print(f"[Browser] Playwright is not installed, can't render {site.name}")
+        return None
+    print(f"[Browser] Rendering {site.name}")
+    try:
+        return await get_pool().render(url, site.result_container_selector, timeout)
+    except PlaywrightError as e:
+        print(f"[Browser] Could not start the browser for {site.name}: {e}")
+        return None
@@ -0,0 +1,152 @@
+# File: backend/scraper_api/cache.py
+
+# Tiered search-result cache.
+#
+# Key:   (site id, hash of the site's search/selector config, normalized term)
+# Tier 1: in-process LRU (one per Daphne/worker process)
+# Tier 2: Redis, through Django's cache framework (SCRAPER_RESULT_CACHE_ALIAS)
+#
+# Each entry is {'results': [...], 'fetched_at': unix time}. An entry is
+# "fresh" for the site's cache_ttl seconds, then "stale" for another
+# SCRAPER_RESULT_CACHE_STALE seconds: stale entries are still served
+# immediately, but the consumer schedules a background refresh.
+#
+# Saving a SiteSource changes its config hash (updated_at is part of it),
+# so old entries in both tiers simply stop being looked up. The post_save
+# signal also drops the site's entries from this process's LRU right away.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+def normalize_term(term):
+    """'  Dune   PART two ' -> 'dune part two'"""
+    return ' '.join((term or '').lower().split())
+
+
+def site_config_hash(site):
+    """Hash of everything that changes what a search on this site returns."""
+    parts = [
+        site.base_url, site.search_type, site.search_endpoint,
+        site.post_payload_template or '', site.renderer,
+        site.result_container_selector, site.result_title_selector,
+        site.result_link_selector, site.result_poster_selector,
+        site.result_poster_attribute,
+        str(site.max_pages), site.page_url_template, site.next_page_selector,
+        site.updated_at.isoformat() if site.updated_at else '',
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode()).hexdigest()[:16]
+
+
+def cache_key(site, search_term):
+    term_hash = hashlib.sha1(normalize_term(search_term).encode()).hexdigest()[:16]
+    return f"results:{site.id}:{site_config_hash(site)}:{term_hash}"
+
+
+class LRUCache:
+    """A small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                del self.entries[key]
+
+
+local_cache = LRUCache(settings.SCRAPER_RESULT_CACHE_LOCAL_SIZE)
+
+
+def _shared_cache():
+    return caches[settings.SCRAPER_RESULT_CACHE_ALIAS]
+
+
+def _entry_timeout(site):
+    return site.cache_ttl + settings.SCRAPER_RESULT_CACHE_STALE
+
+
+def get_cached_results(site, search_term):
+    """
+    Returns (state, results) where state is FRESH or STALE,
+    or (None, None) on a miss.
+    """
+    if not site.cache_ttl:
+        return None, None
+
+    key = cache_key(site, search_term)
+    entry = local_cache.get(key)
+
+    if entry is None:
+        try:
+            entry = _shared_cache().get(key)
+        except Exception as e:
+            print(f"[Cache] Shared cache read failed: {e}")
+            entry = None
+        if entry is None:
+            return None, None
+        remaining = _entry_timeout(site) - (time.time() - entry['fetched_at'])
+        if remaining > 0:
+            local_cache.set(key, entry, remaining)
+
+    age = time.time() - entry['fetched_at']
+    if age < site.cache_ttl:
+        return FRESH, entry['results']
+    if age < _entry_timeout(site):
+        return STALE, entry['results']
+    return None, None
+
+
+def store_results(site, search_term, results):
+    """Writes freshly scraped results to both tiers."""
+    if not site.cache_ttl:
+        return
+
+    key = cache_key(site, search_term)
+    entry = {'results': results, 'fetched_at': time.time()}
+    local_cache.set(key, entry, _entry_timeout(site))
+    try:
+        _shared_cache().set(key, entry, _entry_timeout(site))
+    except Exception as e:
+        print(f"[Cache] Shared cache write failed: {e}")
+
+
+def invalidate_site(site_id):
+    """Drops a site's entries from this process's LRU (see signals.py)."""
+    local_cache.delete_prefix(f"results:{site_id}:")
+
+
+aget_cached_results = sync_to_async(get_cached_results)
+astore_results = sync_to_async(store_results)
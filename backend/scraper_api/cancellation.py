@@ -0,0 +1,161 @@
+# File: backend/scraper_api/cancellation.py
+
+# Cancelling scrapes nobody is waiting for any more.
+#
+# Each WebSocket connection registers its current search in Redis:
+#   search:<channel name>  {"id": <search id>, "term": <normalized term>}
+# A new search overwrites it. A disconnect replaces it with a tombstone
+# ({"id": null, "term": null}). The consumer also takes its channel out of
+# the waiter sets of the flights it joined (see coalesce.leave_flights).
+#
+# Scrapes and flights address a search as "<channel>#<search id>" (see
+# delivery.reply_address). A scrape is still wanted while its requester, or
+# anyone waiting on its flight, is still on that search. For a bare channel
+# name, any current search with the same normalized term will do. Channels
+# that never registered (direct task calls, a failed registration) count
+# as interested. Scrapes
+# check this before they fetch: a superseded job that is still queued, or
+# waiting for a rate-limit token, just ends the flight and returns. The async
+# engine also re-checks every SCRAPER_CANCEL_POLL_INTERVAL seconds during
+# the fetch and cancels the download (or FlareSolverr call) when
+# the answer turns to no. The sync task checks between streamed chunks.
+#
+# Cache refreshes (no channel) are never cancelled. If Redis is unreachable
+# every scrape counts as wanted.
+#
+# Results that still arrive for an old search are dropped by the consumer,
+# since every event carries the search id it answers (see delivery.py).
+
+import asyncio
+import json
+import time
+
+import redis
+from django.conf import settings
+
+from .cache import normalize_term
+from .coalesce import flight_key
+from .delivery import split_address
+from .redis_client import get_async_redis, get_redis
+
+
+class ScrapeCancelled(Exception):
+    """Raised when a running scrape is no longer wanted."""
+
+
+def _client():
+    return get_redis(settings.SCRAPER_COALESCE_REDIS_URL)
+
+
+def _async_client():
+    return get_async_redis(settings.SCRAPER_COALESCE_REDIS_URL)
+
+
+def search_key(channel_name):
+    return f"search:{channel_name}"
+
+
+async def start_search(channel_name, search_id, search_term):
+    """Makes (search_id, search_term) channel_name's current search."""
+    value = json.dumps({'id': search_id, 'term': normalize_term(search_term)})
+    try:
+        await _async_client().set(search_key(channel_name), value, ex=settings.SCRAPER_ACTIVE_SEARCH_TTL)
+    except redis.RedisError as e:
+        print(f"[Cancel] Could not register search {search_id}: {e}")
+
+
+async def end_search(channel_name):
+    """channel_name has gone away: none of its scrapes are wanted any more."""
+    tombstone = json.dumps({'id': None, 'term': None})
+    try:
+        await _async_client().set(search_key(channel_name), tombstone, ex=settings.SCRAPER_ACTIVE_SEARCH_TTL)
+    except redis.RedisError as e:
+        print(f"[Cancel] Could not unregister {channel_name}: {e}")
+
+
+def _interested(term, addresses, current_searches):
+    for address, current in zip(addresses, current_searches):
+        if current is None:
+            return True
+        current = json.loads(current)
+        search_id = split_address(address)[1]
+        if search_id is not None:
+            if current['id'] == search_id:
+                return True
+        elif current['term'] == term:
+            return True
+    return False
+
+
+def _candidates(channel_name, waiters):
+    return [channel_name] + [w.decode() for w in waiters if w.decode() != channel_name]
+
+
+def _search_keys(addresses):
+    return [search_key(split_address(address)[0]) for address in addresses]
+
+
+def is_wanted(site, search_term, channel_name):
+    """True while someone still waits for this scrape's results."""
+    if not settings.SCRAPER_CANCEL_SCRAPES or not channel_name:
+        return True
+
+    try:
+        client = _client()
+        waiters = client.smembers(flight_key(site, search_term) + ':waiters')
+        addresses = _candidates(channel_name, waiters)
+        current_searches = client.mget(_search_keys(addresses))
+    except redis.RedisError:
+        return True
+    return _interested(normalize_term(search_term), addresses, current_searches)
+
+
+async def ais_wanted(site, search_term, channel_name):
+    """Async version of is_wanted."""
+    if not settings.SCRAPER_CANCEL_SCRAPES or not channel_name:
+        return True
+
+    try:
+        client = _async_client()
+        waiters = await client.smembers(flight_key(site, search_term) + ':waiters')
+        addresses = _candidates(channel_name, waiters)
+        current_searches = await client.mget(_search_keys(addresses))
+    except redis.RedisError:
+        return True
+    return _interested(normalize_term(search_term), addresses, current_searches)
+
+
+class InterestCheck:
+    """is_wanted, asked at most once every SCRAPER_CANCEL_POLL_INTERVAL seconds."""
+
+    def __init__(self, site, search_term, channel_name):
+        self.args = (site, search_term, channel_name)
+        self.next_check = time.monotonic() + settings.SCRAPER_CANCEL_POLL_INTERVAL
+
+    def abandoned(self):
+        if time.monotonic() < self.next_check:
+            return False
+        self.next_check = time.monotonic() + settings.SCRAPER_CANCEL_POLL_INTERVAL
+        return not is_wanted(*self.args)
+
+
+async def unless_abandoned(coroutine, site, search_term, channel_name):
+    """
+    Awaits coroutine, checking ais_wanted every SCRAPER_CANCEL_POLL_INTERVAL
+    seconds. Cancels it and raises ScrapeCancelled once nobody wants it.
+    """
+    task = asyncio.ensure_future(coroutine)
+    if not settings.SCRAPER_CANCEL_SCRAPES or not channel_name:
+        return await task
+
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=settings.SCRAPER_CANCEL_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if not await ais_wanted(site, search_term, channel_name):
+                raise ScrapeCancelled(site.name)
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
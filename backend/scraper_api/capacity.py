@@ -0,0 +1,203 @@
+# File: backend/scraper_api/capacity.py
+
+# How busy each Celery queue is, for load-aware dispatch and the autoscaler.
+#
+# Depth comes straight from the broker. With priorities on (see settings),
+# kombu keeps one Redis list per priority step:
+#   <queue>, <queue>:1 ... <queue>:9
+# A job only waits behind the jobs at its own priority or better, so a
+# live search (priority 0) can be fine while the refresh backlog is long.
+#
+# The rest lives in Redis (SCRAPER_QUEUE_STATS_REDIS_URL), per queue:
+#   queue:<name>:run       list of the last SCRAPER_LATENCY_WINDOW scrape durations (s)
+#   queue:<name>:wait      list of the last queue waits (s), dispatch to pickup
+#   queue:<name>:capacity  worker slots consuming the queue, written by the
+#                          autoscaler (manage.py autoscale_workers), with a TTL
+#
+# A job's expected wait is (jobs ahead of it / capacity) * median scrape
+# time. Without a capacity (no autoscaler running), the measured median
+# wait stands in. A queue is overloaded for a priority when that wait is
+# over SCRAPER_QUEUE_MAX_WAIT: the consumer then skips its sites instead
+# of queueing work that would only miss the search deadline (see
+# progress.py), and refreshes and pre-warms wait for a quieter moment.
+#
+# If Redis is unreachable every queue is treated as idle.
+
+import statistics
+import time
+from collections import namedtuple
+
+import redis
+from django.conf import settings
+
+from .redis_client import get_async_redis, get_redis
+
+QueueLoad = namedtuple('QueueLoad', 'queue depths capacity run_p50 wait_p50')
+
+IDLE = QueueLoad(None, (), 0, None, None)
+
+# {priority: (checked_at, busy queues)}, per process (see abusy_queues)
+_busy_cache = {}
+
+
+def _stats():
+    return get_redis(settings.SCRAPER_QUEUE_STATS_REDIS_URL)
+
+
+def _broker():
+    return get_redis(settings.CELERY_BROKER_URL)
+
+
+def _keys(queue):
+    prefix = f"queue:{queue}"
+    return prefix + ':run', prefix + ':wait', prefix + ':capacity'
+
+
+def broker_keys(queue):
+    """The broker's lists for queue, one per priority step, best first."""
+    options = settings.CELERY_BROKER_TRANSPORT_OPTIONS
+    sep = options.get('sep', '\x06\x16')
+    return [f"{queue}{sep}{step}" if step else queue for step in options.get('priority_steps', [0])]
+
+
+def lane_queues():
+    return [settings.SCRAPER_FAST_QUEUE, settings.SCRAPER_BROWSER_QUEUE]
+
+
+# --- Reading ---
+
+def _load_commands(pipe, queue):
+    for key in broker_keys(queue):
+        pipe.llen(key)
+
+
+def _stats_commands(pipe, queue):
+    run_key, wait_key, capacity_key = _keys(queue)
+    pipe.lrange(run_key, 0, -1)
+    pipe.lrange(wait_key, 0, -1)
+    pipe.get(capacity_key)
+
+
+def _median(values):
+    return statistics.median(float(value) for value in values) if values else None
+
+
+def _make_load(queue, depths, stats):
+    runs, waits, capacity = stats
+    return QueueLoad(queue, tuple(depths), int(capacity or 0), _median(runs), _median(waits))
+
+
+def get_queue_loads(queues=None):
+    """{queue: QueueLoad}, from the broker and the stats Redis."""
+    queues = queues or lane_queues()
+    steps = len(broker_keys(queues[0]))
+    try:
+        with _broker().pipeline(transaction=False) as pipe:
+            for queue in queues:
+                _load_commands(pipe, queue)
+            depths = pipe.execute()
+        with _stats().pipeline(transaction=False) as pipe:
+            for queue in queues:
+                _stats_commands(pipe, queue)
+            stats = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Capacity] Redis unavailable, treating queues as idle: {e}")
+        return {queue: IDLE._replace(queue=queue) for queue in queues}
+
+    return {
+        queue: _make_load(queue, depths[i * steps:(i + 1) * steps], stats[i * 3:i * 3 + 3])
+        for i, queue in enumerate(queues)
+    }
+
+
+async def aget_queue_loads(queues=None):
+    """Async version of get_queue_loads, for the consumer."""
+    queues = queues or lane_queues()
+    steps = len(broker_keys(queues[0]))
+    try:
+        async with get_async_redis(settings.CELERY_BROKER_URL).pipeline(transaction=False) as pipe:
+            for queue in queues:
+                _load_commands(pipe, queue)
+            depths = await pipe.execute()
+        async with get_async_redis(settings.SCRAPER_QUEUE_STATS_REDIS_URL).pipeline(transaction=False) as pipe:
+            for queue in queues:
+                _stats_commands(pipe, queue)
+            stats = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Capacity] Redis unavailable, treating queues as idle: {e}")
+        return {queue: IDLE._replace(queue=queue) for queue in queues}
+
+    return {
+        queue: _make_load(queue, depths[i * steps:(i + 1) * steps], stats[i * 3:i * 3 + 3])
+        for i, queue in enumerate(queues)
+    }
+
+
+def jobs_ahead(load, priority):
+    """Jobs a new job at priority would wait behind."""
+    return sum(load.depths[:priority + 1])
+
+
+def expected_wait(load, priority):
+    """Seconds a job sent at priority now would likely wait. None if unknown."""
+    ahead = jobs_ahead(load, priority)
+    if not ahead:
+        return 0.0
+    if load.capacity and load.run_p50 is not None:
+        return ahead / load.capacity * load.run_p50
+    return load.wait_p50
+
+
+def is_overloaded(load, priority):
+    if not settings.SCRAPER_QUEUE_SHEDDING:
+        return False
+    wait = expected_wait(load, priority)
+    return wait is not None and wait > settings.SCRAPER_QUEUE_MAX_WAIT
+
+
+def busy_queues(priority):
+    """Queues too backed up for a job at priority."""
+    loads = get_queue_loads()
+    return {queue for queue, load in loads.items() if is_overloaded(load, priority)}
+
+
+async def abusy_queues(priority):
+    """Async version of busy_queues, cached for SCRAPER_QUEUE_LOAD_TTL seconds per process."""
+    checked_at, busy = _busy_cache.get(priority, (0, set()))
+    if time.monotonic() - checked_at < settings.SCRAPER_QUEUE_LOAD_TTL:
+        return busy
+    loads = await aget_queue_loads()
+    busy = {queue for queue, load in loads.items() if is_overloaded(load, priority)}
+    _busy_cache[priority] = (time.monotonic(), busy)
+    if busy:
+        print(f"[Capacity] Overloaded at priority {priority}: {', '.join(sorted(busy))}")
+    return busy
+
+
+# --- Writing ---
+
+def record_job(queue, run_seconds, wait_seconds=None):
+    """Records one finished scrape on queue (see metrics.ScrapeSpan.finish)."""
+    run_key, wait_key, _ = _keys(queue)
+    window = settings.SCRAPER_LATENCY_WINDOW
+    try:
+        with _stats().pipeline(transaction=False) as pipe:
+            pipe.lpush(run_key, round(run_seconds, 3))
+            pipe.ltrim(run_key, 0, window - 1)
+            if wait_seconds is not None:
+                pipe.lpush(wait_key, round(wait_seconds, 3))
+                pipe.ltrim(wait_key, 0, window - 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Capacity] Could not record a job on {queue}: {e}")
+
+
+def set_capacity(capacities, ttl):
+    """{queue: worker slots}, from the autoscaler. Expires unless refreshed."""
+    try:
+        with _stats().pipeline(transaction=False) as pipe:
+            for queue, slots in capacities.items():
+                pipe.set(_keys(queue)[2], slots, ex=ttl)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Capacity] Could not publish queue capacity: {e}")
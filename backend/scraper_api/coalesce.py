@@ -0,0 +1,172 @@
+# File: backend/scraper_api/coalesce.py
+
+# Request coalescing ("single flight") for live scrapes.
+#
+# When several users search the same term at the same time, only the first
+# one (the leader) dispatches a scrape for each site. Everyone else just
+# registers their channel as a waiter. When the scrape finishes, the task
+# drains the waiter set and sends the parsed results to every channel in it.
+#
+# Redis layout, per (site, config, normalized term) -- see cache.cache_key():
+#   inflight:<key>          set with NX while a scrape is running (the lock)
+#   inflight:<key>:waiters  reply addresses waiting for that scrape: channel
+#                           names, with the search id (see delivery.py)
+# Both expire after SCRAPER_COALESCE_TTL in case a worker dies mid-scrape.
+#
+# If Redis is unreachable every caller is treated as a leader, which is
+# exactly the old uncoalesced behaviour.
+
+import redis
+from django.conf import settings
+
+from .cache import cache_key
+from .redis_client import get_async_redis, get_redis
+
+
+def _client():
+    return get_redis(settings.SCRAPER_COALESCE_REDIS_URL)
+
+
+def _async_client():
+    return get_async_redis(settings.SCRAPER_COALESCE_REDIS_URL)
+
+
+def flight_key(site, search_term):
+    return 'inflight:' + cache_key(site, search_term)
+
+
+def _join_commands(pipe, site, search_term, channel_name):
+    key = flight_key(site, search_term)
+    ttl = settings.SCRAPER_COALESCE_TTL
+    if channel_name:
+        pipe.sadd(key + ':waiters', channel_name)
+        pipe.expire(key + ':waiters', ttl)
+    pipe.set(key, 1, nx=True, ex=ttl)
+
+
+def join_flight(site, search_term, channel_name):
+    """
+    Registers channel_name as waiting for (site, search_term).
+    Returns True if the caller is the leader and must dispatch the scrape.
+    channel_name may be None for a background cache refresh.
+    """
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return True
+
+    try:
+        with _client().pipeline(transaction=True) as pipe:
+            _join_commands(pipe, site, search_term, channel_name)
+            replies = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Coalesce] Redis unavailable, not coalescing: {e}")
+        return True
+
+    return bool(replies[-1])
+
+
+async def ajoin_flight(site, search_term, channel_name):
+    """Async version of join_flight, for the consumer."""
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return True
+
+    try:
+        async with _async_client().pipeline(transaction=True) as pipe:
+            _join_commands(pipe, site, search_term, channel_name)
+            replies = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Coalesce] Redis unavailable, not coalescing: {e}")
+        return True
+
+    return bool(replies[-1])
+
+
+async def leave_flights(sites, search_term, channel_name):
+    """Takes channel_name off the waiter lists of its flights (see cancellation.py)."""
+    if not settings.SCRAPER_COALESCE_SEARCHES or not sites:
+        return
+
+    try:
+        async with _async_client().pipeline(transaction=False) as pipe:
+            for site in sites:
+                pipe.srem(flight_key(site, search_term) + ':waiters', channel_name)
+            await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Coalesce] Could not leave flights for {channel_name}: {e}")
+
+
+def flight_members(site, search_term, channel_name):
+    """
+    The channels following (site, search_term) without ending the flight:
+    the waiters plus channel_name. Used for progress events (see progress.py).
+    """
+    recipients = {channel_name} if channel_name else set()
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return sorted(recipients)
+
+    try:
+        waiters = _client().smembers(flight_key(site, search_term) + ':waiters')
+    except redis.RedisError as e:
+        print(f"[Coalesce] Could not read the waiters of {site.name}: {e}")
+        return sorted(recipients)
+
+    recipients.update(waiter.decode() for waiter in waiters)
+    return sorted(recipients)
+
+
+async def aflight_members(site, search_term, channel_name):
+    """Async version of flight_members, for the fan-out engine."""
+    recipients = {channel_name} if channel_name else set()
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return sorted(recipients)
+
+    try:
+        waiters = await _async_client().smembers(flight_key(site, search_term) + ':waiters')
+    except redis.RedisError as e:
+        print(f"[Coalesce] Could not read the waiters of {site.name}: {e}")
+        return sorted(recipients)
+
+    recipients.update(waiter.decode() for waiter in waiters)
+    return sorted(recipients)
+
+
+def finish_flight(site, search_term, channel_name):
+    """
+    Ends the flight for (site, search_term) and returns every channel
+    that should get its results: the waiters plus channel_name itself.
+    """
+    recipients = {channel_name} if channel_name else set()
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return sorted(recipients)
+
+    key = flight_key(site, search_term)
+    try:
+        with _client().pipeline(transaction=True) as pipe:
+            pipe.smembers(key + ':waiters')
+            pipe.delete(key + ':waiters', key)
+            waiters, _ = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Coalesce] Redis unavailable, replying to the requester only: {e}")
+        return sorted(recipients)
+
+    recipients.update(waiter.decode() for waiter in waiters)
+    return sorted(recipients)
+
+
+async def afinish_flight(site, search_term, channel_name):
+    """Async version of finish_flight, for the fan-out engine."""
+    recipients = {channel_name} if channel_name else set()
+    if not settings.SCRAPER_COALESCE_SEARCHES:
+        return sorted(recipients)
+
+    key = flight_key(site, search_term)
+    try:
+        async with _async_client().pipeline(transaction=True) as pipe:
+            pipe.smembers(key + ':waiters')
+            pipe.delete(key + ':waiters', key)
+            waiters, _ = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Coalesce] Redis unavailable, replying to the requester only: {e}")
+        return sorted(recipients)
+
+    recipients.update(waiter.decode() for waiter in waiters)
+    return sorted(recipients)
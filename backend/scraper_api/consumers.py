@@ -1,17 +1,28 @@
 # File: backend/scraper_api/consumers.py
 
+import asyncio
 import json
+import time
+import uuid
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from asgiref.sync import sync_to_async
-from .models import SiteSource
-from .tasks import scrape_site # This is our one and only task
-
-# --- Database and Celery calls ---
-# We still need this for the database call
-@sync_to_async
-def get_active_sites():
-    # We use list() to force the database query to execute now
-    return list(SiteSource.objects.filter(is_active=True))
+from django.conf import settings
+from .cache import STALE, aget_cached_results, normalize_term
+from .capacity import abusy_queues
+from .cancellation import end_search, start_search
+from .coalesce import ajoin_flight, leave_flights
+from .delivery import reply_address
+from .index import asearch_index
+from .merging import ResultMerger
+from .metrics import SEARCH_COMPLETE, SEARCH_FIRST_RESULT, SEARCHES
+from .posters import poster_url
+from .progress import DONE, FAILED, QUEUED, SearchProgress
+from .resilience import aallow_request
+from .scheduling import priority_for, queue_for_site
+from .suggest import Suggester
+from .site_config import aget_active_sites
+from .tasks import dispatch_scrapes
+from .trending import arecord_search
+from .wire import MSGPACK_SUBPROTOCOL, MsgpackWire, choose_subprotocol
 
 # --- Consumer ---
 
@@ -19,13 +30,78 @@ class SearchConsumer(AsyncJsonWebsocketConsumer):
     
     async def connect(self):
         """Called when the WebSocket is handshaking."""
-        await self.accept()
-        print(f"WebSocket connected: {self.channel_name}")
+        # The current search, and the flights this connection waits on
+        # (see cancellation.py)
+        self.search_id = None
+        self.search_term = None
+        self.joined_sites = []
+        self.merger = None
+        # Set while the current search hasn't sent any results yet
+        self.search_started = None
+        # Per-site states of the current search, and its deadline (see progress.py)
+        self.progress = None
+        self.deadline_task = None
+        # Type-ahead state, and the live search waiting for the query to settle
+        self.suggester = Suggester()
+        self.settle_task = None
+        self.poster_base = self.get_poster_base()
+        # Binary MessagePack frames if the client asked for them (see wire.py)
+        subprotocol = choose_subprotocol(self.scope.get('subprotocols') or [])
+        self.wire = MsgpackWire() if subprotocol == MSGPACK_SUBPROTOCOL else None
+        await self.accept(subprotocol=subprotocol)
+        print(f"WebSocket connected: {self.channel_name} ({subprotocol or 'json'})")
 
     async def disconnect(self, close_code):
         """Called when the WebSocket closes."""
+        self.cancel_settle()
+        self.cancel_deadline()
+        # Nobody is left to read this connection's results: let its scrapes stop
+        await end_search(self.channel_name)
+        if self.search_id is not None:
+            await leave_flights(self.joined_sites, self.search_term, self.reply_to)
         print(f"WebSocket disconnected: {self.channel_name}")
 
+    @property
+    def reply_to(self):
+        """Address the current search's scrapes answer (see delivery.reply_address)."""
+        return reply_address(self.channel_name, self.search_id)
+
+    async def supersede_search(self, term):
+        """
+        Makes term the connection's current search. Scrapes for the previous
+        search stop once nobody else wants them, and their late results are
+        dropped by the handlers below, even when the term is the same.
+        """
+        previous_id, previous_term, previous_sites = self.search_id, self.search_term, self.joined_sites
+        previous_address = self.reply_to
+        self.search_id = uuid.uuid4().hex
+        self.search_term = normalize_term(term)
+        self.joined_sites = []
+        self.merger = ResultMerger(term) if settings.SCRAPER_MERGE_RESULTS else None
+        self.search_started = time.monotonic()
+        self.progress = SearchProgress(self.search_id, self.search_term)
+        self.cancel_deadline()
+        SEARCHES.inc()
+        await start_search(self.channel_name, self.search_id, term)
+        if previous_id is not None:
+            print(f"Search {self.search_id} supersedes {previous_id} ('{previous_term}')")
+            # A repeated term joins the same flights again, under the new id
+            await leave_flights(previous_sites, previous_term, previous_address)
+
+    def is_current(self, event):
+        """
+        False for events answering a search this connection has moved on
+        from, or one that has already sent its search_complete.
+        """
+        search_id = event.get('search')
+        if search_id is not None:
+            if search_id != self.search_id:
+                return False
+        elif event.get('term') is not None and event['term'] != self.search_term:
+            # Sent to the bare channel name: only the term can tell
+            return False
+        return self.progress is None or not self.progress.complete
+
     async def receive_json(self, content):
         """
         Called when we get a message from React/Postman.
@@ -38,21 +114,153 @@ class SearchConsumer(AsyncJsonWebsocketConsumer):
             if not term:
                 await self.send_error_message_to_client("No search term provided.")
                 return
+            self.cancel_settle()
+            await self.search(term)
 
-            print(f"Starting search for: {term}")
-            
-            # Call our async-safe database function
-            active_sites = await get_active_sites()
-            
-            if not active_sites:
-                await self.send_error_message_to_client("No active sites configured in admin.")
-                return
+        elif action == 'suggest':
+            await self.suggest(content.get('term') or '')
+
+    async def suggest(self, term):
+        """
+        Type-ahead (see suggest.py): answers at once from the result index,
+        then starts the live search once the query has stopped changing for
+        SCRAPER_SUGGEST_SETTLE_DELAY seconds. Keystrokes never scrape.
+        """
+        suggestions = await self.suggester.suggest(term)
+        await self.send_json({'suggestions': self.proxy_posters(suggestions), 'term': term})
+
+        self.cancel_settle()
+        if len(normalize_term(term)) >= settings.SCRAPER_SUGGEST_MIN_SEARCH_CHARS:
+            self.settle_task = asyncio.ensure_future(self.search_when_settled(term))
+
+    def cancel_settle(self):
+        if self.settle_task is not None:
+            self.settle_task.cancel()
+            self.settle_task = None
+
+    async def search_when_settled(self, term):
+        await asyncio.sleep(settings.SCRAPER_SUGGEST_SETTLE_DELAY)
+        # From here on a new keystroke no longer cancels it: a half-started
+        # search would leave joined flights without a leader
+        self.settle_task = None
+        if normalize_term(term) == self.search_term:
+            return
+        # Tells the page to swap its results for this search's
+        await self.send_json({'searching': term})
+        try:
+            await self.search(term)
+        except Exception as e:
+            print(f"Settled search for '{term}' failed: {e}")
 
+    async def search(self, term):
+        """Runs a search for term: cached and indexed results first, then live scrapes."""
+        await self.supersede_search(term)
+        print(f"Starting search {self.search_id} for: {term}")
+        # Feeds the trending list the pre-warmer re-scrapes (see trending.py)
+        await arecord_search(term)
+
+        # From the in-memory site snapshot, not the database (see site_config.py)
+        active_sites = await aget_active_sites()
+
+        if not active_sites:
+            await self.send_error_message_to_client("No active sites configured in admin.")
+            self.progress.ready = True
+            await self.complete_search()
+            return
+
+        # Index-first: answer from the persistent result index and
+        # only go on with the sites whose hits are missing or stale.
+        if settings.SCRAPER_SEARCH_MODE == 'index_first':
+            hits = await asearch_index(active_sites, term)
+            indexed = [result for results, _ in hits.values() for result in results]
+            if indexed:
+                await self.send_results(indexed)
             for site in active_sites:
-                # --- THIS IS NOW SIMPLER ---
-                # Just send the job! No need to check for queues.
-                scrape_site.delay(site.id, term, self.channel_name)
-                # --- END SIMPLER CODE ---
+                if site.id in hits and hits[site.id][1]:
+                    self.progress.update(site.id, site.name, DONE, len(hits[site.id][0]))
+            active_sites = [site for site in active_sites if not (site.id in hits and hits[site.id][1])]
+
+        # Serve whatever the result cache has right away. Fresh hits
+        # need no scrape; stale hits get a background refresh.
+        live_sites = []
+        refresh_sites = []
+        # Identical searches already in flight are joined rather than
+        # re-scraped; only the first requester (the leader) dispatches.
+        # Sites whose circuit breaker is open are skipped (see resilience.py),
+        # and so are sites whose queue is too backed up (see capacity.py).
+        busy = await abusy_queues(priority_for(self.channel_name))
+        refresh_busy = await abusy_queues(settings.SCRAPER_REFRESH_PRIORITY)
+        for site in active_sites:
+            state, results = await aget_cached_results(site, term)
+            if state is None:
+                if not await aallow_request(site):
+                    self.progress.update(site.id, site.name, FAILED)
+                    await self.send_error_message_to_client(
+                        f"Skipping {site.name}: too many recent failures, will retry later."
+                    )
+                    continue
+                if queue_for_site(site) in busy:
+                    self.progress.update(site.id, site.name, FAILED)
+                    await self.send_error_message_to_client(
+                        f"Skipping {site.name}: scrape workers are busy, try again shortly."
+                    )
+                    continue
+                self.progress.update(site.id, site.name, QUEUED)
+                self.joined_sites.append(site)
+                if await ajoin_flight(site, term, self.reply_to):
+                    live_sites.append(site)
+                continue
+            # Stale hits count as done too: their refresh isn't waited for
+            self.progress.update(site.id, site.name, DONE, len(results or []))
+            if results:
+                await self.send_results(results)
+            if state == STALE and queue_for_site(site) not in refresh_busy \
+                    and await aallow_request(site) and await ajoin_flight(site, term, None):
+                refresh_sites.append(site)
+
+        dispatch_scrapes(live_sites, term, self.reply_to)
+        dispatch_scrapes(refresh_sites, term, None)
+
+        # Every site is tracked now: send their states, and give the
+        # scrapes SCRAPER_SEARCH_DEADLINE seconds to finish
+        self.progress.ready = True
+        await self.send_json(self.progress.progress_frame())
+        if self.progress.is_finished():
+            await self.complete_search()
+        else:
+            self.deadline_task = asyncio.ensure_future(self.search_deadline(self.search_id))
+
+    async def search_deadline(self, search_id):
+        await asyncio.sleep(settings.SCRAPER_SEARCH_DEADLINE)
+        self.deadline_task = None
+        if search_id != self.search_id or self.progress.complete:
+            return
+        late = self.progress.expire()
+        print(f"Search {search_id} hit its deadline, timed out: {', '.join(late)}")
+        await self.complete_search()
+
+    def cancel_deadline(self):
+        if self.deadline_task is not None:
+            self.deadline_task.cancel()
+            self.deadline_task = None
+
+    async def track_site(self, site_id, name, state, results=None):
+        """Moves a site of the current search to state, tells the client, and completes the search when it was the last."""
+        if not self.progress.update(site_id, name, state, results) or not self.progress.ready:
+            return
+        await self.send_json(self.progress.progress_frame([site_id]))
+        if self.progress.is_finished():
+            await self.complete_search()
+
+    async def complete_search(self):
+        """Sends search_complete. Anything else for this search is dropped from here on."""
+        self.cancel_deadline()
+        self.progress.complete = True
+        frame = self.progress.complete_frame()
+        SEARCH_COMPLETE.labels(timed_out=str(frame['search_complete']['timed_out']).lower()).observe(
+            frame['search_complete']['seconds']
+        )
+        await self.send_json(frame)
 
     # --- These methods are called BY the channel layer ---
 
@@ -61,13 +269,87 @@ class SearchConsumer(AsyncJsonWebsocketConsumer):
         Handler for the 'send_search_result' event from a task.
         Sends the final data back to React/Postman.
         """
-        await self.send_json(event['result']) # Send the 'result' dictionary
+        if self.is_current(event):
+            await self.send_results([event['result']])
+
+    async def send_search_results(self, event):
+        """
+        Handler for the batched 'send_search_results' event.
+        The batch goes out through send_results, so at most one frame of new
+        cards and one of updates. Late batches for a superseded search are dropped.
+        """
+        if self.is_current(event):
+            await self.send_results(event['results'])
 
     async def send_error_message(self, event):
         """
         Handler for the 'send_error_message' event from a task.
         """
-        await self.send_error_message_to_client(event['message'])
+        if self.is_current(event):
+            await self.send_error_message_to_client(event['message'])
+            if event.get('site') is not None:
+                await self.track_site(event['site'], event['name'], FAILED)
+
+    async def search_progress(self, event):
+        """
+        Handler for the 'search_progress' event from a task: one site of
+        the search moved on (see progress.py).
+        """
+        if self.is_current(event):
+            await self.track_site(event['site'], event['name'], event['state'], event.get('results'))
+
+    def get_poster_base(self):
+        """Origin the browser should fetch proxied posters from (this server, by default)."""
+        if settings.SCRAPER_POSTER_BASE_URL:
+            return settings.SCRAPER_POSTER_BASE_URL.rstrip('/')
+        host = dict(self.scope.get('headers', [])).get(b'host', b'').decode()
+        scheme = 'https' if self.scope.get('scheme') == 'wss' else 'http'
+        return f"{scheme}://{host}" if host else ''
+
+    def proxy_posters(self, results):
+        """Points posters at the thumbnail proxy (see posters.py)."""
+        if not settings.SCRAPER_POSTER_PROXY:
+            return results
+        proxied = []
+        for result in results:
+            poster = result.get('poster') or ''
+            if poster.startswith('http'):
+                widths = settings.SCRAPER_POSTER_WIDTHS
+                result = dict(result, poster=poster_url(poster, self.poster_base, widths[0]))
+                if len(widths) > 1:
+                    result['poster_2x'] = poster_url(poster, self.poster_base, widths[1])
+            proxied.append(result)
+        return proxied
+
+    async def send_results(self, results):
+        """
+        Sends results to the client. With SCRAPER_MERGE_RESULTS they first go
+        through this search's merger (see merging.py): new cards are sent as
+        an array, and extra sources for cards already sent as {"updates": [...]}.
+        """
+        if results and self.search_started is not None:
+            elapsed = time.monotonic() - self.search_started
+            SEARCH_FIRST_RESULT.observe(elapsed)
+            print(f"[Timing] search={self.search_id} first_result={elapsed:.3f}s")
+            self.search_started = None
+
+        results = self.proxy_posters(results)
+        if self.merger is None:
+            await self.send_json(results)
+            return
+
+        new_results, updates = self.merger.merge(results)
+        if new_results:
+            await self.send_json(new_results)
+        if updates:
+            await self.send_json({'updates': updates})
+
+    async def send_json(self, content, close=False):
+        """Every frame to the client goes out here, as JSON or MessagePack (see wire.py)."""
+        if self.wire is None:
+            await super().send_json(content, close=close)
+        else:
+            await self.send(bytes_data=self.wire.encode(content), close=close)
 
     async def send_error_message_to_client(self, message):
         """Helper to send a JSON-formatted error to the client."""
@@ -0,0 +1,124 @@
+# File: backend/scraper_api/delivery.py
+
+# Batched result delivery.
+# Results travel over the channel layer as 'send_search_results' events
+# carrying a list, and the consumer sends each list as a single WebSocket
+# frame. A batch is flushed once it holds SCRAPER_RESULT_BATCH_SIZE results
+# or its oldest result has waited SCRAPER_RESULT_BATCH_INTERVAL seconds.
+#
+# Recipients are reply addresses, "<channel name>#<search id>" (see
+# reply_address): the consumer dispatches and joins flights under the id of
+# the search it is running. Each event carries that id ('search') and the
+# normalized term ('term'), so a consumer can drop anything answering a
+# search it has moved on from, even a new search for the same term (see
+# cancellation.py). A bare channel name (direct task calls) has no id, and
+# only the term is checked. Progress events and errors also name the site
+# ('site', 'name'), for the consumer's per-site progress (see progress.py).
+
+import asyncio
+
+from django.conf import settings
+
+from .cache import normalize_term
+from .metrics import timed
+
+
+def reply_address(channel_name, search_id):
+    """Where scrapes answer one search of channel_name. '#' can't appear in channel names."""
+    return f"{channel_name}#{search_id}"
+
+
+def split_address(address):
+    """(channel name, search id or None) of a reply address."""
+    channel_name, _, search_id = address.partition('#')
+    return channel_name, search_id or None
+
+
+class ResultBatcher:
+    """
+    Buffers results for a set of channels and sends them in batches.
+    Always finish with `await batcher.close()` to flush the remainder.
+    """
+
+    def __init__(self, channel_layer, recipients, size=None, interval=None, search_term=None):
+        self.channel_layer = channel_layer
+        self.term = normalize_term(search_term) if search_term is not None else None
+        self.recipients = list(recipients)
+        self.size = size or settings.SCRAPER_RESULT_BATCH_SIZE
+        self.interval = settings.SCRAPER_RESULT_BATCH_INTERVAL if interval is None else interval
+        self.pending = []
+        self.timer = None
+        self.lock = asyncio.Lock()
+
+    async def add(self, result):
+        self.pending.append(result)
+        if len(self.pending) >= self.size:
+            await self.flush()
+        elif self.timer is None and self.interval > 0:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.interval, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def add_many(self, results):
+        for result in results:
+            await self.add(result)
+
+    async def flush(self):
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+            with timed('send'):
+                for recipient in self.recipients:
+                    channel_name, search_id = split_address(recipient)
+                    await self.channel_layer.send(channel_name, {
+                        'type': 'send_search_results',
+                        'results': batch,
+                        'term': self.term,
+                        'search': search_id,
+                    })
+
+    async def close(self):
+        await self.flush()
+
+
+async def send_results(channel_layer, recipients, results, search_term=None):
+    """Sends an already-complete list of results in size-bounded batches."""
+    batcher = ResultBatcher(channel_layer, recipients, interval=0, search_term=search_term)
+    await batcher.add_many(results)
+    await batcher.close()
+
+
+async def _send_each(channel_layer, recipients, event):
+    """Sends event to every recipient, stamped with the search it answers there."""
+    for recipient in recipients:
+        channel_name, search_id = split_address(recipient)
+        await channel_layer.send(channel_name, {**event, 'search': search_id})
+
+
+async def send_error(channel_layer, recipients, message, search_term=None, site=None):
+    """
+    Sends a 'send_error_message' event to every recipient. With site, it
+    also tells the consumer that site's part of the search has failed.
+    """
+    term = normalize_term(search_term) if search_term is not None else None
+    event = {'type': 'send_error_message', 'message': message, 'term': term}
+    if site is not None:
+        event.update(site=site.id, name=site.name)
+    await _send_each(channel_layer, recipients, event)
+
+
+async def send_progress(channel_layer, recipients, site, state, search_term, results=None):
+    """Sends a 'search_progress' event (state from progress.py) to every recipient."""
+    event = {
+        'type': 'search_progress',
+        'site': site.id,
+        'name': site.name,
+        'state': state,
+        'results': results,
+        'term': normalize_term(search_term),
+    }
+    await _send_each(channel_layer, recipients, event)
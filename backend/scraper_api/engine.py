@@ -0,0 +1,500 @@
+# File: backend/scraper_api/engine.py
+
+# The async fan-out search engine.
+# Instead of one Celery task (and one worker slot) per site, a single
+# scrape_search task runs run_search(), which fetches every active site
+# concurrently on one event loop. Concurrency is capped overall and per host.
+# Connections come from the shared per-worker pool in http_pool.py.
+
+import asyncio
+import time
+import urllib.parse
+
+import httpx
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .cache import astore_results
+from .coalesce import afinish_flight, aflight_members
+from .cancellation import ScrapeCancelled, ais_wanted, unless_abandoned
+from .delivery import ResultBatcher, send_error, send_progress, send_results
+from .extraction import get_extraction_plan
+from .index import aindex_results
+from .metrics import ascrape_span, set_outcome, timed
+from .progress import DONE, FETCHING, PARSING
+from .http_pool import pooled_request_async, pooled_stream_async
+from .site_config import get_sites, site_from_config
+from .posters import aprefetch_posters
+from .browser_pool import render_page
+from .flaresolverr import (
+    adrop_clearance,
+    aload_clearance,
+    asave_clearance,
+    build_request_payload,
+    clearance_headers,
+    create_session_payload,
+    forget_session,
+    is_challenged,
+    is_missing_session,
+    mark_session_created,
+    needs_session,
+)
+from .pagination import is_paginated, more_pages, page_deadline
+from .scraping import (
+    FLARESOLVERR_URL,
+    USER_AGENT,
+    build_search_request,
+    build_search_url,
+    can_stream,
+    extract_response_body,
+    is_failed_response,
+    is_hedged,
+    is_json_response,
+    parse_page,
+    parse_results,
+)
+from .ratelimit import aacquire_token
+from .scheduling import queue_for_site
+from .resilience import adaptive_timeout, aget_site_health, arecord_outcome, hedge_delay
+
+
+class FanoutLimiter:
+    """
+    Two-level concurrency limit: one semaphore for the whole search and
+    one per host, so a search with many sites on the same mirror network
+    doesn't hammer a single host.
+    """
+
+    def __init__(self, max_concurrency, max_per_host):
+        self.overall = asyncio.Semaphore(max_concurrency)
+        self.max_per_host = max_per_host
+        self.hosts = {}
+
+    def for_host(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return self.hosts[host]
+
+
+async def fetch_page_html_with_clearance_async(url, site, timeout):
+    """Async version of tasks.get_page_html_with_clearance."""
+    clearance = await aload_clearance(site)
+    if not clearance:
+        return None
+
+    try:
+        response = await pooled_request_async('GET', url, headers=clearance_headers(clearance), timeout=timeout)
+    except httpx.HTTPError as e:
+        print(f"[Engine] Clearance request failed for {site.name}: {e}")
+        return None
+
+    if is_challenged(response):
+        print(f"[Engine] Clearance expired for {site.name}, back to FlareSolverr")
+        await adrop_clearance(site)
+        return None
+    if is_failed_response(response):
+        return None
+
+    return response.text
+
+
+async def fetch_page_html_with_flaresolverr_async(url, site, timeout=60):
+    """Async version of tasks.get_page_html_with_flaresolverr."""
+    html = await fetch_page_html_with_clearance_async(url, site, settings.SCRAPER_REQUEST_TIMEOUT)
+    if html:
+        return html
+
+    print(f"[Engine] Using FlareSolverr for: {site.name}")
+    try:
+        for attempt in range(2):
+            with timed('flaresolverr'):
+                if needs_session(site):
+                    await pooled_request_async(
+                        'POST', FLARESOLVERR_URL, json=create_session_payload(site), timeout=timeout + 10,
+                        trace_stages=False,
+                    )
+                    mark_session_created(site)
+
+                response = await pooled_request_async(
+                    'POST', FLARESOLVERR_URL, json=build_request_payload(url, site, timeout), timeout=timeout + 10,
+                    trace_stages=False,
+                )
+            data = response.json()
+
+            if is_missing_session(data) and attempt == 0:
+                forget_session(site)
+                continue
+            response.raise_for_status()
+            break
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[Engine] Failed to connect to FlareSolverr: {e}")
+        return None
+
+    if data.get('status') == 'ok':
+        await asave_clearance(site, data['solution'])
+        return data['solution']['response']
+
+    print(f"[Engine] FlareSolverr failed for: {site.name}. Message: {data.get('message')}")
+    return None
+
+
+async def fetch_plain_page_html_async(limiter, site, search_term, timeout, base_url=None):
+    """Async version of tasks.get_plain_page_html."""
+    try:
+        request_kwargs = build_search_request(site, search_term, base_url)
+    except ValueError as e:
+        print(f"[POST Payload Error] {e}")
+        return None
+
+    if request_kwargs is None:
+        return None
+
+    async with limiter.overall, limiter.for_host(request_kwargs['url']):
+        try:
+            response = await pooled_request_async(timeout=timeout, **request_kwargs)
+        except httpx.HTTPError as e:
+            print(f"[Engine] {site.search_type} failed for {site.name}: {e}")
+            return None
+
+    if is_failed_response(response):
+        print(f"[Engine] {site.name} answered {response.status_code}")
+        return None
+
+    return extract_response_body(response, site.search_type)
+
+
+async def fetch_hedged_page_html_async(limiter, site, search_term, timeout, delay):
+    """Async version of tasks.get_hedged_page_html. The loser is cancelled."""
+    primary = asyncio.ensure_future(fetch_plain_page_html_async(limiter, site, search_term, timeout))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done and primary.result():
+        return primary.result()
+
+    print(f"[Engine] Hedging {site.name} against {site.alternate_base_url}")
+    hedge = asyncio.ensure_future(
+        fetch_plain_page_html_async(limiter, site, search_term, timeout, site.alternate_base_url)
+    )
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result():
+                    return task.result()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def fetch_page_html_async(limiter, site, search_term, health):
+    """Async version of tasks.get_page_html."""
+    if site.renderer == site.Renderer.FLARESOLVERR:
+        url = build_search_url(site, search_term)
+        timeout = adaptive_timeout(health, settings.SCRAPER_FLARESOLVERR_TIMEOUT)
+        async with limiter.overall, limiter.for_host(url):
+            return await fetch_page_html_with_flaresolverr_async(url, site, timeout)
+
+    if site.renderer == site.Renderer.PLAYWRIGHT:
+        url = build_search_url(site, search_term)
+        timeout = adaptive_timeout(health, settings.SCRAPER_BROWSER_TIMEOUT)
+        async with limiter.overall, limiter.for_host(url):
+            with timed('render'):
+                return await render_page(site, url, timeout)
+
+    timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
+    if is_hedged(site):
+        return await fetch_hedged_page_html_async(limiter, site, search_term, timeout, hedge_delay(health))
+    return await fetch_plain_page_html_async(limiter, site, search_term, timeout)
+
+
+async def stream_page_results_async(limiter, channel_layer, site, search_term, channel_name, timeout, page_links=None):
+    """Async version of tasks.stream_page_results."""
+    try:
+        request_kwargs = build_search_request(site, search_term)
+    except ValueError as e:
+        print(f"[POST Payload Error] {e}")
+        return None, False
+
+    if request_kwargs is None:
+        return None, False
+
+    results = []
+    batcher = ResultBatcher(channel_layer, [channel_name] if channel_name else [], search_term=search_term)
+    async with limiter.overall, limiter.for_host(request_kwargs['url']):
+        try:
+            async with pooled_stream_async(timeout=timeout, **request_kwargs) as response:
+                if is_failed_response(response):
+                    print(f"[Engine] {site.name} answered {response.status_code}")
+                    return None, False
+
+                if is_json_response(response):
+                    await response.aread()
+                    html = extract_response_body(response, site.search_type)
+                    if not html:
+                        return None, False
+                    results, links = await asyncio.to_thread(parse_page, site, html)
+                    if page_links is not None:
+                        page_links.extend(links)
+                    return results, False
+
+                extractor = get_extraction_plan(site).streaming_extractor(response.charset_encoding, site.max_results)
+                async for chunk in response.aiter_bytes():
+                    batch = extractor.feed(chunk)
+                    await batcher.add_many(batch)
+                    results.extend(batch)
+                    if extractor.done:
+                        break
+                else:
+                    batch = extractor.close()
+                    await batcher.add_many(batch)
+                    results.extend(batch)
+                if page_links is not None:
+                    page_links.extend(extractor.page_links)
+        except httpx.HTTPError as e:
+            print(f"[Engine] {site.search_type} failed for {site.name}: {e}")
+        finally:
+            await batcher.close()
+
+    return (results or None), bool(results)
+
+
+async def fetch_page_url_html_async(limiter, site, url, health):
+    """Async version of tasks.get_page_url_html."""
+    if site.renderer == site.Renderer.FLARESOLVERR:
+        timeout = adaptive_timeout(health, settings.SCRAPER_FLARESOLVERR_TIMEOUT)
+        async with limiter.overall, limiter.for_host(url):
+            return await fetch_page_html_with_flaresolverr_async(url, site, timeout)
+
+    if site.renderer == site.Renderer.PLAYWRIGHT:
+        timeout = adaptive_timeout(health, settings.SCRAPER_BROWSER_TIMEOUT)
+        async with limiter.overall, limiter.for_host(url):
+            with timed('render'):
+                return await render_page(site, url, timeout)
+
+    timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
+    async with limiter.overall, limiter.for_host(url):
+        try:
+            response = await pooled_request_async('GET', url, headers={'User-Agent': USER_AGENT}, timeout=timeout)
+        except httpx.HTTPError as e:
+            print(f"[Engine] Page fetch failed for {site.name}: {e}")
+            return None
+
+    if is_failed_response(response):
+        print(f"[Engine] {site.name} answered {response.status_code} for {url}")
+        return None
+    return response.text
+
+
+async def fetch_more_pages_async(limiter, site, search_term, channel_name, first_url, page_links, found, health,
+                                 deadline, on_page):
+    """Async version of tasks.fetch_more_pages. Pages still loading when it stops are cancelled."""
+    pages, known = more_pages(site, search_term, first_url, page_links)
+    if not pages:
+        return []
+
+    print(f"[Engine] Fetching {len(pages)} more pages of {site.name}")
+    interactive = channel_name is not None
+    slots = asyncio.Semaphore(settings.SCRAPER_PAGE_CONCURRENCY)
+
+    async def fetch(url):
+        async with slots:
+            if not await aacquire_token(site, interactive=interactive):
+                return None
+            return await fetch_page_url_html_async(limiter, site, url, health)
+
+    tasks = {asyncio.ensure_future(fetch(url)): page for page, url in pages}
+    pending = set(tasks)
+    last_page = pages[-1][0]
+    results = []
+    try:
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"[Engine] Search deadline: dropping {len(pending)} pages of {site.name}")
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in sorted(done, key=tasks.get):
+                page = tasks[task]
+                try:
+                    html = task.result()
+                except Exception as e:
+                    # One broken page shouldn't cost the search the others
+                    print(f"[Engine] Page {page} of {site.name} failed: {e!r}")
+                    html = None
+                if page > last_page:
+                    continue
+                batch = await asyncio.to_thread(parse_results, site, html) if html else []
+                if html and not batch and not known:
+                    # Past the last page: the ones after it are empty too
+                    last_page = page - 1
+                    pending = {t for t in pending if tasks[t] < page}
+                if site.max_results:
+                    batch = batch[:site.max_results - found - len(results)]
+                if batch:
+                    results.extend(batch)
+                    await on_page(batch)
+
+            if site.max_results and found + len(results) >= site.max_results:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return results
+
+
+async def cancel_scrape_async(channel_layer, site, search_term, channel_name):
+    """Async version of tasks.cancel_scrape."""
+    set_outcome('cancelled')
+    print(f"[Engine] Cancelled scrape of {site.name}: search superseded")
+    recipients = [r for r in await afinish_flight(site, search_term, channel_name) if r != channel_name]
+    await send_error(
+        channel_layer, recipients, f"Search on {site.name} was interrupted, please search again.",
+        search_term, site
+    )
+
+
+async def scrape_site_async(limiter, channel_layer, site, search_term, channel_name, deadline=None):
+    """
+    Fetches and parses one site, caches the results and sends them to
+    channel_name and every channel waiting on the same scrape.
+    Plain GET/POST sites are parsed while they download (see extraction.py).
+    More result pages are fetched until deadline (see pagination.py).
+    """
+    # Superseded or orphaned searches end here (see cancellation.py)
+    if not await ais_wanted(site, search_term, channel_name):
+        await cancel_scrape_async(channel_layer, site, search_term, channel_name)
+        return
+
+    if not await aacquire_token(site, interactive=channel_name is not None):
+        set_outcome('rate_limited')
+        await send_error(
+            channel_layer, await afinish_flight(site, search_term, channel_name),
+            f"Skipping {site.name}: rate limited, try again shortly.", search_term, site
+        )
+        return
+
+    # Per-site progress for everyone following this scrape (see progress.py)
+    async def progress(state):
+        await send_progress(
+            channel_layer, await aflight_members(site, search_term, channel_name), site, state, search_term
+        )
+
+    await progress(FETCHING)
+    health = await aget_site_health(site)
+    started = time.monotonic()
+    streamed_to = None
+    page_links = []
+    try:
+        # The fetch is cancelled as soon as nobody wants its results
+        if can_stream(site, get_extraction_plan(site)):
+            timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
+            results, streamed = await unless_abandoned(
+                stream_page_results_async(
+                    limiter, channel_layer, site, search_term, channel_name, timeout, page_links
+                ),
+                site, search_term, channel_name,
+            )
+            if streamed:
+                streamed_to = channel_name
+        else:
+            html = await unless_abandoned(
+                fetch_page_html_async(limiter, site, search_term, health), site, search_term, channel_name
+            )
+            # Parsing is CPU-bound; keep it off the event loop so the other
+            # sites' downloads keep flowing.
+            results = None
+            if html:
+                await progress(PARSING)
+                results, page_links = await asyncio.to_thread(parse_page, site, html)
+    except ScrapeCancelled:
+        await cancel_scrape_async(channel_layer, site, search_term, channel_name)
+        return
+
+    # Health tracks the first page only, like every other site
+    await arecord_outcome(site, results is not None, time.monotonic() - started)
+
+    # Pages 2 and up (see pagination.py). The requester gets each page as it
+    # lands, so the first page goes out now rather than after the others.
+    if results and is_paginated(site) and not (site.max_results and len(results) >= site.max_results):
+        async def send_page(batch):
+            if channel_name:
+                await send_results(channel_layer, [channel_name], batch, search_term)
+
+        if streamed_to is None:
+            await send_page(results)
+        streamed_to = channel_name
+        try:
+            results = results + await unless_abandoned(
+                fetch_more_pages_async(
+                    limiter, site, search_term, channel_name, build_search_url(site, search_term), page_links,
+                    len(results), health, deadline or page_deadline(None), send_page,
+                ),
+                site, search_term, channel_name,
+            )
+        except ScrapeCancelled:
+            await cancel_scrape_async(channel_layer, site, search_term, channel_name)
+            return
+
+    if results is None:
+        set_outcome('failed')
+        await send_error(
+            channel_layer, await afinish_flight(site, search_term, channel_name),
+            f"Failed to fetch data from {site.name}", search_term, site
+        )
+        return
+
+    # Posters download in the background while the results go out
+    aprefetch_posters(results)
+    await astore_results(site, search_term, results)
+    await aindex_results(site, results)
+    print(f"[Engine] Finished scraping: {site.name}")
+
+    # The requester already got streamed results; only waiters need them
+    followers = await afinish_flight(site, search_term, channel_name)
+    recipients = [r for r in followers if r != streamed_to]
+    await send_results(channel_layer, recipients, results, search_term)
+    await send_progress(channel_layer, followers, site, DONE, search_term, len(results))
+
+
+async def scrape_site_timed(limiter, channel_layer, site, search_term, channel_name, enqueued_at):
+    """scrape_site_async inside its own timing span (see metrics.py)."""
+    async with ascrape_span(site, search_term, channel_name, enqueued_at, queue_for_site(site)):
+        try:
+            await scrape_site_async(limiter, channel_layer, site, search_term, channel_name, page_deadline(enqueued_at))
+        except Exception as e:
+            # Close the flight now, or its followers wait out SCRAPER_COALESCE_TTL for nothing
+            set_outcome('error')
+            print(f"[Engine] Unexpected error scraping {site.name}: {e!r}")
+            await send_error(
+                channel_layer, await afinish_flight(site, search_term, channel_name),
+                f"Failed to fetch data from {site.name}", search_term, site
+            )
+
+
+async def run_search(site_ids, search_term, channel_name=None, enqueued_at=None, configs=None):
+    """
+    Fetches every site in site_ids concurrently. configs are their
+    serialized SiteSources, if the job carried them (see site_config.py).
+    """
+    if configs:
+        sites = [site_from_config(config) for config in configs]
+    else:
+        sites = await sync_to_async(get_sites)(site_ids)
+    channel_layer = get_channel_layer()
+    limiter = FanoutLimiter(settings.SCRAPER_MAX_CONCURRENCY, settings.SCRAPER_MAX_PER_HOST)
+
+    results = await asyncio.gather(
+        *(scrape_site_timed(limiter, channel_layer, site, search_term, channel_name, enqueued_at)
+          for site in sites),
+        return_exceptions=True,
+    )
+
+    for site, outcome in zip(sites, results):
+        # Only errors from reporting an error get this far
+        if isinstance(outcome, Exception):
+            print(f"[Engine] Unexpected error scraping {site.name}: {outcome}")
@@ -0,0 +1,342 @@
+# File: backend/scraper_api/extraction.py
+
+# Compiled per-site extraction plans.
+#
+# A SiteSource's five selector fields (container, title, link, poster,
+# poster attribute) are compiled once into an ExtractionPlan and cached
+# until the row changes (keyed on updated_at). The plan is then run
+# against every page fetched for that site.
+#
+# Backends (SCRAPER_PARSER_BACKEND):
+#   'lxml' -> lxml's C HTML parser + selectors pre-compiled to XPath (default)
+#   'bs4'  -> BeautifulSoup with html.parser (the original implementation)
+# A site whose selectors lxml can't compile falls back to 'bs4'.
+#
+# lxml plans can also stream: a StreamingExtractor is fed the response body
+# chunk by chunk and returns each result as soon as its container's closing
+# tag has been parsed, so the rest of the page need not be downloaded.
+#
+# Sites with a next_page_selector also get page 1's pagination links, as
+# (text, href) pairs, for pagination.py to work out the other pages.
+
+import threading
+import urllib.parse
+
+from bs4 import BeautifulSoup
+from cssselect import parse as parse_css
+from cssselect.parser import CombinedSelector
+from django.conf import settings
+from lxml import etree
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector, LxmlHTMLTranslator, LxmlTranslator, SelectorError
+
+from .metrics import timed
+
+
+class ExtractionPlan:
+    """Base class: holds the site fields needed to build result dicts."""
+
+    backend = None
+    supports_streaming = False
+
+    def __init__(self, site):
+        self.site_name = site.name
+        self.base_url = site.base_url
+        self.container_selector = site.result_container_selector
+        self.poster_attribute = site.result_poster_attribute
+        self.page_link_selector = site.next_page_selector
+
+    def make_result(self, title, link, poster):
+        if not link.startswith('http'):
+            link = urllib.parse.urljoin(self.base_url, link)
+        if not poster.startswith('http'):
+            poster = urllib.parse.urljoin(self.base_url, poster)
+
+        return {
+            'source': self.site_name,
+            'title': title,
+            'link': link,
+            'poster': poster,
+        }
+
+    def no_containers(self):
+        print(f"[Task] No containers found for {self.site_name} with selector '{self.container_selector}'")
+
+    def extract(self, html):
+        """Returns a list of result dicts found in html."""
+        return self.extract_page(html)[0]
+
+    def extract_page(self, html):
+        """(results, pagination links) found in html."""
+        raise NotImplementedError
+
+
+class SoupPlan(ExtractionPlan):
+    """BeautifulSoup + html.parser. Slow, but the most forgiving."""
+
+    backend = 'bs4'
+
+    def __init__(self, site):
+        super().__init__(site)
+        self.title_selector = site.result_title_selector
+        self.link_selector = site.result_link_selector
+        self.poster_selector = site.result_poster_selector
+
+    def extract_page(self, html):
+        with timed('parse'):
+            soup = BeautifulSoup(html, 'html.parser')
+
+        with timed('select'):
+            return self.select(soup), self.select_page_links(soup)
+
+    def select_page_links(self, soup):
+        if not self.page_link_selector:
+            return []
+        return [(tag.text.strip(), tag['href']) for tag in soup.select(self.page_link_selector) if tag.get('href')]
+
+    def select(self, soup):
+        containers = soup.select(self.container_selector)
+
+        if not containers:
+            self.no_containers()
+
+        results = []
+        for item in containers:
+            try:
+                title_tag = item.select_one(self.title_selector)
+                link_tag = item.select_one(self.link_selector)
+                poster_tag = item.select_one(self.poster_selector)
+
+                if not all([title_tag, link_tag, poster_tag]):
+                    continue
+
+                results.append(self.make_result(
+                    title_tag.text.strip(),
+                    link_tag['href'],
+                    poster_tag[self.poster_attribute],
+                ))
+
+            except Exception as e:
+                print(f"[Parsing Error] Failed to parse item from {self.site_name}: {e}")
+                continue
+
+        return results
+
+
+# How to find, from an element, the element its combinator points back to
+COMBINATOR_AXES = {
+    ' ': 'ancestor::*',
+    '>': 'parent::*',
+    '~': 'preceding-sibling::*',
+    '+': 'preceding-sibling::*[1]',
+}
+
+
+def _self_test(tree, translator):
+    """XPath step true when the context element matches tree, combinators included."""
+    if isinstance(tree, CombinedSelector):
+        left = _self_test(tree.selector, translator)
+        return f"self::{translator.xpath(tree.subselector)}[{COMBINATOR_AXES[tree.combinator]}[{left}]]"
+    return f"self::{translator.xpath(tree)}"
+
+
+def compile_self_match(css):
+    """
+    Compiles css into an XPath that is true when the context element itself
+    matches it. Combinators are checked by walking up to the ancestors and
+    back to the preceding siblings, which a streamed element already has,
+    so a single element is tested without searching the whole tree.
+    """
+    translator = LxmlHTMLTranslator()
+    return etree.XPath(' | '.join(_self_test(selector.parsed_tree, translator) for selector in parse_css(css)))
+
+
+def compile_descendants(css):
+    """
+    Like CSSSelector(css), but only matches below the context element, as
+    BeautifulSoup's select_one does (CSSSelector includes the element itself).
+    """
+    return etree.XPath(LxmlTranslator().css_to_xpath(css, prefix='descendant::'))
+
+
+class LxmlPlan(ExtractionPlan):
+    """lxml's C parser with the selectors compiled to XPath once."""
+
+    backend = 'lxml'
+    supports_streaming = True
+
+    def __init__(self, site):
+        super().__init__(site)
+        # Raises SelectorError for selectors cssselect doesn't support
+        self.container = CSSSelector(site.result_container_selector)
+        self.title = compile_descendants(site.result_title_selector)
+        self.link = compile_descendants(site.result_link_selector)
+        self.poster = compile_descendants(site.result_poster_selector)
+        self.container_self = compile_self_match(site.result_container_selector)
+        self.page_link = None
+        if site.next_page_selector:
+            self.page_link = CSSSelector(site.next_page_selector)
+            self.page_link_self = compile_self_match(site.next_page_selector)
+
+    @staticmethod
+    def first(selector, element):
+        matches = selector(element)
+        return matches[0] if matches else None
+
+    def extract_item(self, item):
+        """The result dict for one container element, or None if it's incomplete."""
+        title_tag = self.first(self.title, item)
+        link_tag = self.first(self.link, item)
+        poster_tag = self.first(self.poster, item)
+
+        if title_tag is None or link_tag is None or poster_tag is None:
+            return None
+
+        link = link_tag.get('href')
+        poster = poster_tag.get(self.poster_attribute)
+        if link is None or poster is None:
+            return None
+
+        return self.make_result(title_tag.text_content().strip(), link, poster)
+
+    def is_container(self, element):
+        return isinstance(element.tag, str) and bool(self.container_self(element))
+
+    def page_link_of(self, element):
+        """(text, href) if element is a pagination link, else None."""
+        if self.page_link is None or not isinstance(element.tag, str) or not self.page_link_self(element):
+            return None
+        href = element.get('href')
+        return (element.text_content().strip(), href) if href else None
+
+    def extract_page(self, html):
+        try:
+            with timed('parse'):
+                root = lxml_html.document_fromstring(html)
+        except (etree.ParserError, ValueError, TypeError) as e:
+            print(f"[Parsing Error] Could not parse page from {self.site_name}: {e}")
+            return [], []
+
+        with timed('select'):
+            return self.select(root), self.select_page_links(root)
+
+    def select_page_links(self, root):
+        if self.page_link is None:
+            return []
+        return [
+            (element.text_content().strip(), element.get('href'))
+            for element in self.page_link(root) if element.get('href')
+        ]
+
+    def select(self, root):
+        containers = self.container(root)
+
+        if not containers:
+            self.no_containers()
+
+        results = []
+        for item in containers:
+            result = self.extract_item(item)
+            if result:
+                results.append(result)
+
+        return results
+
+    def streaming_extractor(self, encoding=None, limit=0):
+        return StreamingExtractor(self, encoding, limit)
+
+
+class StreamingExtractor:
+    """
+    Incremental extraction with lxml's HTMLPullParser.
+    feed() a chunk of the body and get back the results whose containers
+    closed in it. Once `limit` results have been found, `done` is True and
+    the caller should stop reading. Pagination links seen so far are kept
+    in `page_links`.
+    """
+
+    def __init__(self, plan, encoding=None, limit=0):
+        self.plan = plan
+        self.limit = limit
+        self.found = 0
+        self.page_links = []
+        self.parser = etree.HTMLPullParser(events=('end',), encoding=encoding)
+        # Same element classes as lxml.html, so extract_item() works unchanged
+        self.parser.set_element_class_lookup(lxml_html.HtmlElementClassLookup())
+
+    @property
+    def done(self):
+        return bool(self.limit) and self.found >= self.limit
+
+    def feed(self, chunk):
+        with timed('parse'):
+            self.parser.feed(chunk)
+        return self.collect()
+
+    def close(self):
+        try:
+            with timed('parse'):
+                self.parser.close()
+        except etree.XMLSyntaxError:
+            pass  # Truncated or empty body: keep what we have
+        results = self.collect()
+        if not self.found:
+            self.plan.no_containers()
+        return results
+
+    def collect(self):
+        results = []
+        with timed('select'):
+            for _, element in self.parser.read_events():
+                if self.done:
+                    break
+                page_link = self.plan.page_link_of(element)
+                if page_link:
+                    self.page_links.append(page_link)
+                    continue
+                if not self.plan.is_container(element):
+                    continue
+                result = self.plan.extract_item(element)
+                if result:
+                    results.append(result)
+                    self.found += 1
+        return results
+
+
+PARSER_BACKENDS = {
+    'lxml': LxmlPlan,
+    'bs4': SoupPlan,
+}
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def compile_plan(site, backend=None):
+    """Builds a fresh plan for site, falling back to bs4 if lxml can't compile it."""
+    plan_class = PARSER_BACKENDS[backend or settings.SCRAPER_PARSER_BACKEND]
+    try:
+        return plan_class(site)
+    except SelectorError as e:
+        print(f"[Parsing] {site.name}: selector not supported by {plan_class.backend} ({e}), using bs4")
+        return SoupPlan(site)
+
+
+def get_extraction_plan(site):
+    """The cached plan for site, recompiled whenever the row has been saved."""
+    version = (settings.SCRAPER_PARSER_BACKEND, site.updated_at)
+    with _plans_lock:
+        cached = _plans.get(site.id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    plan = compile_plan(site)
+    with _plans_lock:
+        _plans[site.id] = (version, plan)
+    return plan
+
+
+def discard_plan(site_id):
+    """Drops a site's cached plan (see signals.py)."""
+    with _plans_lock:
+        _plans.pop(site_id, None)
@@ -0,0 +1,146 @@
+# File: backend/scraper_api/flaresolverr.py
+
+# FlareSolverr session pooling and Cloudflare clearance reuse.
+#
+# Sessions: each site gets its own long-lived FlareSolverr session
+# ('movie-scraper-<site id>'), so FlareSolverr keeps one warm browser
+# context per site instead of launching a fresh one for every request.
+# sessions.create is idempotent, so each worker process just creates the
+# session the first time it needs it (and again if FlareSolverr restarted).
+#
+# Clearance: after a successful solve, the cookies (cf_clearance etc.) and
+# user agent FlareSolverr used are stored in Redis, keyed by site. Until they
+# expire, requests for that site go through the plain pooled HTTP client with
+# those cookies. Only a challenged response falls back to the browser.
+
+import json
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .redis_client import get_redis
+from .scraping import build_flaresolverr_payload
+
+# Markers of a Cloudflare challenge page ("Just a moment...")
+CHALLENGE_MARKERS = ('<title>Just a moment...</title>', '/cdn-cgi/challenge-platform/', 'cf-chl-')
+CHALLENGE_SCAN_BYTES = 20000
+
+_sessions_created = set()
+
+
+def _redis():
+    return get_redis(settings.SCRAPER_CLEARANCE_REDIS_URL)
+
+
+def _clearance_key(site):
+    return f"clearance:{site.id}"
+
+
+# --- Sessions ---
+
+def session_id(site):
+    return f"movie-scraper-{site.id}"
+
+
+def needs_session(site):
+    return settings.SCRAPER_FLARESOLVERR_SESSIONS and session_id(site) not in _sessions_created
+
+
+def create_session_payload(site):
+    return {'cmd': 'sessions.create', 'session': session_id(site)}
+
+
+def mark_session_created(site):
+    _sessions_created.add(session_id(site))
+
+
+def build_request_payload(url, site, timeout):
+    """build_flaresolverr_payload plus the site's session."""
+    payload = build_flaresolverr_payload(url, timeout)
+    if settings.SCRAPER_FLARESOLVERR_SESSIONS:
+        payload['session'] = session_id(site)
+        # FlareSolverr recycles the session's browser after this long
+        payload['session_ttl_minutes'] = settings.SCRAPER_FLARESOLVERR_SESSION_TTL
+    return payload
+
+
+def is_missing_session(data):
+    """FlareSolverr lost the session (e.g. it restarted): create it again."""
+    if data.get('status') == 'ok':
+        return False
+    message = (data.get('message') or '').lower()
+    return 'session' in message and ('not exist' in message or 'not found' in message)
+
+
+def forget_session(site):
+    _sessions_created.discard(session_id(site))
+
+
+# --- Clearance cookies ---
+
+def save_clearance(site, solution):
+    """Stores the cookies + user agent from a FlareSolverr solution."""
+    if not settings.SCRAPER_CLEARANCE_REUSE:
+        return
+
+    cookies = {cookie['name']: cookie['value'] for cookie in solution.get('cookies') or []}
+    user_agent = solution.get('userAgent')
+    if not cookies or not user_agent:
+        return
+
+    ttl = settings.SCRAPER_CLEARANCE_MAX_AGE
+    for cookie in solution['cookies']:
+        expires = cookie.get('expires') or cookie.get('expiry')
+        if cookie['name'] == 'cf_clearance' and expires and expires > 0:
+            ttl = min(ttl, int(expires - time.time()))
+    if ttl <= 0:
+        return
+
+    clearance = {'cookies': cookies, 'user_agent': user_agent}
+    try:
+        _redis().set(_clearance_key(site), json.dumps(clearance), ex=ttl)
+    except redis.RedisError as e:
+        print(f"[FlareSolverr] Could not store clearance for {site.name}: {e}")
+
+
+def load_clearance(site):
+    """The stored clearance for site, or None."""
+    if not settings.SCRAPER_CLEARANCE_REUSE:
+        return None
+    try:
+        raw = _redis().get(_clearance_key(site))
+    except redis.RedisError:
+        return None
+    return json.loads(raw) if raw else None
+
+
+def drop_clearance(site):
+    try:
+        _redis().delete(_clearance_key(site))
+    except redis.RedisError:
+        pass
+
+
+def clearance_headers(clearance):
+    """Headers that make a plain request look like the browser that solved the challenge."""
+    return {
+        'User-Agent': clearance['user_agent'],
+        'Cookie': '; '.join(f"{name}={value}" for name, value in clearance['cookies'].items()),
+    }
+
+
+def is_challenged(response):
+    """True if Cloudflare answered with a challenge instead of the page."""
+    if response.headers.get('cf-mitigated') == 'challenge':
+        return True
+    if response.status_code not in (403, 429, 503):
+        return False
+    head = response.text[:CHALLENGE_SCAN_BYTES]
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+aload_clearance = sync_to_async(load_clearance, thread_sensitive=False)
+asave_clearance = sync_to_async(save_clearance, thread_sensitive=False)
+adrop_clearance = sync_to_async(drop_clearance, thread_sensitive=False)
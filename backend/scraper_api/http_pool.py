@@ -0,0 +1,319 @@
+# File: backend/scraper_api/http_pool.py
+
+# Per-worker pooled HTTP clients.
+# Every fetch (GET, POST and FlareSolverr) goes through one long-lived
+# httpx client per host, so repeat searches reuse warm keep-alive
+# connections instead of paying a new TCP + TLS handshake each time.
+#
+# - Pool size is configurable per host (SCRAPER_HTTP_HOST_POOL_SIZES).
+# - Async clients belong to the event loop that made them. Those of loops
+#   that have closed (async_to_sync's, asyncio.run's) are dropped as soon
+#   as a client is made for a new loop.
+# - HTTP/2 is used when SCRAPER_HTTP2 is on and the 'h2' package is installed.
+# - DNS answers are cached for SCRAPER_DNS_CACHE_TTL seconds, for up to
+#   SCRAPER_DNS_CACHE_SIZE hosts, by these clients only.
+# - Counters (requests, new connections, TLS handshakes, pool hits, DNS
+#   cache hits) are kept per process. Read them with get_pool_stats() or
+#   `celery -A scraper_project inspect http_pool_stats`.
+# - DNS, connect, TLS, TTFB and download times go to the current scrape's
+#   span (see metrics.py), unless the caller passes trace_stages=False.
+
+import asyncio
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+import httpcore
+import httpx
+from celery.worker.control import inspect_command
+from django.conf import settings
+
+from . import metrics
+from .cache import LRUCache
+
+try:
+    import h2  # noqa: F401  (only needed for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_pid = None
+_sync_clients = {}
+# {(loop, host): client}, see get_async_client
+_async_clients = {}
+_worker_loop = None
+_stats = Counter()
+# {(host, port): [address, ...]}
+_dns_cache = LRUCache(settings.SCRAPER_DNS_CACHE_SIZE)
+
+
+# --- Counters ---
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _trace(event_name, info):
+    """httpcore trace hook: counts new connections and TLS handshakes."""
+    if event_name == 'connection.connect_tcp.complete':
+        _count('tcp_connects')
+    elif event_name == 'connection.start_tls.complete':
+        _count('tls_handshakes')
+
+
+def _trace_stages(event_name, info):
+    _trace(event_name, info)
+    metrics.trace(event_name, info)
+
+
+async def _trace_async(event_name, info):
+    _trace(event_name, info)
+
+
+async def _trace_stages_async(event_name, info):
+    _trace_stages(event_name, info)
+
+
+def _extensions(kwargs, is_async):
+    """The request's extensions plus our trace hook. Pops trace_stages from kwargs."""
+    if kwargs.pop('trace_stages', True):
+        hook = _trace_stages_async if is_async else _trace_stages
+    else:
+        hook = _trace_async if is_async else _trace
+    return {**kwargs.pop('extensions', {}), 'trace': hook}
+
+
+def get_pool_stats():
+    """Snapshot of this process's connection-pool counters."""
+    with _lock:
+        stats = dict(_stats)
+        hosts = sorted(set(_sync_clients) | {host for _, host in _async_clients})
+    stats.setdefault('requests', 0)
+    stats.setdefault('tcp_connects', 0)
+    stats.setdefault('tls_handshakes', 0)
+    # Every request that didn't open a new connection was served from the pool
+    stats['pool_hits'] = max(stats['requests'] - stats['tcp_connects'], 0)
+    stats['hosts'] = hosts
+    stats['pid'] = os.getpid()
+    return stats
+
+
+@inspect_command()
+def http_pool_stats(state, **kwargs):
+    """Connection-pool counters for this worker."""
+    return get_pool_stats()
+
+
+# --- DNS cache ---
+# Only our own clients use it: their transports get a network backend that
+# resolves through _dns_cache and then connects to the address, while TLS
+# still verifies the hostname. socket.getaddrinfo itself is left alone.
+
+def _cached_addresses(host, port):
+    addresses = _dns_cache.get((host, port))
+    if addresses is not None:
+        _count('dns_cache_hits')
+    return addresses
+
+
+def _cache_addresses(host, port, infos, seconds):
+    """Stores getaddrinfo's answer for host and returns its addresses, in order."""
+    metrics.record('dns', seconds)
+    _count('dns_lookups')
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    _dns_cache.set((host, port), addresses, settings.SCRAPER_DNS_CACHE_TTL)
+    return addresses
+
+
+def _resolve(host, port):
+    addresses = _cached_addresses(host, port)
+    if addresses is None:
+        started = time.monotonic()
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        addresses = _cache_addresses(host, port, infos, time.monotonic() - started)
+    return addresses
+
+
+async def _aresolve(host, port):
+    addresses = _cached_addresses(host, port)
+    if addresses is None:
+        started = time.monotonic()
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        addresses = _cache_addresses(host, port, infos, time.monotonic() - started)
+    return addresses
+
+
+class CachingBackend(httpcore.NetworkBackend):
+    """Wraps a transport's network backend, resolving hosts through the DNS cache."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        error = None
+        # Like socket.create_connection: every address in turn
+        for address in _resolve(host, port):
+            try:
+                return self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        raise error
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds):
+        self.backend.sleep(seconds)
+
+
+class AsyncCachingBackend(httpcore.AsyncNetworkBackend):
+    """Async version of CachingBackend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        error = None
+        for address in await _aresolve(host, port):
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+def _transport(is_async, **options):
+    """An httpx transport whose connections resolve through the DNS cache."""
+    transport = (httpx.AsyncHTTPTransport if is_async else httpx.HTTPTransport)(**options)
+    # httpx has no option for this, so the backend goes on the httpcore pool it wraps
+    pool = transport._pool
+    if settings.SCRAPER_DNS_CACHE_TTL > 0 and hasattr(pool, '_network_backend'):
+        pool._network_backend = (AsyncCachingBackend if is_async else CachingBackend)(pool._network_backend)
+    return transport
+
+
+# --- Clients ---
+
+def _reset_if_forked():
+    """Clients and the worker loop must not be shared across a fork (Celery prefork)."""
+    global _pid, _worker_loop
+    if _pid != os.getpid():
+        if _pid is not None:
+            _sync_clients.clear()
+            _async_clients.clear()
+            _worker_loop = None
+            _stats.clear()
+        _pid = os.getpid()
+
+
+def _host_of(url):
+    return urllib.parse.urlsplit(url).netloc
+
+
+def _pool_size(host):
+    return settings.SCRAPER_HTTP_HOST_POOL_SIZES.get(host, settings.SCRAPER_HTTP_POOL_SIZE)
+
+
+def _client_options(host, is_async):
+    size = _pool_size(host)
+    transport = _transport(
+        is_async,
+        http2=settings.SCRAPER_HTTP2 and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=settings.SCRAPER_HTTP_KEEPALIVE,
+        ),
+    )
+    return {
+        'transport': transport,
+        'follow_redirects': True,
+        'timeout': 10,
+    }
+
+
+def get_client(url):
+    """The shared sync client for url's host."""
+    host = _host_of(url)
+    with _lock:
+        _reset_if_forked()
+        client = _sync_clients.get(host)
+        if client is None:
+            client = _sync_clients[host] = httpx.Client(**_client_options(host, is_async=False))
+    return client
+
+
+def get_async_client(url):
+    """The shared async client for url's host, bound to the running event loop."""
+    host = _host_of(url)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _reset_if_forked()
+        client = _async_clients.get((loop, host))
+        if client is None:
+            # Loops that have ended (async_to_sync's, asyncio.run's) take their clients with them
+            for key in [key for key in _async_clients if key[0].is_closed()]:
+                del _async_clients[key]
+            client = _async_clients[(loop, host)] = httpx.AsyncClient(**_client_options(host, is_async=True))
+    return client
+
+
+def pooled_request(method, url, **kwargs):
+    """Sync request through the pool for url's host."""
+    _count('requests')
+    extensions = _extensions(kwargs, is_async=False)
+    return get_client(url).request(method, url, extensions=extensions, **kwargs)
+
+
+async def pooled_request_async(method, url, **kwargs):
+    """Async request through the pool for url's host."""
+    _count('requests')
+    extensions = _extensions(kwargs, is_async=True)
+    return await get_async_client(url).request(method, url, extensions=extensions, **kwargs)
+
+
+def pooled_stream(method, url, **kwargs):
+    """Sync streaming request through the pool (use as a context manager)."""
+    _count('requests')
+    extensions = _extensions(kwargs, is_async=False)
+    return get_client(url).stream(method, url, extensions=extensions, **kwargs)
+
+
+def pooled_stream_async(method, url, **kwargs):
+    """Async streaming request through the pool (use as an async context manager)."""
+    _count('requests')
+    extensions = _extensions(kwargs, is_async=True)
+    return get_async_client(url).stream(method, url, extensions=extensions, **kwargs)
+
+
+def run_on_worker_loop(coro):
+    """
+    Runs coro on this process's long-lived event loop and waits for the result.
+    Async clients are bound to a loop, so a loop that outlives each task is
+    what lets the async engine keep connections warm between searches.
+    """
+    global _worker_loop
+    with _lock:
+        _reset_if_forked()
+        if _worker_loop is None:
+            _worker_loop = asyncio.new_event_loop()
+            threading.Thread(target=_worker_loop.run_forever, name='scraper-http-loop', daemon=True).start()
+        loop = _worker_loop
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
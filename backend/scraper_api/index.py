@@ -0,0 +1,136 @@
+# File: backend/scraper_api/index.py
+
+# Persistent result index.
+#
+# Every scrape upserts its results into ScrapedResult, keyed on
+# (source, link). first_seen is kept and title, poster and last_seen are
+# refreshed. In 'index_first' search mode (SCRAPER_SEARCH_MODE) the consumer
+# asks the index first. It answers from normalized_title's full-text index
+# (see migration 0006):
+#   sqlite     -> FTS5 MATCH with every search word as a prefix ('dune* part*')
+#   postgresql -> one ILIKE '%word%' per word, served by the trigram GIN index
+#   others     -> the same ILIKEs, unindexed
+#
+# A site's hits are "fresh" if one of them was seen by a scrape within the
+# site's cache_ttl (SCRAPER_INDEX_MAX_AGE for sites with caching off). The
+# consumer only sends live scrapes to the other sites.
+
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import normalize_term
+from .models import ScrapedResult
+
+FTS_TABLE = 'scraper_api_scrapedresult_fts'
+
+
+def search_words(search_term):
+    return re.findall(r'\w+', normalize_term(search_term))
+
+
+def index_results(site, results):
+    """Bulk-upserts one scrape's results for site. False if the database refused."""
+    if not settings.SCRAPER_INDEX_RESULTS or not results:
+        return True
+
+    now = timezone.now()
+    # One row per link: Postgres refuses to upsert the same row twice in one statement
+    rows = {}
+    for result in results:
+        rows[result['link']] = ScrapedResult(
+            source_id=site.id,
+            title=result['title'][:500],
+            normalized_title=normalize_term(result['title'])[:500],
+            link=result['link'],
+            poster=result['poster'],
+            first_seen=now,
+            last_seen=now,
+        )
+
+    try:
+        ScrapedResult.objects.bulk_create(
+            rows.values(),
+            batch_size=settings.SCRAPER_INDEX_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['source', 'link'],
+            update_fields=['title', 'normalized_title', 'poster', 'last_seen'],
+        )
+    except DatabaseError as e:
+        print(f"[Index] Could not index results from {site.name}: {e}")
+        return False
+    return True
+
+
+def matching_results(search_term):
+    """ScrapedResult queryset of titles containing every word of search_term."""
+    words = search_words(search_term)
+    if not words:
+        return ScrapedResult.objects.none()
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        return ScrapedResult.objects.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        )
+
+    queryset = ScrapedResult.objects.all()
+    for word in words:
+        queryset = queryset.filter(normalized_title__icontains=word)
+    return queryset
+
+
+def _max_age(site):
+    return site.cache_ttl or settings.SCRAPER_INDEX_MAX_AGE
+
+
+def search_index(sites, search_term):
+    """
+    Indexed hits for search_term, per site: {site_id: (results, fresh)}.
+    Sites without hits are left out. Each site returns at most
+    site.max_results (or SCRAPER_INDEX_MAX_HITS) results, most recently seen first.
+    """
+    sites_by_id = {site.id: site for site in sites}
+    limits = {site.id: site.max_results or settings.SCRAPER_INDEX_MAX_HITS for site in sites}
+    if not limits:
+        return {}
+
+    queryset = matching_results(search_term).filter(source_id__in=sites_by_id)
+    try:
+        if connection.features.supports_over_clause:
+            # Each site's newest rows only, so a common word can't load the whole index
+            queryset = queryset.annotate(
+                rank=Window(RowNumber(), partition_by=F('source_id'), order_by=F('last_seen').desc())
+            ).filter(rank__lte=max(limits.values()))
+            limit = None
+        else:
+            limit = sum(limits.values())
+        rows = list(
+            queryset.order_by('-last_seen')
+            .values_list('source_id', 'title', 'link', 'poster', 'last_seen')[:limit]
+        )
+    except DatabaseError as e:
+        print(f"[Index] Search failed, falling back to live scrapes: {e}")
+        return {}
+
+    now = timezone.now()
+    hits = {}
+    for source_id, title, link, poster, last_seen in rows:
+        site = sites_by_id[source_id]
+        if source_id not in hits:
+            # Rows come newest first, so the first one decides freshness
+            hits[source_id] = ([], (now - last_seen).total_seconds() < _max_age(site))
+        results = hits[source_id][0]
+        if len(results) < limits[source_id]:
+            results.append({'source': site.name, 'title': title, 'link': link, 'poster': poster})
+    return hits
+
+
+aindex_results = sync_to_async(index_results)
+asearch_index = sync_to_async(search_index)
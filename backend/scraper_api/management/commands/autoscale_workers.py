@@ -0,0 +1,132 @@
+# File: backend/scraper_api/management/commands/autoscale_workers.py
+
+# Sizes the scrape workers' pools to their queues' backlog.
+#
+# Every SCRAPER_AUTOSCALE_INTERVAL seconds:
+#   1. asks the workers (Celery remote control) which queues they consume
+#      and how many pool processes they run, and publishes each queue's
+#      total as its capacity (see capacity.set_capacity), which is what
+#      turns a queue depth into an expected wait for load-aware dispatch
+#   2. when a queue's backlog would wait longer than
+#      SCRAPER_AUTOSCALE_TARGET_WAIT, grows its workers' pools by
+#      SCRAPER_AUTOSCALE_STEP processes, up to SCRAPER_AUTOSCALE_MAX each
+#   3. once a queue has been empty for SCRAPER_AUTOSCALE_COOLDOWN seconds,
+#      shrinks them again, down to SCRAPER_AUTOSCALE_MIN
+# Only prefork pools can be resized this way. Workers on other pools
+# (threads, gevent) still count towards capacity; scale those by adding
+# replicas (see docker-compose.yml, profile "scale").
+#
+# Run one next to Celery beat:
+#   python manage.py autoscale_workers
+#   python manage.py autoscale_workers --once --dry-run   # just report
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from scraper_api.capacity import expected_wait, get_queue_loads, jobs_ahead, lane_queues, set_capacity
+from scraper_project.celery import app
+
+PREFORK = 'celery.concurrency.prefork:TaskPool'
+
+
+def survey_workers(timeout=1.0):
+    """{worker: (queue names, pool processes, resizable)} for the workers that answered."""
+    inspect = app.control.inspect(timeout=timeout)
+    queues = inspect.active_queues() or {}
+    stats = inspect.stats() or {}
+    workers = {}
+    for worker, worker_queues in queues.items():
+        pool = stats.get(worker, {}).get('pool', {})
+        processes = len(pool.get('processes', [])) or pool.get('max-concurrency', 0)
+        workers[worker] = (
+            {queue['name'] for queue in worker_queues},
+            processes,
+            pool.get('implementation') == PREFORK,
+        )
+    return workers
+
+
+class Command(BaseCommand):
+    help = "Publishes queue capacity and grows or shrinks the scrape workers' pools to match the backlog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Check once and exit.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change, don't resize.")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        # {queue: monotonic time it was last seen with a backlog}
+        self.last_busy = {}
+        while True:
+            self.check()
+            if options['once']:
+                return
+            time.sleep(settings.SCRAPER_AUTOSCALE_INTERVAL)
+
+    def log(self, message):
+        self.stdout.write(f"[Autoscaler] {message}")
+
+    def check(self):
+        workers = survey_workers()
+        if not workers:
+            self.log("No workers answered")
+            return
+
+        queues = lane_queues()
+        capacities = {
+            queue: sum(processes for names, processes, _ in workers.values() if queue in names)
+            for queue in queues
+        }
+        # Expires if this command stops, so stale capacities aren't trusted
+        set_capacity(capacities, ttl=int(settings.SCRAPER_AUTOSCALE_INTERVAL * 3) + 1)
+
+        resized = set()
+        for queue, load in get_queue_loads(queues).items():
+            load = load._replace(capacity=capacities[queue])
+            # Every job waiting, whatever its priority
+            ahead = jobs_ahead(load, len(load.depths) - 1)
+            wait = expected_wait(load, len(load.depths) - 1)
+            self.log(f"{queue}: {ahead} waiting, {load.capacity} slots, expected wait {wait if wait is not None else '?'}s")
+
+            now = time.monotonic()
+            if ahead:
+                self.last_busy[queue] = now
+            members = [
+                worker for worker, (names, _, resizable) in workers.items()
+                if queue in names and resizable and worker not in resized
+            ]
+            over_target = wait > settings.SCRAPER_AUTOSCALE_TARGET_WAIT if wait is not None else ahead > load.capacity
+            if over_target:
+                resized.update(self.grow(members, workers))
+            elif not ahead and now - self.last_busy.get(queue, 0) > settings.SCRAPER_AUTOSCALE_COOLDOWN:
+                resized.update(self.shrink(members, workers))
+
+    def grow(self, members, workers):
+        grown = []
+        for worker in members:
+            processes = workers[worker][1]
+            step = min(settings.SCRAPER_AUTOSCALE_STEP, settings.SCRAPER_AUTOSCALE_MAX - processes)
+            if step <= 0:
+                continue
+            self.log(f"Growing {worker}: {processes} -> {processes + step} processes")
+            if not self.dry_run:
+                app.control.pool_grow(step, destination=[worker])
+            grown.append(worker)
+        if members and not grown:
+            self.log("Every resizable worker is at SCRAPER_AUTOSCALE_MAX; add replicas to go further")
+        return grown
+
+    def shrink(self, members, workers):
+        shrunk = []
+        for worker in members:
+            processes = workers[worker][1]
+            step = min(settings.SCRAPER_AUTOSCALE_STEP, processes - settings.SCRAPER_AUTOSCALE_MIN)
+            if step <= 0:
+                continue
+            self.log(f"Shrinking {worker}: {processes} -> {processes - step} processes")
+            if not self.dry_run:
+                app.control.pool_shrink(step, destination=[worker])
+            shrunk.append(worker)
+        return shrunk
@@ -0,0 +1,165 @@
+# File: backend/scraper_api/merging.py
+
+# Cross-source merge stage, one ResultMerger per search (see consumers.py).
+#
+# Titles are normalized into a set of content tokens plus a release year:
+# quality tags (1080p, WEB-DL, x265...), language tags (Hindi, Dual Audio,
+# ESub...), punctuation and stop words are dropped, so
+#   'Dune: Part Two (2024) 1080p WEB-DL Hindi' -> {'dune', 'part', '2'}, 2024
+# Season/episode markers (S01, E05) are kept: different seasons are
+# different items.
+#
+# Two results are the same film when their years don't contradict and the
+# Jaccard similarity of their token sets is at least SCRAPER_MERGE_THRESHOLD.
+# Candidates come from an inverted token index, so each result is only
+# compared against clusters that share a word with it.
+#
+# A result either starts a new cluster (sent to the client as a new card) or
+# joins an existing one (sent as an update that adds a source to that card).
+# Every cluster has a relevance score against the search term, and the client
+# orders its cards by it.
+
+import re
+
+from django.conf import settings
+
+from .cache import normalize_term
+
+QUALITY_TAGS = {
+    '240p', '360p', '480p', '540p', '720p', '1080p', '1440p', '2160p', '4k', 'uhd', 'hd', 'fhd', 'sd',
+    'hdr', 'hdr10', 'dv', 'sdr', '10bit', '8bit', 'x264', 'x265', 'h264', 'h265', 'hevc', 'avc', 'av1',
+    'bluray', 'blu', 'ray', 'brrip', 'bdrip', 'webrip', 'web', 'dl', 'webdl', 'hdrip', 'dvdrip', 'dvdscr',
+    'hdtv', 'hdcam', 'cam', 'camrip', 'ts', 'hdts', 'tc', 'predvd', 'remux', 'proper', 'repack',
+    'aac', 'ac3', 'dd', 'ddp', 'dts', 'atmos', '2ch', '6ch', 'mkv', 'mp4', 'avi', 'gb', 'mb',
+    'download', 'watch', 'online', 'free', 'full', 'movie', 'film', 'series', 'complete', 'hq', 'nf', 'amzn',
+}
+
+LANGUAGE_TAGS = {
+    'hindi', 'english', 'eng', 'tamil', 'telugu', 'malayalam', 'kannada', 'bengali', 'marathi', 'punjabi',
+    'urdu', 'korean', 'japanese', 'chinese', 'spanish', 'french', 'german', 'dual', 'multi', 'audio',
+    'dubbed', 'dub', 'org', 'original', 'esub', 'esubs', 'sub', 'subs', 'subbed', 'subtitles', 'msub', 'msubs',
+}
+
+STOP_WORDS = {'the', 'a', 'an', 'and', 'of', 'in', 'on', 'to', 'with', '&'}
+
+# 'Part Two' / 'Part II' / 'Part 2' are the same sequel
+NUMBERS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7',
+    'eight': '8', 'nine': '9', 'ten': '10', 'ii': '2', 'iii': '3', 'iv': '4', 'vi': '6', 'vii': '7',
+}
+
+# Size suffixes ('1.4gb'), resolutions/bitrates ('1080p', '10bit') and
+# channel layouts ('5.1') never name a film
+NOISE = re.compile(r'^(\d+(\.\d+)?(gb|mb)|\d{3,4}p|\d+bit|\d\.\d)$')
+YEAR = re.compile(r'\b(19[0-9]{2}|20[0-9]{2})\b')
+TOKEN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+
+
+def normalize_title(title):
+    """(frozenset of content tokens, year or None) for a scraped title."""
+    text = normalize_term(title)
+    years = YEAR.findall(text)
+    year = int(years[-1]) if years else None
+
+    tokens = set()
+    for token in TOKEN.findall(text):
+        if token in QUALITY_TAGS or token in LANGUAGE_TAGS or token in STOP_WORDS or NOISE.match(token):
+            continue
+        if year is not None and token == str(year):
+            continue
+        tokens.add(NUMBERS.get(token, token))
+    return frozenset(tokens), year
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def relevance(query_tokens, tokens):
+    """
+    How well a title answers the search: mostly the share of search words it
+    contains (a prefix counts, for half-typed words), plus a little for not
+    carrying many extra words.
+    """
+    if not query_tokens:
+        return 0.0
+    covered = sum(1 for q in query_tokens if q in tokens or any(t.startswith(q) for t in tokens))
+    return round(0.7 * covered / len(query_tokens) + 0.3 * jaccard(query_tokens, tokens), 3)
+
+
+class Cluster:
+
+    def __init__(self, cluster_id, result, tokens, year, score):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.year = year
+        self.score = score
+        self.first = result
+        self.links = {result['link']}
+        self.sources = [self.entry(result)]
+
+    @staticmethod
+    def entry(result):
+        return {'source': result['source'], 'title': result['title'], 'link': result['link']}
+
+    def as_result(self):
+        return dict(self.first, id=self.id, score=self.score, sources=list(self.sources))
+
+
+class ResultMerger:
+    """
+    Clusters the results of one search across every source.
+    merge() returns (new_results, updates): cards to add, and
+    {'id', 'sources', 'score'} entries that extend cards already sent.
+    """
+
+    def __init__(self, search_term, threshold=None):
+        self.query_tokens, _ = normalize_title(search_term)
+        self.threshold = settings.SCRAPER_MERGE_THRESHOLD if threshold is None else threshold
+        self.clusters = []
+        self.by_token = {}
+
+    def find(self, tokens, year):
+        candidates = set()
+        for token in tokens:
+            candidates.update(self.by_token.get(token, ()))
+
+        best, best_similarity = None, self.threshold
+        for cluster_id in candidates:
+            cluster = self.clusters[cluster_id]
+            if year is not None and cluster.year is not None and year != cluster.year:
+                continue
+            similarity = jaccard(tokens, cluster.tokens)
+            if similarity >= best_similarity:
+                best, best_similarity = cluster, similarity
+        return best
+
+    def merge(self, results):
+        new_clusters = []
+        updates = {}
+        for result in results:
+            tokens, year = normalize_title(result['title'])
+            cluster = self.find(tokens, year) if tokens else None
+
+            if cluster is None:
+                cluster = Cluster(len(self.clusters), result, tokens, year, relevance(self.query_tokens, tokens))
+                self.clusters.append(cluster)
+                for token in tokens:
+                    self.by_token.setdefault(token, []).append(cluster.id)
+                new_clusters.append(cluster)
+                continue
+
+            if result['link'] in cluster.links:
+                continue
+            cluster.links.add(result['link'])
+            if cluster.year is None:
+                cluster.year = year
+            cluster.sources.append(Cluster.entry(result))
+            if cluster in new_clusters:
+                continue  # Not sent yet: the new card will carry this source
+            update = updates.setdefault(cluster.id, {'id': cluster.id, 'sources': [], 'score': cluster.score})
+            update['sources'].append(Cluster.entry(result))
+
+        return [cluster.as_result() for cluster in new_clusters], list(updates.values())
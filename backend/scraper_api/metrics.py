@@ -0,0 +1,259 @@
+# File: backend/scraper_api/metrics.py
+
+# Where a search's time goes, per site and per stage.
+#
+# Every site scrape runs inside a ScrapeSpan (scrape_span / ascrape_span).
+# Code anywhere below it adds time to a stage with record() or timed().
+# The current span is found through a contextvar, so nothing has to be
+# passed down the call chain. Stages:
+#   queue_wait    dispatch -> the task starting on a worker
+#   dns           real DNS lookups (cache misses, see http_pool.py)
+#   connect       TCP connect, without DNS
+#   tls           TLS handshake
+#   ttfb          request sent -> response headers received
+#   download      response body, minus the time spent parsing streamed chunks
+#   flaresolverr  FlareSolverr solve (the whole POST)
+#   render        Playwright render (see browser_pool.py)
+#   parse         building the HTML tree
+#   select        running the site's selectors over it
+#   send          channel-layer sends of the results
+#   total         the whole scrape
+# The network stages come from httpx's trace hooks. They are only recorded
+# for the site's own requests, not FlareSolverr's.
+#
+# When a span ends, its stages go to:
+#   - Prometheus: histogram scraper_stage_seconds{site, stage} and counter
+#     scraper_scrapes_total{site, outcome}. Served on /metrics (see views.py).
+#   - Redis: health:<id>:stage:<stage>, the last SCRAPER_LATENCY_WINDOW
+#     samples per stage, for the p50/p95 columns in the admin.
+#   - stdout: one "[Timing] {...}" JSON line per scrape.
+#   - Redis: the scrape and queue wait times of its Celery queue, for
+#     load-aware dispatch and the autoscaler (see capacity.py).
+# The consumer also times each search, from the request to its first results
+# frame (scraper_search_first_result_seconds), and the poster view counts
+# its requests by outcome (scraper_poster_requests_total: served, failed,
+# evicted).
+#
+# Daphne and the Celery workers are separate processes. For /metrics to
+# include the workers' figures, start every process with the same
+# PROMETHEUS_MULTIPROC_DIR (an empty directory on the same host). Without
+# it, /metrics only shows the Daphne process.
+
+import contextvars
+import json
+import os
+import statistics
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .capacity import record_job
+from .redis_client import get_redis
+from .resilience import percentile
+
+STAGES = (
+    'queue_wait', 'dns', 'connect', 'tls', 'ttfb', 'download',
+    'flaresolverr', 'render', 'parse', 'select', 'send', 'total',
+)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    'scraper_stage_seconds', 'Time spent in each stage of a site scrape', ['site', 'stage'], buckets=BUCKETS
+)
+SCRAPES = Counter('scraper_scrapes_total', 'Site scrapes by outcome', ['site', 'outcome'])
+SEARCH_FIRST_RESULT = Histogram(
+    'scraper_search_first_result_seconds', 'Search request to its first results frame', buckets=BUCKETS
+)
+SEARCH_COMPLETE = Histogram(
+    'scraper_search_complete_seconds', 'Search request to its search_complete frame', ['timed_out'], buckets=BUCKETS
+)
+SEARCHES = Counter('scraper_searches_total', 'Searches started')
+POSTERS = Counter('scraper_poster_requests_total', 'Poster thumbnail requests by outcome', ['outcome'])
+
+_current = contextvars.ContextVar('scrape_span', default=None)
+
+
+class ScrapeSpan:
+    """Stage timings of one site's scrape."""
+
+    def __init__(self, site, search_term, channel_name, queue=None):
+        self.site = site
+        self.search_term = search_term
+        self.channel_name = channel_name
+        self.queue = queue
+        self.outcome = 'ok'
+        self.stages = {}
+        self.started = time.monotonic()
+        # Open network phases, see trace()
+        self.marks = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + max(seconds, 0.0)
+
+    def finish(self):
+        self.stages['total'] = time.monotonic() - self.started
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.labels(self.site.name, stage).observe(seconds)
+        SCRAPES.labels(self.site.name, self.outcome).inc()
+        save_samples(self.site, self.stages)
+        if self.queue:
+            record_job(self.queue, self.stages['total'], self.stages.get('queue_wait'))
+        print("[Timing] " + json.dumps({
+            'site': self.site.name,
+            'term': self.search_term,
+            'channel': self.channel_name,
+            'outcome': self.outcome,
+            **{stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+        }))
+
+
+@contextmanager
+def scrape_span(site, search_term, channel_name, enqueued_at=None, queue=None):
+    span = ScrapeSpan(site, search_term, channel_name, queue)
+    if enqueued_at:
+        span.add('queue_wait', time.time() - enqueued_at)
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+        span.finish()
+
+
+@asynccontextmanager
+async def ascrape_span(site, search_term, channel_name, enqueued_at=None, queue=None):
+    """Async version of scrape_span, for the fan-out engine."""
+    span = ScrapeSpan(site, search_term, channel_name, queue)
+    if enqueued_at:
+        span.add('queue_wait', time.time() - enqueued_at)
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+        await sync_to_async(span.finish)()
+
+
+def record(stage, seconds):
+    """Adds seconds to stage of the current scrape, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.add(stage, seconds)
+
+
+def set_outcome(outcome):
+    span = _current.get()
+    if span is not None:
+        span.outcome = outcome
+
+
+@contextmanager
+def timed(stage):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record(stage, time.monotonic() - started)
+
+
+# --- Network stages from httpx/httpcore trace events ---
+
+def trace(event_name, info):
+    """Turns httpcore trace events into connect/tls/ttfb/download times."""
+    span = _current.get()
+    if span is None:
+        return
+    phase, _, step = event_name.rpartition('.')
+    now = time.monotonic()
+    if step == 'started':
+        if phase.endswith('connect_tcp'):
+            # The DNS lookup happens inside connect_tcp and is recorded on its own
+            span.marks[phase] = (now, span.stages.get('dns', 0.0))
+        elif phase.endswith('receive_response_body'):
+            # Streamed bodies are parsed between chunks; don't count that twice
+            span.marks[phase] = (now, span.stages.get('parse', 0.0) + span.stages.get('select', 0.0))
+        else:
+            span.marks[phase] = (now, 0.0)
+        return
+
+    started, overlap = span.marks.pop(phase, (None, 0.0))
+    # A body we stop reading early (enough results) ends as 'failed' too
+    if started is None or (step == 'failed' and not phase.endswith('receive_response_body')):
+        return
+    if phase.endswith('connect_tcp'):
+        span.add('connect', now - started - (span.stages.get('dns', 0.0) - overlap))
+    elif phase.endswith('start_tls'):
+        span.add('tls', now - started)
+    elif phase.endswith('send_request_headers'):
+        # ttfb runs from here to the response headers
+        span.marks['ttfb'] = (started, 0.0)
+    elif phase.endswith('receive_response_headers'):
+        ttfb_started, _ = span.marks.pop('ttfb', (started, 0.0))
+        span.add('ttfb', now - ttfb_started)
+    elif phase.endswith('receive_response_body'):
+        parsed = span.stages.get('parse', 0.0) + span.stages.get('select', 0.0)
+        span.add('download', now - started - (parsed - overlap))
+
+
+# --- Samples for the admin ---
+
+def _redis():
+    return get_redis(settings.SCRAPER_HEALTH_REDIS_URL)
+
+
+def _stage_key(site_id, stage):
+    return f"health:{site_id}:stage:{stage}"
+
+
+def save_samples(site, stages):
+    try:
+        with _redis().pipeline(transaction=False) as pipe:
+            for stage, seconds in stages.items():
+                pipe.lpush(_stage_key(site.id, stage), round(seconds, 4))
+                pipe.ltrim(_stage_key(site.id, stage), 0, settings.SCRAPER_LATENCY_WINDOW - 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Metrics] Could not save stage timings for {site.name}: {e}")
+
+
+def get_stage_percentiles(site):
+    """{stage: (p50, p95, samples)} for the stages site has samples for, in STAGES order."""
+    try:
+        with _redis().pipeline(transaction=False) as pipe:
+            for stage in STAGES:
+                pipe.lrange(_stage_key(site.id, stage), 0, -1)
+            samples = pipe.execute()
+    except redis.RedisError:
+        return {}
+
+    percentiles = {}
+    for stage, values in zip(STAGES, samples):
+        values = sorted(float(value) for value in values)
+        if values:
+            percentiles[stage] = (statistics.median(values), percentile(values, 0.95), len(values))
+    return percentiles
+
+
+# --- /metrics ---
+
+def render_metrics():
+    """(body, content type) in the Prometheus text format."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesource',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(default=600, help_text='Seconds a cached search result stays fresh. 0 disables caching for this site.'),
+        ),
+        migrations.AddField(
+            model_name='sitesource',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
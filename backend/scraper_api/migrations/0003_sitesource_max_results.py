@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0002_sitesource_caching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesource',
+            name='max_results',
+            field=models.PositiveIntegerField(default=0, help_text="Stop after this many results (0 = no limit). When streaming, the rest of the page isn't downloaded."),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0003_sitesource_max_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesource',
+            name='alternate_base_url',
+            field=models.URLField(blank=True, help_text="Optional mirror with the same layout, e.g. 'https://vegamovies.gripe'", max_length=255),
+        ),
+        migrations.AddField(
+            model_name='sitesource',
+            name='hedge_requests',
+            field=models.BooleanField(default=False, help_text='If the site is slower than usual, also try the alternate base URL and use whichever answers first'),
+        ),
+    ]
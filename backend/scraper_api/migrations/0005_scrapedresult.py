@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0004_sitesource_hedging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=500)),
+                ('normalized_title', models.CharField(max_length=500)),
+                ('link', models.URLField(max_length=1000)),
+                ('poster', models.URLField(blank=True, max_length=1000)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField(db_index=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scraped_results', to='scraper_api.sitesource')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'link'), name='unique_scraped_result_link')],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Full-text index on ScrapedResult.normalized_title (see scraper_api/index.py).
+# SQLite: an external-content FTS5 table kept in sync by triggers.
+# Postgres: pg_trgm + a GIN trigram index, used by ILIKE '%word%'.
+# Other backends get no index and index.py falls back to plain icontains.
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE scraper_api_scrapedresult_fts USING fts5(
+        normalized_title, content='scraper_api_scrapedresult', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER scraper_api_scrapedresult_fts_ai AFTER INSERT ON scraper_api_scrapedresult BEGIN
+        INSERT INTO scraper_api_scrapedresult_fts(rowid, normalized_title) VALUES (new.id, new.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER scraper_api_scrapedresult_fts_ad AFTER DELETE ON scraper_api_scrapedresult BEGIN
+        INSERT INTO scraper_api_scrapedresult_fts(scraper_api_scrapedresult_fts, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER scraper_api_scrapedresult_fts_au AFTER UPDATE OF normalized_title ON scraper_api_scrapedresult BEGIN
+        INSERT INTO scraper_api_scrapedresult_fts(scraper_api_scrapedresult_fts, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+        INSERT INTO scraper_api_scrapedresult_fts(rowid, normalized_title) VALUES (new.id, new.normalized_title);
+    END
+    """,
+    "INSERT INTO scraper_api_scrapedresult_fts(scraper_api_scrapedresult_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS scraper_api_scrapedresult_fts_au",
+    "DROP TRIGGER IF EXISTS scraper_api_scrapedresult_fts_ad",
+    "DROP TRIGGER IF EXISTS scraper_api_scrapedresult_fts_ai",
+    "DROP TABLE IF EXISTS scraper_api_scrapedresult_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS scraper_api_scrapedresult_title_trgm
+    ON scraper_api_scrapedresult USING gin (normalized_title gin_trgm_ops)
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS scraper_api_scrapedresult_title_trgm",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0005_scrapedresult'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def playwright_flag_to_renderer(apps, schema_editor):
+    # The old checkbox always meant FlareSolverr
+    SiteSource = apps.get_model('scraper_api', 'SiteSource')
+    SiteSource.objects.filter(requires_playwright=True).update(renderer='flaresolverr')
+
+
+def renderer_to_playwright_flag(apps, schema_editor):
+    SiteSource = apps.get_model('scraper_api', 'SiteSource')
+    SiteSource.objects.exclude(renderer='none').update(requires_playwright=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0006_scrapedresult_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesource',
+            name='renderer',
+            field=models.CharField(choices=[('none', 'None (plain HTTP)'), ('flaresolverr', 'FlareSolverr (Cloudflare)'), ('playwright', 'Playwright browser pool (JS rendering)')], default='none', help_text='FlareSolverr for Cloudflare-protected sites, Playwright for sites that render their results with JS', max_length=12),
+        ),
+        migrations.RunPython(playwright_flag_to_renderer, renderer_to_playwright_flag),
+        migrations.RemoveField(
+            model_name='sitesource',
+            name='requires_playwright',
+        ),
+    ]
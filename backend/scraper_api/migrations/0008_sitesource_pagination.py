@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_api', '0007_sitesource_renderer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesource',
+            name='max_pages',
+            field=models.PositiveIntegerField(default=1, help_text='Result pages to fetch (1 = first page only). Pages 2 and up are fetched at the same time, once page 1 is in.'),
+        ),
+        migrations.AddField(
+            model_name='sitesource',
+            name='next_page_selector',
+            field=models.CharField(blank=True, help_text="CSS selector for page 1's pagination links (e.g. 'a.page-numbers'). Their highest number is the page count; without a template, their URLs are used.", max_length=255),
+        ),
+        migrations.AddField(
+            model_name='sitesource',
+            name='page_url_template',
+            field=models.CharField(blank=True, help_text="Path of result page %PAGE%, with %QUERY% as in the search endpoint, e.g. '/page/%PAGE%/?s=%QUERY%'", max_length=255),
+        ),
+    ]
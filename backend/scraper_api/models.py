@@ -8,6 +8,11 @@ class SiteSource(models.Model):
         GET = 'GET', 'GET Parameter'
         POST = 'POST', 'POST API'
 
+    class Renderer(models.TextChoices):
+        NONE = 'none', 'None (plain HTTP)'
+        FLARESOLVERR = 'flaresolverr', 'FlareSolverr (Cloudflare)'
+        PLAYWRIGHT = 'playwright', 'Playwright browser pool (JS rendering)'
+
     name = models.CharField(max_length=100, unique=True)
     base_url = models.URLField(max_length=255, help_text="The base URL, e.g., 'https://vegamovies.talk'")
     is_active = models.BooleanField(default=True, help_text="Include this site in searches")
@@ -23,9 +28,20 @@ class SiteSource(models.Model):
         null=True,
         help_text="For POST type only. A JSON/form-data template with '%QUERY%' as placeholder."
     )
-    requires_playwright = models.BooleanField(
-        default=False, 
-        help_text="Check this if the site is protected by Cloudflare or requires JS rendering"
+    renderer = models.CharField(
+        max_length=12,
+        choices=Renderer.choices,
+        default=Renderer.NONE,
+        help_text="FlareSolverr for Cloudflare-protected sites, Playwright for sites that render their results with JS"
+    )
+    alternate_base_url = models.URLField(
+        max_length=255,
+        blank=True,
+        help_text="Optional mirror with the same layout, e.g. 'https://vegamovies.gripe'"
+    )
+    hedge_requests = models.BooleanField(
+        default=False,
+        help_text="If the site is slower than usual, also try the alternate base URL and use whichever answers first"
     )
 
     # --- CSS Selector "Pattern" ---
@@ -51,6 +67,57 @@ class SiteSource(models.Model):
         help_text="The attribute holding the image URL (e.g., 'src', 'data-src')"
     )
 
+    max_results = models.PositiveIntegerField(
+        default=0,
+        help_text="Stop after this many results (0 = no limit). When streaming, the rest of the page isn't downloaded."
+    )
+
+    # --- Pagination ---
+    max_pages = models.PositiveIntegerField(
+        default=1,
+        help_text="Result pages to fetch (1 = first page only). Pages 2 and up are fetched at the same time, once page 1 is in."
+    )
+    page_url_template = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Path of result page %PAGE%, with %QUERY% as in the search endpoint, e.g. '/page/%PAGE%/?s=%QUERY%'"
+    )
+    next_page_selector = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="CSS selector for page 1's pagination links (e.g. 'a.page-numbers'). Their highest number is the page count; without a template, their URLs are used."
+    )
+
+    # --- Caching ---
+    cache_ttl = models.PositiveIntegerField(
+        default=600,
+        help_text="Seconds a cached search result stays fresh. 0 disables caching for this site."
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
 
+
+
+class ScrapedResult(models.Model):
+    """
+    One result a site has returned, kept so repeat searches can be answered
+    from the database (see index.py). Rows are upserted on (source, link).
+    normalized_title has a full-text index: FTS5 on SQLite, trigram on Postgres.
+    """
+    source = models.ForeignKey(SiteSource, on_delete=models.CASCADE, related_name='scraped_results')
+    title = models.CharField(max_length=500)
+    normalized_title = models.CharField(max_length=500)
+    link = models.URLField(max_length=1000)
+    poster = models.URLField(max_length=1000, blank=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'link'], name='unique_scraped_result_link'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.source})"
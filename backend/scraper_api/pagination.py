@@ -0,0 +1,107 @@
+# File: backend/scraper_api/pagination.py
+
+# Which result pages to fetch after page 1, for sites with max_pages > 1.
+#
+# Page 1 is fetched and parsed as usual. What it shows decides the rest:
+#   - next_page_selector set: page 1's pagination links (see extraction.py).
+#     The highest page number among them (link text, or a page number in
+#     the URL) is the page count. No links at all means there is only one
+#     page.
+#   - page_url_template set: page N is the template with %PAGE% and
+#     %QUERY% filled in. Without it, the links' own URLs are used, and
+#     pages the links skip ("1 2 3 ... 12") get the URL of a numbered link
+#     with the number swapped.
+# Pages 2 up to min(page count, max_pages) are then fetched at the same
+# time (SCRAPER_PAGE_CONCURRENCY per site) and parsed like page 1. When the
+# count is unknown (a template but no selector, or only a "next" link),
+# every page up to max_pages is tried, and the first page that comes back
+# empty cancels the ones after it.
+#
+# Fetching stops early once the site has max_results results, or at the
+# search deadline (SCRAPER_SEARCH_DEADLINE after dispatch): pages still
+# in flight are dropped and the search keeps what it has.
+#
+# Only sites fetched by URL page (GET, FlareSolverr, Playwright) paginate;
+# a POST API's pages would need a payload per page.
+#
+# Nothing in here does any I/O.
+
+import re
+import time
+import urllib.parse
+
+from django.conf import settings
+
+from .scraping import uses_browser
+
+# /page/3/, ?page=3, &paged=3, ?p=3, ?pg=3
+PAGE_IN_URL = re.compile(r'(/page/|[?&](?:page|paged|pg|p)=)(\d+)', re.IGNORECASE)
+
+
+def is_paginated(site):
+    if site.max_pages <= 1 or not (site.page_url_template or site.next_page_selector):
+        return False
+    return uses_browser(site) or site.search_type == site.SearchType.GET
+
+
+def page_deadline(enqueued_at):
+    """Unix time after which more pages are no use to the search."""
+    return (enqueued_at or time.time()) + settings.SCRAPER_SEARCH_DEADLINE
+
+
+def page_number(text, url):
+    if text.isdigit():
+        return int(text)
+    match = PAGE_IN_URL.search(url)
+    return int(match.group(2)) if match else None
+
+
+def build_page_url(site, search_term, page):
+    """Page `page` of the search, from site.page_url_template."""
+    path = site.page_url_template.replace('%PAGE%', str(page)).replace('%QUERY%', urllib.parse.quote(search_term))
+    return site.base_url.rstrip('/') + path
+
+
+def swap_page(url, page):
+    """url with its page number replaced, or None if it has none."""
+    if not PAGE_IN_URL.search(url):
+        return None
+    return PAGE_IN_URL.sub(lambda match: match.group(1) + str(page), url, count=1)
+
+
+def more_pages(site, search_term, first_url, page_links):
+    """
+    ([(page, url), ...] for pages 2 and up, known), from page 1's URL and
+    its pagination links. known is False when the page count is a guess
+    (max_pages), so the first empty page should end the crawl.
+    """
+    if site.next_page_selector and not page_links:
+        return [], True
+
+    numbered = {}
+    next_url = None
+    for text, href in page_links:
+        url = urllib.parse.urljoin(first_url, href)
+        number = page_number(text, url)
+        if number:
+            numbered.setdefault(number, url)
+        elif next_url is None:
+            next_url = url  # An unnumbered "next" link
+
+    counts = [int(text) for text, _ in page_links if text.isdigit()]
+    known = bool(counts)
+    last = min(max(counts), site.max_pages) if known else site.max_pages
+
+    pages = []
+    for page in range(2, last + 1):
+        if site.page_url_template:
+            url = build_page_url(site, search_term, page)
+        else:
+            url = numbered.get(page) or next(filter(None, (swap_page(url, page) for url in numbered.values())), None)
+            if url is None and page == 2:
+                url = next_url
+        if url is None:
+            # Nothing says where this page lives
+            break
+        pages.append((page, url))
+    return pages, known
@@ -0,0 +1,335 @@
+# File: backend/scraper_api/posters.py
+
+# Poster proxy: one fetch per poster, served as small WebP thumbnails.
+#
+# Results reach the browser with their poster URL rewritten to
+#   /posters/?url=<original>&w=<width>&sig=<HMAC of url>
+# (see poster_url and views.poster). The signature stops the endpoint from
+# being used as an open proxy.
+#
+# Disk cache (SCRAPER_POSTER_CACHE_DIR), content-addressed:
+#   urls/<aa>/<sha256 of url>         -> sha256 of the image bytes
+#   thumbs/<bb>/<sha256 of image>-<w>.webp
+# so mirrors that serve the same artwork share one set of thumbnails. Every
+# SCRAPER_POSTER_WIDTHS thumbnail is made when a poster is first fetched.
+# The original is not kept. Hits touch the file's mtime. Once the
+# cache grows past SCRAPER_POSTER_CACHE_MAX_BYTES, the least recently used
+# files are removed until it is back under 90% of that size.
+#
+# Workers prefetch posters while they scrape (prefetch_posters), so the
+# thumbnails are usually ready before the browser asks. The Celery workers
+# and Daphne must therefore share SCRAPER_POSTER_CACHE_DIR.
+
+import asyncio
+import hashlib
+import hmac
+import io
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+from .cache import LRUCache
+from .http_pool import pooled_stream, pooled_stream_async
+
+# Urls that failed recently, so a broken poster isn't fetched on every request
+_failures = LRUCache(4096)
+_size_lock = threading.Lock()
+_cache_size = None
+_prefetch_pool = None
+_prefetch_tasks = set()
+_prefetch_semaphores = {}
+
+
+class PosterError(Exception):
+    """The poster could not be fetched or decoded."""
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sign(url):
+    key = settings.SECRET_KEY.encode()
+    return hmac.new(key, url.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def verify(url, signature):
+    return hmac.compare_digest(sign(url), signature or '')
+
+
+def poster_url(url, base='', width=None):
+    """The proxy URL for an original poster URL. base is e.g. 'http://host:8000'."""
+    query = urllib.parse.urlencode({
+        'url': url,
+        'w': width or settings.SCRAPER_POSTER_WIDTHS[0],
+        'sig': sign(url),
+    })
+    return f"{base}/posters/?{query}"
+
+
+# --- Disk cache ---
+
+def _root():
+    return settings.SCRAPER_POSTER_CACHE_DIR
+
+
+def _url_path(url):
+    digest = _sha256(url.encode())
+    return os.path.join(_root(), 'urls', digest[:2], digest)
+
+
+def _thumb_path(content_hash, width):
+    return os.path.join(_root(), 'thumbs', content_hash[:2], f"{content_hash}-{width}.webp")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)  # Atomic: readers never see half a file
+    _grow(len(data))
+
+
+def _scan():
+    """[(mtime, size, path)] for every file in the cache."""
+    files = []
+    for dirpath, _, filenames in os.walk(_root()):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _grow(amount):
+    global _cache_size
+    with _size_lock:
+        if _cache_size is None:
+            _cache_size = sum(size for _, size, _ in _scan())
+        else:
+            _cache_size += amount
+        over = _cache_size > settings.SCRAPER_POSTER_CACHE_MAX_BYTES
+    if over:
+        evict()
+
+
+def evict():
+    """Drops least recently used files until the cache is under 90% of its limit."""
+    global _cache_size
+    with _size_lock:
+        files = sorted(_scan())
+        total = sum(size for _, size, _ in files)
+        target = settings.SCRAPER_POSTER_CACHE_MAX_BYTES * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        _cache_size = total
+
+
+def cached_thumbnail(url, width):
+    """Path of the cached thumbnail for url, or None. Marks it as recently used."""
+    try:
+        with open(_url_path(url)) as f:
+            content_hash = f.read().strip()
+        path = _thumb_path(content_hash, width)
+        os.utime(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return path
+
+
+# Disk I/O, kept off the event loop
+acached_thumbnail = sync_to_async(cached_thumbnail, thread_sensitive=False)
+
+
+# --- Fetching + transcoding ---
+
+def _request_headers(url):
+    # Many mirrors refuse hotlinks without a same-site Referer
+    parts = urllib.parse.urlsplit(url)
+    return {'Referer': f"{parts.scheme}://{parts.netloc}/", 'Accept': 'image/avif,image/webp,image/*,*/*;q=0.8'}
+
+
+def _check_response(response):
+    if response.status_code >= 400:
+        raise PosterError(f"upstream answered {response.status_code}")
+    content_type = response.headers.get('content-type', '')
+    if content_type and not content_type.startswith(('image/', 'application/octet-stream', 'binary/')):
+        raise PosterError(f"not an image ({content_type})")
+
+
+def fetch_original(url):
+    """The poster's bytes, capped at SCRAPER_POSTER_MAX_SOURCE_BYTES."""
+    limit = settings.SCRAPER_POSTER_MAX_SOURCE_BYTES
+    try:
+        with pooled_stream('GET', url, headers=_request_headers(url), timeout=settings.SCRAPER_POSTER_TIMEOUT) as response:
+            _check_response(response)
+            body = bytearray()
+            for chunk in response.iter_bytes():
+                body.extend(chunk)
+                if len(body) > limit:
+                    raise PosterError("too large")
+    except httpx.HTTPError as e:
+        raise PosterError(str(e)) from e
+    return bytes(body)
+
+
+async def afetch_original(url):
+    """Async version of fetch_original."""
+    limit = settings.SCRAPER_POSTER_MAX_SOURCE_BYTES
+    try:
+        async with pooled_stream_async(
+            'GET', url, headers=_request_headers(url), timeout=settings.SCRAPER_POSTER_TIMEOUT
+        ) as response:
+            _check_response(response)
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > limit:
+                    raise PosterError("too large")
+    except httpx.HTTPError as e:
+        raise PosterError(str(e)) from e
+    return bytes(body)
+
+
+def make_thumbnails(data):
+    """{width: webp bytes} for every SCRAPER_POSTER_WIDTHS width."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        largest = max(settings.SCRAPER_POSTER_WIDTHS)
+        # JPEG only: decode straight at a reduced scale, much faster
+        image.draft('RGB', (largest, largest * 2))
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise PosterError(f"undecodable image: {e}") from e
+
+    thumbnails = {}
+    for width in settings.SCRAPER_POSTER_WIDTHS:
+        thumb = image.copy()
+        thumb.thumbnail((width, width * 2), Image.LANCZOS)
+        out = io.BytesIO()
+        thumb.save(out, 'WEBP', quality=settings.SCRAPER_POSTER_QUALITY, method=4)
+        thumbnails[width] = out.getvalue()
+    return thumbnails
+
+
+def store_poster(url, data):
+    """Transcodes and caches data as url's poster."""
+    content_hash = _sha256(data)
+    # Another mirror may already have brought the same artwork
+    if not all(os.path.exists(_thumb_path(content_hash, width)) for width in settings.SCRAPER_POSTER_WIDTHS):
+        for width, thumbnail in make_thumbnails(data).items():
+            _write(_thumb_path(content_hash, width), thumbnail)
+    _write(_url_path(url), content_hash.encode())
+
+
+def get_thumbnail(url, width):
+    """Path of url's thumbnail at width, fetching the poster if needed."""
+    path = cached_thumbnail(url, width)
+    if path:
+        return path
+    if _failures.get(url):
+        raise PosterError("failed recently")
+
+    try:
+        store_poster(url, fetch_original(url))
+    except PosterError:
+        _failures.set(url, True, settings.SCRAPER_POSTER_FAILURE_TTL)
+        raise
+    return cached_thumbnail(url, width)
+
+
+async def aget_thumbnail(url, width):
+    """Async version of get_thumbnail, for the poster view."""
+    path = await acached_thumbnail(url, width)
+    if path:
+        return path
+    if _failures.get(url):
+        raise PosterError("failed recently")
+
+    try:
+        data = await afetch_original(url)
+        # CPU-bound: off the event loop, and not on the one thread sync views share
+        await sync_to_async(store_poster, thread_sensitive=False)(url, data)
+    except PosterError:
+        _failures.set(url, True, settings.SCRAPER_POSTER_FAILURE_TTL)
+        raise
+    return await acached_thumbnail(url, width)
+
+
+# --- Prefetching ---
+
+def _poster_urls(results):
+    urls = {result['poster'] for result in results if result.get('poster', '').startswith('http')}
+    return [url for url in urls if not _failures.get(url)]
+
+
+def _posters_to_fetch(results):
+    width = settings.SCRAPER_POSTER_WIDTHS[0]
+    return [url for url in _poster_urls(results) if not cached_thumbnail(url, width)]
+
+
+def _prefetch_one(url):
+    try:
+        get_thumbnail(url, settings.SCRAPER_POSTER_WIDTHS[0])
+    except PosterError as e:
+        print(f"[Posters] Could not prefetch {url}: {e}")
+
+
+def prefetch_posters(results):
+    """Starts fetching results' posters in the background and returns at once."""
+    global _prefetch_pool
+    if not settings.SCRAPER_POSTER_PROXY:
+        return
+    if _prefetch_pool is None:
+        _prefetch_pool = ThreadPoolExecutor(
+            max_workers=settings.SCRAPER_POSTER_PREFETCH_CONCURRENCY, thread_name_prefix='poster-prefetch'
+        )
+    for url in _posters_to_fetch(results):
+        _prefetch_pool.submit(_prefetch_one, url)
+
+
+async def _aprefetch_one(semaphore, url):
+    async with semaphore:
+        try:
+            await aget_thumbnail(url, settings.SCRAPER_POSTER_WIDTHS[0])
+        except PosterError as e:
+            print(f"[Posters] Could not prefetch {url}: {e}")
+
+
+def aprefetch_posters(results):
+    """
+    Async version of prefetch_posters, for the fan-out engine: schedules the
+    fetches on the running (long-lived) loop without waiting for them.
+    """
+    if not settings.SCRAPER_POSTER_PROXY:
+        return
+    # Cached ones are skipped by aget_thumbnail, off the loop
+    urls = _poster_urls(results)
+    if not urls:
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in _prefetch_semaphores:
+        for closed in [other for other in _prefetch_semaphores if other.is_closed()]:
+            del _prefetch_semaphores[closed]
+        _prefetch_semaphores[loop] = asyncio.Semaphore(settings.SCRAPER_POSTER_PREFETCH_CONCURRENCY)
+    semaphore = _prefetch_semaphores[loop]
+    for url in urls:
+        task = asyncio.ensure_future(_aprefetch_one(semaphore, url))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
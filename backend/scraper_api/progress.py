@@ -0,0 +1,102 @@
+# File: backend/scraper_api/progress.py
+
+# Per-site progress of a search, and when the search is over.
+#
+# The consumer keeps a SearchProgress for its current search. Each site
+# moves through:
+#   queued -> fetching -> parsing -> done | failed | timed_out
+# Sites answered from the cache or the index start out done, and sites
+# skipped by their circuit breaker start out failed. The scrapes report the
+# other steps as 'search_progress' events (see delivery.send_progress).
+# Failures come in as 'send_error_message' events that name the site.
+#
+# The client gets compact frames with only the sites that changed:
+#   {"search": "<id>", "progress": {"Vegamovies": "fetching"}}
+# Once every site is done or failed, or SCRAPER_SEARCH_DEADLINE seconds
+# have passed, the remaining sites are marked timed_out. Then one final frame
+# goes out:
+#   {"search_complete": {"search": "<id>", "term": ..., "seconds": 4.2,
+#                        "timed_out": false,
+#                        "sites": {"Vegamovies": {"state": "done", "seconds": 1.3, "results": 24}}}}
+# After that, anything else for the search is dropped. The late scrapes
+# still finish in the background and fill the cache and the index.
+
+import time
+
+QUEUED = 'queued'
+FETCHING = 'fetching'
+PARSING = 'parsing'
+DONE = 'done'
+FAILED = 'failed'
+TIMED_OUT = 'timed_out'
+
+FINAL = (DONE, FAILED, TIMED_OUT)
+ORDER = (QUEUED, FETCHING, PARSING, DONE)
+
+
+class SiteProgress:
+
+    def __init__(self, name, state):
+        self.name = name
+        self.state = state
+        self.seconds = None
+        self.results = 0
+
+
+class SearchProgress:
+    """One search's per-site states, kept by its consumer."""
+
+    def __init__(self, search_id, search_term):
+        self.search_id = search_id
+        self.term = search_term
+        self.started = time.monotonic()
+        self.sites = {}
+        # Set once the consumer has tracked every site it is waiting for
+        self.ready = False
+        self.complete = False
+
+    def elapsed(self):
+        return round(time.monotonic() - self.started, 3)
+
+    def update(self, site_id, name, state, results=None):
+        """
+        Moves a site to state. False if nothing changed: a site never goes
+        back to an earlier step, and a final state is never left.
+        """
+        site = self.sites.get(site_id)
+        if site is None:
+            site = self.sites[site_id] = SiteProgress(name, state)
+        elif site.state in FINAL or (state in ORDER and ORDER.index(state) <= ORDER.index(site.state)):
+            return False
+        site.state = state
+        if results is not None:
+            site.results = results
+        if state in FINAL:
+            site.seconds = self.elapsed()
+        return True
+
+    def is_finished(self):
+        return self.ready and all(site.state in FINAL for site in self.sites.values())
+
+    def expire(self):
+        """Marks every unfinished site timed_out. Returns their names."""
+        late = [site_id for site_id, site in self.sites.items() if site.state not in FINAL]
+        for site_id in late:
+            self.update(site_id, None, TIMED_OUT)
+        return [self.sites[site_id].name for site_id in late]
+
+    def progress_frame(self, site_ids=None):
+        sites = self.sites if site_ids is None else {site_id: self.sites[site_id] for site_id in site_ids}
+        return {'search': self.search_id, 'progress': {site.name: site.state for site in sites.values()}}
+
+    def complete_frame(self):
+        return {'search_complete': {
+            'search': self.search_id,
+            'term': self.term,
+            'seconds': self.elapsed(),
+            'timed_out': any(site.state == TIMED_OUT for site in self.sites.values()),
+            'sites': {
+                site.name: {'state': site.state, 'seconds': site.seconds, 'results': site.results}
+                for site in self.sites.values()
+            },
+        }}
@@ -0,0 +1,112 @@
+# File: backend/scraper_api/ratelimit.py
+
+# Per-domain token buckets, shared by every worker through Redis.
+#
+# Each host gets a bucket of SCRAPER_RATE_LIMIT_BURST tokens that refills
+# at SCRAPER_RATE_LIMIT_RATE tokens per second. You can override the rate per
+# host with SCRAPER_HOST_RATE_LIMITS. Every fetch takes one token. If the
+# bucket is empty, the fetch waits for the next token.
+#
+# Interactive scrapes (someone is waiting on the WebSocket) may take the last
+# SCRAPER_RATE_LIMIT_RESERVE tokens. Background cache refreshes may not, so a
+# busy refresh schedule can't use up a host's budget ahead of live searches.
+#
+# Redis layout, per host:
+#   ratelimit:<host>  hash {tokens, ts}
+#
+# If Redis is unreachable requests are not rate limited.
+
+import asyncio
+import time
+import urllib.parse
+
+import redis
+from django.conf import settings
+
+from .redis_client import get_async_script, get_script
+
+# Refills the bucket and takes a token if more than `reserve` are left.
+# Returns "0" when the token was taken, else the seconds until one will be.
+# (Lua numbers become integers on the way out, hence tostring.)
+TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+def _host(site):
+    return urllib.parse.urlsplit(site.base_url).netloc
+
+
+def _bucket_args(host, interactive):
+    rate = settings.SCRAPER_HOST_RATE_LIMITS.get(host, settings.SCRAPER_RATE_LIMIT_RATE)
+    burst = max(settings.SCRAPER_RATE_LIMIT_BURST, 1 + settings.SCRAPER_RATE_LIMIT_RESERVE)
+    reserve = 0 if interactive else settings.SCRAPER_RATE_LIMIT_RESERVE
+    return [f"ratelimit:{host}"], [rate, burst, reserve, time.time()]
+
+
+def _max_wait(interactive):
+    if interactive:
+        return settings.SCRAPER_RATE_LIMIT_MAX_WAIT
+    return settings.SCRAPER_RATE_LIMIT_REFRESH_MAX_WAIT
+
+
+def acquire_token(site, interactive=True):
+    """
+    Waits for a token for site's host. Returns False if none came within
+    SCRAPER_RATE_LIMIT_MAX_WAIT (or _REFRESH_MAX_WAIT for background jobs).
+    """
+    if not settings.SCRAPER_RATE_LIMITS:
+        return True
+
+    host = _host(site)
+    deadline = time.monotonic() + _max_wait(interactive)
+    while True:
+        keys, args = _bucket_args(host, interactive)
+        try:
+            wait = float(get_script(settings.SCRAPER_RATE_LIMIT_REDIS_URL, TAKE_TOKEN)(keys=keys, args=args))
+        except redis.RedisError as e:
+            print(f"[RateLimit] Redis unavailable, not rate limiting {host}: {e}")
+            return True
+        if wait == 0:
+            return True
+        if time.monotonic() + wait > deadline:
+            print(f"[RateLimit] No token for {host} within {_max_wait(interactive)}s")
+            return False
+        time.sleep(wait)
+
+
+async def aacquire_token(site, interactive=True):
+    """Async version of acquire_token, for the fan-out engine."""
+    if not settings.SCRAPER_RATE_LIMITS:
+        return True
+
+    host = _host(site)
+    deadline = time.monotonic() + _max_wait(interactive)
+    while True:
+        keys, args = _bucket_args(host, interactive)
+        try:
+            wait = float(await get_async_script(settings.SCRAPER_RATE_LIMIT_REDIS_URL, TAKE_TOKEN)(keys=keys, args=args))
+        except redis.RedisError as e:
+            print(f"[RateLimit] Redis unavailable, not rate limiting {host}: {e}")
+            return True
+        if wait == 0:
+            return True
+        if time.monotonic() + wait > deadline:
+            print(f"[RateLimit] No token for {host} within {_max_wait(interactive)}s")
+            return False
+        await asyncio.sleep(wait)
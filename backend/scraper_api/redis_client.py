@@ -0,0 +1,69 @@
+# File: backend/scraper_api/redis_client.py
+
+# Shared redis-py clients for the helpers that keep cross-process state
+# in Redis (coalescing, site health, ...). One client per URL per process;
+# async clients are also per event loop, since their connections belong
+# to the loop that opened them.
+#
+# Most async callers run on a loop that lives as long as the process
+# (Daphne's, or the worker loop in http_pool.py), but async_to_sync opens
+# short-lived ones. Clients are kept per loop object, and the entries of
+# loops that have closed are dropped whenever a new loop shows up, so
+# neither the table nor a dead client outlives its loop for long.
+#
+# Lua scripts (ratelimit.py, trending.py) are registered once per client
+# here too, so they go away with it.
+
+import asyncio
+import threading
+
+import redis
+import redis.asyncio
+
+_clients = {}
+_scripts = {}
+# {loop: ({url: client}, {(url, source): script})}
+_loop_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis(url):
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def get_script(url, source):
+    """The Lua script source, registered on get_redis(url)."""
+    key = (url, source)
+    if key not in _scripts:
+        _scripts[key] = get_redis(url).register_script(source)
+    return _scripts[key]
+
+
+def _for_loop():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _loop_clients.get(loop)
+        if entry is None:
+            # Loops that have ended (async_to_sync's) take their clients with them
+            for closed in [other for other in _loop_clients if other.is_closed()]:
+                del _loop_clients[closed]
+            entry = _loop_clients[loop] = ({}, {})
+    return entry
+
+
+def get_async_redis(url):
+    clients, _ = _for_loop()
+    if url not in clients:
+        clients[url] = redis.asyncio.Redis.from_url(url)
+    return clients[url]
+
+
+def get_async_script(url, source):
+    """The Lua script source, registered on get_async_redis(url)."""
+    _, scripts = _for_loop()
+    key = (url, source)
+    if key not in scripts:
+        scripts[key] = get_async_redis(url).register_script(source)
+    return scripts[key]
@@ -0,0 +1,152 @@
+# File: backend/scraper_api/resilience.py
+
+# Per-site health: latency tracking, adaptive timeouts, circuit breakers
+# and hedged-request delays. State lives in Redis so every worker and the
+# admin see the same figures.
+#
+# Redis layout, per SiteSource id:
+#   health:<id>:latency  list of the last SCRAPER_LATENCY_WINDOW fetch times (s)
+#   health:<id>:breaker  hash {failures, opened_at}
+#   health:<id>:probe    set with NX when a half-open probe is dispatched
+#
+# Breaker states:
+#   closed    -> requests flow normally
+#   open      -> SCRAPER_BREAKER_THRESHOLD consecutive failures; the site is
+#                skipped for SCRAPER_BREAKER_COOLDOWN seconds
+#   half-open -> cooldown over; one probe request is let through. Success
+#                closes the breaker, failure re-opens it.
+#
+# If Redis is unreachable every site is treated as healthy with the
+# default timeouts.
+
+import statistics
+import time
+from collections import namedtuple
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .redis_client import get_redis
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+SiteHealth = namedtuple('SiteHealth', 'p50 p95 samples state failures opened_at')
+
+HEALTHY = SiteHealth(None, None, 0, CLOSED, 0, None)
+
+
+def _redis():
+    return get_redis(settings.SCRAPER_HEALTH_REDIS_URL)
+
+
+def _keys(site_id):
+    prefix = f"health:{site_id}"
+    return prefix + ':latency', prefix + ':breaker', prefix + ':probe'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def get_site_health(site):
+    """Latency percentiles and breaker state for site, in one Redis round trip."""
+    latency_key, breaker_key, _ = _keys(site.id)
+    try:
+        with _redis().pipeline(transaction=False) as pipe:
+            pipe.lrange(latency_key, 0, -1)
+            pipe.hgetall(breaker_key)
+            latencies, breaker = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Health] Redis unavailable, assuming {site.name} is healthy: {e}")
+        return HEALTHY
+
+    latencies = sorted(float(value) for value in latencies)
+    failures = int(breaker.get(b'failures', 0))
+    opened_at = float(breaker[b'opened_at']) if b'opened_at' in breaker else None
+
+    if opened_at is None:
+        state = CLOSED
+    elif time.time() - opened_at < settings.SCRAPER_BREAKER_COOLDOWN:
+        state = OPEN
+    else:
+        state = HALF_OPEN
+
+    return SiteHealth(
+        p50=statistics.median(latencies) if latencies else None,
+        p95=percentile(latencies, 0.95) if latencies else None,
+        samples=len(latencies),
+        state=state,
+        failures=failures,
+        opened_at=opened_at,
+    )
+
+
+def allow_request(site):
+    """
+    False while site's breaker is open. Once the cooldown is over, exactly
+    one caller gets True (the probe) until the probe's outcome is recorded.
+    """
+    health = get_site_health(site)
+    if health.state == CLOSED:
+        return True
+    if health.state == OPEN:
+        return False
+
+    _, _, probe_key = _keys(site.id)
+    try:
+        return bool(_redis().set(probe_key, 1, nx=True, ex=settings.SCRAPER_BREAKER_COOLDOWN))
+    except redis.RedisError:
+        return True
+
+
+def record_outcome(site, ok, elapsed):
+    """Records a fetch: its latency on success, a breaker failure otherwise."""
+    latency_key, breaker_key, probe_key = _keys(site.id)
+    try:
+        client = _redis()
+        if ok:
+            with client.pipeline(transaction=False) as pipe:
+                pipe.lpush(latency_key, round(elapsed, 3))
+                pipe.ltrim(latency_key, 0, settings.SCRAPER_LATENCY_WINDOW - 1)
+                pipe.delete(breaker_key, probe_key)
+                pipe.execute()
+            return
+
+        failures = client.hincrby(breaker_key, 'failures', 1)
+        if failures >= settings.SCRAPER_BREAKER_THRESHOLD:
+            # (Re-)open: a failed half-open probe restarts the cooldown
+            with client.pipeline(transaction=False) as pipe:
+                pipe.hset(breaker_key, 'opened_at', time.time())
+                pipe.delete(probe_key)
+                pipe.execute()
+            print(f"[Health] Circuit open for {site.name} after {failures} consecutive failures")
+    except redis.RedisError as e:
+        print(f"[Health] Could not record outcome for {site.name}: {e}")
+
+
+def adaptive_timeout(health, default):
+    """
+    SCRAPER_TIMEOUT_MULTIPLIER x the site's p95, clamped to
+    [SCRAPER_TIMEOUT_MIN, default]. Falls back to default until the site
+    has SCRAPER_LATENCY_MIN_SAMPLES samples.
+    """
+    if not settings.SCRAPER_ADAPTIVE_TIMEOUTS or health.samples < settings.SCRAPER_LATENCY_MIN_SAMPLES:
+        return default
+    return min(max(health.p95 * settings.SCRAPER_TIMEOUT_MULTIPLIER, settings.SCRAPER_TIMEOUT_MIN), default)
+
+
+def hedge_delay(health):
+    """How long to wait on the primary URL before also trying the alternate."""
+    if health.samples < settings.SCRAPER_LATENCY_MIN_SAMPLES:
+        return settings.SCRAPER_HEDGE_DEFAULT_DELAY
+    return max(health.p95, settings.SCRAPER_HEDGE_MIN_DELAY)
+
+
+aget_site_health = sync_to_async(get_site_health, thread_sensitive=False)
+aallow_request = sync_to_async(allow_request, thread_sensitive=False)
+arecord_outcome = sync_to_async(record_outcome, thread_sensitive=False)
@@ -0,0 +1,41 @@
+# File: backend/scraper_api/scheduling.py
+
+# Where and how urgently scrape jobs run.
+#
+# Queues: sites that need a browser (FlareSolverr, or the Playwright pool in
+# browser_pool.py) take seconds per fetch. They go to SCRAPER_BROWSER_QUEUE and plain GET/POST
+# sites go to SCRAPER_FAST_QUEUE. Each queue has its own workers and
+# concurrency, so slow sites can never hold up the fast ones:
+#
+#   celery -A scraper_project worker -Q fast_queue -c 10 --pool=threads
+#   celery -A scraper_project worker -Q browser_queue -c 2 --pool=threads
+#
+# Priority: jobs someone is waiting for on a WebSocket are sent with
+# SCRAPER_INTERACTIVE_PRIORITY. Background cache refreshes are sent with
+# SCRAPER_REFRESH_PRIORITY. The Redis broker serves lower numbers first
+# (see CELERY_BROKER_TRANSPORT_OPTIONS).
+
+from django.conf import settings
+
+from .scraping import uses_browser
+
+
+def queue_for_site(site):
+    if uses_browser(site):
+        return settings.SCRAPER_BROWSER_QUEUE
+    return settings.SCRAPER_FAST_QUEUE
+
+
+def priority_for(channel_name):
+    """channel_name=None means a background refresh."""
+    if channel_name:
+        return settings.SCRAPER_INTERACTIVE_PRIORITY
+    return settings.SCRAPER_REFRESH_PRIORITY
+
+
+def group_by_queue(sites):
+    """{queue: [site, ...]}, so each fan-out job stays on one kind of worker."""
+    groups = {}
+    for site in sites:
+        groups.setdefault(queue_for_site(site), []).append(site)
+    return groups
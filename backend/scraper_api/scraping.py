@@ -0,0 +1,155 @@
+# File: backend/scraper_api/scraping.py
+
+# Helpers shared by the per-site Celery task (tasks.py) and the
+# async fan-out engine (engine.py). Nothing in here does any I/O.
+
+import json
+import urllib.parse
+
+from django.conf import settings
+
+from .extraction import get_extraction_plan
+
+USER_AGENT = 'Mozilla/5.0'
+
+FLARESOLVERR_URL = settings.SCRAPER_FLARESOLVERR_URL
+
+
+def build_search_url(site, search_term, base_url=None):
+    """
+    Builds the full search URL for a GET (or FlareSolverr) search.
+    base_url overrides site.base_url (used for the alternate mirror).
+    """
+    search_query = urllib.parse.quote(search_term)
+    return ((base_url or site.base_url).rstrip('/') + site.search_endpoint).replace("%QUERY%", search_query)
+
+
+def parse_post_payload(site, search_term):
+    """
+    Fills in the POST payload template.
+    Returns ('json', dict) or ('data', dict). Raises ValueError if the
+    template is neither JSON nor key-value lines.
+    """
+    payload_str = (site.post_payload_template or "").replace("%QUERY%", search_term)
+
+    try:
+        return 'json', json.loads(payload_str)
+    except json.JSONDecodeError:
+        pass
+
+    payload_data = {}
+    for line in payload_str.split('\n'):
+        if ':' in line:
+            key, val = line.split(':', 1)
+            payload_data[key.strip()] = val.strip()
+        elif '=' in line:
+            key, val = line.split('=', 1)
+            payload_data[key.strip()] = val.strip()
+
+    if not payload_data:
+        raise ValueError("Payload is not JSON and not valid key-value pairs.")
+
+    return 'data', payload_data
+
+
+def build_search_request(site, search_term, base_url=None):
+    """
+    Describes the HTTP request for a plain (non-FlareSolverr) search.
+    Returns a dict of keyword arguments for an HTTP client's request().
+    """
+    headers = {'User-Agent': USER_AGENT}
+
+    if site.search_type == 'GET':
+        return {
+            'method': 'GET',
+            'url': build_search_url(site, search_term, base_url),
+            'headers': headers,
+        }
+
+    if site.search_type == 'POST':
+        kind, payload_data = parse_post_payload(site, search_term)
+        return {
+            'method': 'POST',
+            'url': (base_url or site.base_url).rstrip('/') + site.search_endpoint,
+            'headers': headers,
+            kind: payload_data,
+        }
+
+    return None
+
+
+def build_flaresolverr_payload(url, timeout=60):
+    """The payload FlareSolverr expects for a plain page fetch."""
+    return {
+        'cmd': 'request.get',
+        'url': url,
+        'maxTimeout': int(timeout * 1000)  # FlareSolverr wants milliseconds
+    }
+
+
+def extract_response_body(response, search_type):
+    """
+    POST APIs sometimes return JSON with the rendered HTML under
+    data.results. Everything else is used as plain text.
+    """
+    if search_type != 'POST':
+        return response.text
+
+    try:
+        json_response = response.json()
+    except ValueError:
+        return response.text
+
+    if isinstance(json_response, dict) and 'results' in (json_response.get('data') or {}):
+        return json_response['data']['results']
+    return response.text
+
+
+def is_json_response(response):
+    return 'json' in response.headers.get('content-type', '')
+
+
+def uses_browser(site):
+    """True for sites fetched through FlareSolverr or the Playwright pool."""
+    return site.renderer in (site.Renderer.FLARESOLVERR, site.Renderer.PLAYWRIGHT)
+
+
+def can_stream(site, plan):
+    """
+    Streaming parse is used for plain GET/POST sites when the plan supports
+    it. Rendered pages only exist once the browser is done, so they can't.
+    Hedged sites aren't streamed either: only one of the two racing
+    responses may reach the client.
+    """
+    return (
+        settings.SCRAPER_STREAM_PARSING
+        and not uses_browser(site)
+        and not is_hedged(site)
+        and plan.supports_streaming
+    )
+
+
+def is_hedged(site):
+    return site.hedge_requests and bool(site.alternate_base_url)
+
+
+def is_failed_response(response):
+    """5xx answers count as failures (and against the site's circuit breaker)."""
+    return response.status_code >= 500
+
+
+def parse_results(site, html):
+    """
+    Runs the site's CSS selector "pattern" over the HTML and returns
+    a list of result dicts ready to send to the client.
+    The selectors are compiled once per site (see extraction.py).
+    """
+    return parse_page(site, html)[0]
+
+
+def parse_page(site, html):
+    """parse_results, plus the page's pagination links (see pagination.py)."""
+    results, page_links = get_extraction_plan(site).extract_page(html)
+    if site.max_results:
+        results = results[:site.max_results]
+    return results, page_links
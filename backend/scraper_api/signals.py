@@ -0,0 +1,21 @@
+# File: backend/scraper_api/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_site
+from .extraction import discard_plan
+from .models import SiteSource
+from .site_config import announce_change
+
+
+@receiver(post_save, sender=SiteSource)
+@receiver(post_delete, sender=SiteSource)
+def invalidate_site_cache(sender, instance, **kwargs):
+    """
+    Editing or deleting a site in the admin drops its cached results and plan,
+    and makes every process reload its active sites (see site_config.py).
+    """
+    invalidate_site(instance.id)
+    discard_plan(instance.id)
+    announce_change(instance.id)
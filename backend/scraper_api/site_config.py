@@ -0,0 +1,205 @@
+# File: backend/scraper_api/site_config.py
+
+# Active SiteSource configs, kept in memory instead of queried per search.
+#
+# Every process (Daphne and each Celery worker) holds a snapshot of the
+# active sites, tagged with the version it was loaded at. Saving or deleting
+# a SiteSource (see signals.py) bumps a version counter in Redis, once the
+# transaction commits, and publishes "<version>:<site id>" on a pub/sub
+# channel:
+#   sites:version    counter, bumped on every change
+#   sites:changed    pub/sub channel
+# A daemon thread in each process listens on that channel. A message makes
+# the snapshot stale, so the next caller reloads it with one query. The
+# listener also drops that site's cached plan and LRU results. The snapshot
+# is reloaded anyway after SCRAPER_SITE_CONFIG_MAX_AGE seconds, in case a
+# message was lost (e.g. while Redis was down).
+#
+# Scrape jobs carry the full config of their site(s) in the task payload
+# (site_to_config / site_from_config), so workers don't read the database
+# to start a scrape. Jobs from before this change only have the id and are
+# looked up here.
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .cache import invalidate_site
+from .extraction import discard_plan
+from .models import SiteSource
+from .redis_client import get_redis
+
+VERSION_KEY = 'sites:version'
+CHANNEL = 'sites:changed'
+
+_lock = threading.Lock()
+_snapshot = None
+# Highest version announced on CHANNEL; a snapshot older than this is stale
+_announced = 0
+_dirty = False
+_listener_pid = None
+
+
+class SiteSnapshot:
+
+    def __init__(self, version, sites):
+        self.version = version
+        self.sites = sites
+        self.by_id = {site.id: site for site in sites}
+        self.loaded_at = time.monotonic()
+
+    def is_current(self):
+        return (
+            not _dirty
+            and self.version >= _announced
+            and time.monotonic() - self.loaded_at < settings.SCRAPER_SITE_CONFIG_MAX_AGE
+        )
+
+
+def _redis():
+    return get_redis(settings.SCRAPER_SITE_CONFIG_REDIS_URL)
+
+
+# --- Task payloads ---
+
+def site_to_config(site):
+    """The site's fields as a JSON-safe dict, for a task payload."""
+    config = {}
+    for field in SiteSource._meta.concrete_fields:
+        value = getattr(site, field.attname)
+        config[field.attname] = value.isoformat() if isinstance(value, datetime) else value
+    return config
+
+
+def site_from_config(config):
+    """A SiteSource built from site_to_config's dict, without a query."""
+    names, values = [], []
+    for field in SiteSource._meta.concrete_fields:
+        # Fields added since the job was queued get their default
+        value = config.get(field.attname, field.get_default())
+        if value is not None and field.get_internal_type() == 'DateTimeField':
+            value = datetime.fromisoformat(value)
+        names.append(field.attname)
+        values.append(value)
+    return SiteSource.from_db(DEFAULT_DB_ALIAS, names, values)
+
+
+# --- The snapshot ---
+
+def _current_version():
+    try:
+        return int(_redis().get(VERSION_KEY) or 0)
+    except redis.RedisError:
+        return _announced
+
+
+def _load():
+    global _snapshot, _dirty
+    # Read the version first: a change landing during the query leaves the
+    # snapshot older than the announced version, so it is loaded again
+    _dirty = False
+    version = _current_version()
+    sites = list(SiteSource.objects.filter(is_active=True))
+    _snapshot = SiteSnapshot(version, sites)
+    print(f"[Sites] Loaded {len(sites)} active sites (version {version})")
+    return _snapshot
+
+
+def get_snapshot():
+    """The current SiteSnapshot, reloaded first if a site changed since."""
+    _ensure_listener()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_current():
+        return snapshot
+    with _lock:
+        if _snapshot is not None and _snapshot.is_current():
+            return _snapshot
+        return _load()
+
+
+def get_active_sites():
+    """Active SiteSources, from memory."""
+    return list(get_snapshot().sites)
+
+
+async def aget_active_sites():
+    """Async version of get_active_sites. Only a reload leaves the event loop."""
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_current() and _listener_pid == os.getpid():
+        return list(snapshot.sites)
+    return list((await sync_to_async(get_snapshot)()).sites)
+
+
+def get_sites(site_ids):
+    """The SiteSources with these ids, from memory; inactive ones are queried."""
+    by_id = get_snapshot().by_id
+    sites = [by_id[site_id] for site_id in site_ids if site_id in by_id]
+    missing = [site_id for site_id in site_ids if site_id not in by_id]
+    if missing:
+        sites.extend(SiteSource.objects.filter(id__in=missing))
+    return sites
+
+
+# --- Invalidation ---
+
+def announce_change(site_id):
+    """
+    Tells every process that site_id changed (see signals.py). Runs after
+    the transaction commits, so a reload can't read the old row.
+    """
+    global _dirty
+    _dirty = True
+
+    def publish():
+        try:
+            client = _redis()
+            version = client.incr(VERSION_KEY)
+            client.publish(CHANNEL, f"{version}:{site_id}")
+        except redis.RedisError as e:
+            print(f"[Sites] Could not announce the change to site {site_id}: {e}")
+
+    transaction.on_commit(publish)
+
+
+def _on_message(data):
+    global _announced
+    version, _, site_id = data.decode().partition(':')
+    _announced = max(_announced, int(version))
+    invalidate_site(int(site_id))
+    discard_plan(int(site_id))
+
+
+def _listen():
+    global _dirty
+    while True:
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=False)
+            pubsub.subscribe(CHANNEL)
+            for message in pubsub.listen():
+                if message['type'] == 'subscribe':
+                    # Changes may have been missed while not subscribed
+                    _dirty = True
+                elif message['type'] == 'message':
+                    _on_message(message['data'])
+        except (redis.RedisError, ValueError) as e:
+            print(f"[Sites] Change listener lost Redis, retrying: {e}")
+        _dirty = True
+        time.sleep(5)
+
+
+def _ensure_listener():
+    """Starts this process's listener thread (again after a fork)."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name='site-config-listener', daemon=True).start()
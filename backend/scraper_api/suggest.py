@@ -0,0 +1,159 @@
+# File: backend/scraper_api/suggest.py
+
+# Type-ahead suggestions from the result index.
+#
+# Each Daphne process keeps a PrefixIndex over the most recently seen
+# SCRAPER_SUGGEST_MAX_TITLES ScrapedResult rows of the active sites. It is
+# rebuilt in the background every SCRAPER_SUGGEST_REFRESH_INTERVAL seconds.
+# It is a sorted array of (word, entry) pairs:
+#   [('2', 7), ('dune', 3), ('dune', 7), ('dunkirk', 4), ('part', 7), ...]
+# so the entries with a word starting with 'dun' are one bisect range. A query
+# matches an entry when every query word is a prefix of one of the entry's
+# words (the same rule as the FTS index, see index.py). The smallest range
+# gives the candidates, and the other words only filter them.
+#
+# A Suggester belongs to one connection and remembers its last match set.
+# When the user only extends the query ('dun' -> 'dune' -> 'dune p'), the new
+# matches are a subset of the old ones, so it filters those instead of
+# searching the index again.
+#
+# The consumer answers every 'suggest' at once from here. A live search only
+# starts when the query has settled (see SearchConsumer.suggest).
+
+import asyncio
+import time
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from .index import search_words
+from .merging import relevance
+from .models import ScrapedResult
+
+_index = None
+_built_at = None
+_refresh = None
+
+
+class PrefixIndex:
+
+    def __init__(self, rows):
+        # rows: (title, normalized_title, link, poster, source name), newest first
+        self.entries = rows
+        self.words = [frozenset(search_words(normalized)) for _, normalized, *_ in rows]
+        pairs = sorted((word, i) for i, words in enumerate(self.words) for word in words)
+        self.keys = [word for word, _ in pairs]
+        self.ids = [i for _, i in pairs]
+
+    def prefix_range(self, prefix):
+        # '\uffff' sorts after every character a word can continue with
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + '\uffff')
+
+    def lookup(self, query_words):
+        """Ids of the entries matching every query word, newest first."""
+        ranges = sorted(((self.prefix_range(word), word) for word in set(query_words)), key=lambda r: r[0][1] - r[0][0])
+        (lo, hi), _ = ranges[0]
+        matches = set(self.ids[lo:hi])
+        for (lo, hi), word in ranges[1:]:
+            if not matches:
+                break
+            if hi - lo > len(matches):
+                # Cheaper to check the few candidates than to collect a big range
+                matches = {i for i in matches if any(w.startswith(word) for w in self.words[i])}
+            else:
+                matches &= set(self.ids[lo:hi])
+        return sorted(matches)
+
+    def refine(self, ids, query_words):
+        """The subset of ids (a previous match set) that also matches query_words."""
+        return [i for i in ids if all(any(w.startswith(q) for w in self.words[i]) for q in query_words)]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def load_index():
+    rows = list(
+        ScrapedResult.objects.filter(source__is_active=True)
+        .order_by('-last_seen')
+        .values_list('title', 'normalized_title', 'link', 'poster', 'source__name')[:settings.SCRAPER_SUGGEST_MAX_TITLES]
+    )
+    return PrefixIndex(rows)
+
+
+async def _rebuild():
+    global _index, _built_at, _refresh
+    try:
+        started = time.monotonic()
+        _index = await sync_to_async(load_index)()
+        _built_at = time.monotonic()
+        print(f"[Suggest] Indexed {len(_index)} titles in {_built_at - started:.2f}s")
+    except DatabaseError as e:
+        print(f"[Suggest] Could not load titles: {e}")
+        _built_at = time.monotonic()  # Try again after the next interval
+    finally:
+        _refresh = None
+
+
+async def get_index():
+    """The current PrefixIndex. Only the first call waits for it to load."""
+    global _refresh
+    stale = _built_at is None or time.monotonic() - _built_at > settings.SCRAPER_SUGGEST_REFRESH_INTERVAL
+    if stale and _refresh is None:
+        _refresh = asyncio.ensure_future(_rebuild())
+    if _index is None and _refresh is not None:
+        await asyncio.shield(_refresh)
+    return _index
+
+
+class Suggester:
+    """One connection's type-ahead state."""
+
+    def __init__(self):
+        self.index = None
+        self.query_words = None
+        self.matches = []
+
+    def is_refinement(self, index, query_words):
+        # Every old word is still there, possibly longer: the match set can only shrink
+        return (
+            index is self.index
+            and self.query_words is not None
+            and len(query_words) >= len(self.query_words)
+            and all(new.startswith(old) for old, new in zip(self.query_words, query_words))
+        )
+
+    async def suggest(self, term):
+        """Up to SCRAPER_SUGGEST_LIMIT results whose titles match term, best first."""
+        query_words = search_words(term)
+        if not query_words:
+            self.query_words, self.matches = None, []
+            return []
+
+        index = await get_index()
+        if index is None:
+            return []
+        if self.is_refinement(index, query_words):
+            self.matches = index.refine(self.matches, query_words)
+        else:
+            self.matches = index.lookup(query_words)
+        self.index, self.query_words = index, query_words
+        return self.top(index, frozenset(query_words))
+
+    def top(self, index, query_tokens):
+        # One suggestion per title; matches are newest first and sorted() is
+        # stable, so equally relevant titles stay newest first
+        best = {}
+        for i in self.matches:
+            normalized = index.entries[i][1]
+            if normalized not in best:
+                best[normalized] = (relevance(query_tokens, index.words[i]), i)
+        ranked = sorted(best.values(), key=lambda entry: -entry[0])[:settings.SCRAPER_SUGGEST_LIMIT]
+
+        suggestions = []
+        for score, i in ranked:
+            title, _, link, poster, source = index.entries[i]
+            suggestions.append({'source': source, 'title': title, 'link': link, 'poster': poster, 'score': score})
+        return suggestions
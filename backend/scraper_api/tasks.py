@@ -1,187 +1,599 @@
 # File: backend/scraper_api/tasks.py
 
-import json
-import urllib.parse
-import requests
-from bs4 import BeautifulSoup
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from django.conf import settings
 
 from celery import shared_task
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from .models import SiteSource
+from .cache import FRESH, get_cached_results, store_results
+from .capacity import busy_queues
+from .coalesce import finish_flight, flight_members, join_flight
+from .cancellation import InterestCheck, ScrapeCancelled, is_wanted
+from .delivery import send_error, send_progress, send_results
+from .posters import prefetch_posters
+from .browser_pool import render_page
+from .extraction import get_extraction_plan
+from .index import index_results
+from .metrics import scrape_span, set_outcome, timed
+from .progress import DONE, FETCHING, PARSING
+from .flaresolverr import (
+    build_request_payload,
+    clearance_headers,
+    create_session_payload,
+    drop_clearance,
+    forget_session,
+    is_challenged,
+    is_missing_session,
+    load_clearance,
+    mark_session_created,
+    needs_session,
+    save_clearance,
+)
+from .pagination import is_paginated, more_pages, page_deadline
+from .scraping import (
+    FLARESOLVERR_URL,
+    USER_AGENT,
+    build_search_request,
+    build_search_url,
+    can_stream,
+    extract_response_body,
+    is_failed_response,
+    is_hedged,
+    is_json_response,
+    parse_page,
+    parse_results,
+)
+from .engine import run_search
+from .http_pool import pooled_request, pooled_stream, run_on_worker_loop
+from .ratelimit import acquire_token
+from .resilience import adaptive_timeout, allow_request, get_site_health, hedge_delay, record_outcome
+from .scheduling import group_by_queue, priority_for, queue_for_site
+from .site_config import get_active_sites, get_sites, site_from_config, site_to_config
+from .trending import trending_terms
 
 # --- THIS IS THE NEW FLARESOLVERR FUNCTION ---
-def get_page_html_with_flaresolverr(url: str, site_name: str) -> str:
+def get_page_html_with_clearance(url, site, timeout):
+    """
+    Plain pooled GET using the cookies + user agent from an earlier
+    FlareSolverr solve. Returns None if there is no clearance or the
+    site challenged us again (in which case the clearance is dropped).
+    """
+    clearance = load_clearance(site)
+    if not clearance:
+        return None
+
+    try:
+        response = pooled_request('GET', url, headers=clearance_headers(clearance), timeout=timeout)
+    except httpx.HTTPError as e:
+        print(f"[Task] Clearance request failed for {site.name}: {e}")
+        return None
+
+    if is_challenged(response):
+        print(f"[Task] Clearance expired for {site.name}, back to FlareSolverr")
+        drop_clearance(site)
+        return None
+    if is_failed_response(response):
+        return None
+
+    print(f"[Task] Reused Cloudflare clearance for: {site.name}")
+    return response.text
+
+
+def get_page_html_with_flaresolverr(url: str, site, timeout: float = 60) -> str:
     """
     Uses FlareSolverr to bypass Cloudflare and get the HTML.
+    Reuses a previous solve's clearance cookies when possible, and the
+    site's own FlareSolverr session otherwise (see flaresolverr.py).
     """
-    print(f"[Task] Using FlareSolverr for: {site_name}")
-    
-    # FlareSolverr's API endpoint
-    flaresolverr_url = "http://localhost:8191/v1"
-    
-    # The payload FlareSolverr expects
-    payload = {
-        'cmd': 'request.get',
-        'url': url,
-        'maxTimeout': 60000  # 60 second timeout
-    }
-    
+    html = get_page_html_with_clearance(url, site, settings.SCRAPER_REQUEST_TIMEOUT)
+    if html:
+        return html
+
+    print(f"[Task] Using FlareSolverr for: {site.name}")
+
     try:
-        # Make a POST request to FlareSolverr
-        response = requests.post(flaresolverr_url, json=payload)
-        response.raise_for_status() # Raise an error for bad status
-        
-        data = response.json()
-        
+        for attempt in range(2):
+            with timed('flaresolverr'):
+                if needs_session(site):
+                    pooled_request(
+                        'POST', FLARESOLVERR_URL, json=create_session_payload(site), timeout=timeout + 10,
+                        trace_stages=False,
+                    )
+                    mark_session_created(site)
+
+                # Make a POST request to FlareSolverr (give it a little longer than its own timeout)
+                response = pooled_request(
+                    'POST', FLARESOLVERR_URL, json=build_request_payload(url, site, timeout), timeout=timeout + 10,
+                    trace_stages=False,
+                )
+            data = response.json()
+
+            if is_missing_session(data) and attempt == 0:
+                forget_session(site)
+                continue
+            response.raise_for_status() # Raise an error for bad status
+            break
+
         if data.get('status') == 'ok':
-            print(f"[Task] FlareSolverr succeeded for: {site_name}")
+            print(f"[Task] FlareSolverr succeeded for: {site.name}")
+            save_clearance(site, data['solution'])
             return data['solution']['response']
         else:
-            print(f"[Task] FlareSolverr failed for: {site_name}. Status: {data.get('status')}")
+            print(f"[Task] FlareSolverr failed for: {site.name}. Status: {data.get('status')}")
             print(f"[Task] Message: {data.get('message')}")
             return None
-            
-    except requests.exceptions.RequestException as e:
+
+    except (httpx.HTTPError, ValueError) as e:
         print(f"[Task] Failed to connect to FlareSolverr: {e}")
         print("[Task] Is FlareSolverr running in Docker?")
         return None
 # --- END FLARESOLVERR FUNCTION ---
 
 
-def get_page_html(site, search_term):
+def get_plain_page_html(site, search_term, timeout, base_url=None):
+    """GET/POST fetch through the pooled client. base_url overrides site.base_url."""
+    try:
+        request_kwargs = build_search_request(site, search_term, base_url)
+    except ValueError as e:
+        print(f"[POST Payload Error] {e}")
+        return None
+
+    if request_kwargs is None:
+        return None
+
+    print(f"[Task] Using {site.search_type} for: {site.name}")
+    try:
+        response = pooled_request(timeout=timeout, **request_kwargs)
+    except Exception as e:
+        print(f"[{site.search_type} Error] {e}")
+        return None
+
+    if is_failed_response(response):
+        print(f"[{site.search_type} Error] {site.name} answered {response.status_code}")
+        return None
+
+    return extract_response_body(response, site.search_type)
+
+
+def get_hedged_page_html(site, search_term, timeout, delay):
     """
-    Fetches the HTML content from the target site.
-    Uses FlareSolverr if required, otherwise uses requests.
+    Tries the primary base URL; if it hasn't answered after `delay` seconds
+    (or failed), also tries alternate_base_url and returns the first success.
     """
-    search_query = urllib.parse.quote(search_term)
-    
-    # The 'requires_playwright' checkbox now means "requires_flaresolverr"
-    if site.requires_playwright:
-        url = (site.base_url.rstrip('/') + site.search_endpoint).replace("%QUERY%", search_query)
-        return get_page_html_with_flaresolverr(url, site.name)
+    pool = ThreadPoolExecutor(max_workers=2)
+    try:
+        # copy_context: both requests record into this scrape's timings (see metrics.py)
+        primary = pool.submit(contextvars.copy_context().run, get_plain_page_html, site, search_term, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done and primary.result():
+            return primary.result()
+
+        print(f"[Task] Hedging {site.name} against {site.alternate_base_url}")
+        hedge = pool.submit(
+            contextvars.copy_context().run, get_plain_page_html, site, search_term, timeout, site.alternate_base_url
+        )
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result():
+                    return future.result()
+        return None
+    finally:
+        # Don't wait for the loser; its response is simply dropped
+        pool.shutdown(wait=False)
+
+
+def get_page_html(site, search_term, health):
+    """
+    Fetches the HTML content from the target site, with the site's
+    renderer: FlareSolverr, the Playwright pool, or the pooled HTTP client.
+    Timeouts adapt to the site's recent latency (see resilience.py).
+    """
+    if site.renderer == site.Renderer.FLARESOLVERR:
+        timeout = adaptive_timeout(health, settings.SCRAPER_FLARESOLVERR_TIMEOUT)
+        return get_page_html_with_flaresolverr(build_search_url(site, search_term), site, timeout)
+
+    if site.renderer == site.Renderer.PLAYWRIGHT:
+        # The browsers live on the worker's event loop (see browser_pool.py)
+        timeout = adaptive_timeout(health, settings.SCRAPER_BROWSER_TIMEOUT)
+        with timed('render'):
+            return run_on_worker_loop(render_page(site, build_search_url(site, search_term), timeout))
 
-    
     # --- Standard Requests (No Playwright) ---
     # (This section is for your simple sites like Vegamovies)
-    
-    if site.search_type == 'GET':
-        print(f"[Task] Using GET for: {site.name}")
-        search_term_encoded = urllib.parse.quote(search_term)
-        url = (site.base_url.rstrip('/') + site.search_endpoint).replace("%QUERY%", search_term_encoded)
-        try:
-            response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-            return response.text
-        except Exception as e:
-            print(f"[GET Error] {e}")
-            return None
+    timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
+    if is_hedged(site):
+        return get_hedged_page_html(site, search_term, timeout, hedge_delay(health))
+    return get_plain_page_html(site, search_term, timeout)
 
-    if site.search_type == 'POST':
-        print(f"[Task] Using POST for: {site.name}")
-        url = site.base_url.rstrip('/') + site.search_endpoint
-        
-        payload_str = (site.post_payload_template or "").replace("%QUERY%", search_term)
-        
-        try:
-            payload_data = json.loads(payload_str)
-            response = requests.post(url, json=payload_data, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-        except json.JSONDecodeError:
-            try:
-                payload_data = {}
-                for line in payload_str.split('\n'):
-                    if ':' in line:
-                        key, val = line.split(':', 1)
-                        payload_data[key.strip()] = val.strip()
-                    elif '=' in line:
-                         key, val = line.split('=', 1)
-                         payload_data[key.strip()] = val.strip()
-
-                if not payload_data:
-                        raise ValueError("Payload is not JSON and not valid key-value pairs.")
-
-                print(f"[Task] Sending POST with form-data: {payload_data}")
-                response = requests.post(url, data=payload_data, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-            
-            except Exception as e:
-                print(f"[POST Payload Error] {e}")
-                return None
-        except Exception as e:
-            print(f"[POST Request Error] {e}")
-            return None
 
-        try:
-            json_response = response.json()
-            if 'data' in json_response and 'results' in json_response['data']:
-                return json_response['data']['results'] 
+def stream_page_results(site, search_term, channel_layer, channel_name, timeout, page_links=None):
+    """
+    Streaming version of get_page_html + parse_results for GET/POST sites.
+    Results are sent to channel_name as each chunk of the body is parsed,
+    and reading stops once site.max_results is reached.
+    Returns (results, streamed) or (None, False) if the fetch failed.
+    streamed is False when the response had to be parsed in one go (JSON).
+    page_links, if given, gets the page's pagination links (see pagination.py).
+    Raises ScrapeCancelled if the search is superseded mid-download.
+    """
+    try:
+        request_kwargs = build_search_request(site, search_term)
+    except ValueError as e:
+        print(f"[POST Payload Error] {e}")
+        return None, False
+
+    if request_kwargs is None:
+        return None, False
+
+    print(f"[Task] Streaming {site.search_type} for: {site.name}")
+    results = []
+    try:
+        with pooled_stream(timeout=timeout, **request_kwargs) as response:
+            if is_failed_response(response):
+                print(f"[{site.search_type} Error] {site.name} answered {response.status_code}")
+                return None, False
+
+            if is_json_response(response):
+                response.read()
+                html = extract_response_body(response, site.search_type)
+                if not html:
+                    return None, False
+                results, links = parse_page(site, html)
+                if page_links is not None:
+                    page_links.extend(links)
+                return results, False
+
+            extractor = get_extraction_plan(site).streaming_extractor(response.charset_encoding, site.max_results)
+            interest = InterestCheck(site, search_term, channel_name)
+            for chunk in response.iter_bytes():
+                if interest.abandoned():
+                    raise ScrapeCancelled(site.name)
+                batch = extractor.feed(chunk)
+                if batch and channel_name:
+                    async_to_sync(send_results)(channel_layer, [channel_name], batch, search_term)
+                results.extend(batch)
+                if extractor.done:
+                    break
             else:
-                return response.text 
-        except (json.JSONDecodeError, requests.exceptions.JSONDecodeError):
-            return response.text 
+                batch = extractor.close()
+                if batch and channel_name:
+                    async_to_sync(send_results)(channel_layer, [channel_name], batch, search_term)
+                results.extend(batch)
+            if page_links is not None:
+                page_links.extend(extractor.page_links)
+    except httpx.HTTPError as e:
+        print(f"[{site.search_type} Error] {e}")
+        # Anything already sent stays on screen; report the failure only
+        # if nothing got through.
+        return (results or None), bool(results)
+
+    return results, True
+
+
+def get_page_url_html(site, url, health):
+    """One more result page, by URL, with the site's renderer (see pagination.py)."""
+    if site.renderer == site.Renderer.FLARESOLVERR:
+        timeout = adaptive_timeout(health, settings.SCRAPER_FLARESOLVERR_TIMEOUT)
+        return get_page_html_with_flaresolverr(url, site, timeout)
+
+    if site.renderer == site.Renderer.PLAYWRIGHT:
+        timeout = adaptive_timeout(health, settings.SCRAPER_BROWSER_TIMEOUT)
+        with timed('render'):
+            return run_on_worker_loop(render_page(site, url, timeout))
+
+    timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
+    try:
+        response = pooled_request('GET', url, headers={'User-Agent': USER_AGENT}, timeout=timeout)
+    except httpx.HTTPError as e:
+        print(f"[Task] Page fetch failed for {site.name}: {e}")
+        return None
+
+    if is_failed_response(response):
+        print(f"[Task] {site.name} answered {response.status_code} for {url}")
+        return None
+    return response.text
+
+
+def fetch_more_pages(site, search_term, channel_name, first_url, page_links, found, health, deadline, on_page):
+    """
+    Fetches pages 2 and up (see pagination.py) SCRAPER_PAGE_CONCURRENCY at
+    a time and parses each as it arrives; on_page(batch) gets its results.
+    Stops at site.max_results (counting the `found` results of page 1) or
+    at the deadline. Returns the extra results.
+    Raises ScrapeCancelled if the search is superseded meanwhile.
+    """
+    pages, known = more_pages(site, search_term, first_url, page_links)
+    if not pages:
+        return []
+
+    print(f"[Task] Fetching {len(pages)} more pages of {site.name}")
+    interactive = channel_name is not None
+
+    def fetch(url):
+        if not acquire_token(site, interactive=interactive):
+            return None
+        return get_page_url_html(site, url, health)
+
+    interest = InterestCheck(site, search_term, channel_name)
+    results = []
+    pool = ThreadPoolExecutor(max_workers=settings.SCRAPER_PAGE_CONCURRENCY)
+    try:
+        # copy_context: every page records into this scrape's timings (see metrics.py)
+        futures = {pool.submit(contextvars.copy_context().run, fetch, url): page for page, url in pages}
+        pending = set(futures)
+        last_page = pages[-1][0]
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"[Task] Search deadline: dropping {len(pending)} pages of {site.name}")
+                break
+            done, pending = wait(pending, timeout=min(remaining, settings.SCRAPER_CANCEL_POLL_INTERVAL),
+                                 return_when=FIRST_COMPLETED)
+            if interest.abandoned():
+                raise ScrapeCancelled(site.name)
+
+            for future in sorted(done, key=futures.get):
+                page = futures[future]
+                try:
+                    html = future.result()
+                except Exception as e:
+                    # One broken page shouldn't cost the search the others
+                    print(f"[Task] Page {page} of {site.name} failed: {e!r}")
+                    html = None
+                if page > last_page:
+                    continue
+                batch = parse_results(site, html) if html else []
+                if html and not batch and not known:
+                    # Past the last page: the ones after it are empty too
+                    last_page = page - 1
+                    pending = {f for f in pending if futures[f] < page}
+                if site.max_results:
+                    batch = batch[:site.max_results - found - len(results)]
+                if batch:
+                    results.extend(batch)
+                    on_page(batch)
+
+            if site.max_results and found + len(results) >= site.max_results:
+                break
+    finally:
+        # Pages still loading are dropped
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def cancel_scrape(channel_layer, site, search_term, channel_name):
+    """
+    Ends an abandoned scrape's flight. Anyone who joined it since the
+    interest check gets an error instead of waiting forever.
+    """
+    set_outcome('cancelled')
+    print(f"[Task] Cancelled scrape of {site.name}: search superseded")
+    recipients = [r for r in finish_flight(site, search_term, channel_name) if r != channel_name]
+    async_to_sync(send_error)(
+        channel_layer, recipients, f"Search on {site.name} was interrupted, please search again.",
+        search_term, site
+    )
 
-    return None
 
 @shared_task
-def scrape_site(site_id, search_term, channel_name):
+def scrape_site(site_id, search_term, channel_name=None, enqueued_at=None, config=None):
     """
     The main Celery task to scrape a single site and send
     results back over the WebSocket.
+    Results also go to every channel that joined this scrape's flight
+    (see coalesce.py). With channel_name=None and no waiters it only
+    refreshes the result cache.
+    enqueued_at (unix time) is when the job was dispatched, for the
+    queue_wait timing (see metrics.py). config is the site's serialized
+    SiteSource, so the job needs no query (see site_config.py).
+    """
+    if config:
+        site = site_from_config(config)
+    else:
+        sites = get_sites([site_id])
+        if not sites:
+            return
+        site = sites[0]
+
+    with scrape_span(site, search_term, channel_name, enqueued_at, queue_for_site(site)):
+        try:
+            run_scrape(site, search_term, channel_name, page_deadline(enqueued_at))
+        except Exception:
+            # Close the flight now, or its followers wait out SCRAPER_COALESCE_TTL for nothing
+            set_outcome('error')
+            async_to_sync(send_error)(
+                get_channel_layer(), finish_flight(site, search_term, channel_name),
+                f"Failed to fetch data from {site.name}", search_term, site
+            )
+            raise
+
+
+def run_scrape(site, search_term, channel_name, deadline=None):
+    """
+    scrape_site's work, inside its timing span. More result pages are
+    fetched until deadline (unix time, see pagination.py).
     """
     channel_layer = get_channel_layer()
-    
-    try:
-        site = SiteSource.objects.get(id=site_id)
-    except SiteSource.DoesNotExist:
+
+    # Superseded or orphaned jobs end here, before any fetching (see cancellation.py)
+    if not is_wanted(site, search_term, channel_name):
+        cancel_scrape(channel_layer, site, search_term, channel_name)
         return
-    
-    html = get_page_html(site, search_term)
-
-    if not html:
-        async_to_sync(channel_layer.send)(channel_name, {
-            'type': 'send_error_message', 
-            'message': f"Failed to fetch data from {site.name}"
-        })
+
+    # Per-domain token bucket (see ratelimit.py)
+    if not acquire_token(site, interactive=channel_name is not None):
+        set_outcome('rate_limited')
+        async_to_sync(send_error)(
+            channel_layer, finish_flight(site, search_term, channel_name),
+            f"Skipping {site.name}: rate limited, try again shortly.", search_term, site
+        )
+        return
+
+    # The token wait can take a while; check again before the real work
+    if not is_wanted(site, search_term, channel_name):
+        cancel_scrape(channel_layer, site, search_term, channel_name)
         return
 
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    containers = soup.select(site.result_container_selector)
+    # Per-site progress for everyone following this scrape (see progress.py)
+    def progress(state):
+        async_to_sync(send_progress)(
+            channel_layer, flight_members(site, search_term, channel_name), site, state, search_term
+        )
 
-    if not containers:
-        print(f"[Task] No containers found for {site.name} with selector '{site.result_container_selector}'")
+    progress(FETCHING)
 
-    for item in containers:
+    health = get_site_health(site)
+    started = time.monotonic()
+    streamed_to = None
+    page_links = []
+    if can_stream(site, get_extraction_plan(site)):
+        timeout = adaptive_timeout(health, settings.SCRAPER_REQUEST_TIMEOUT)
         try:
-            title_tag = item.select_one(site.result_title_selector)
-            link_tag = item.select_one(site.result_link_selector)
-            poster_tag = item.select_one(site.result_poster_selector)
+            results, streamed = stream_page_results(site, search_term, channel_layer, channel_name, timeout, page_links)
+        except ScrapeCancelled:
+            cancel_scrape(channel_layer, site, search_term, channel_name)
+            return
+        if streamed:
+            streamed_to = channel_name
+    else:
+        html = get_page_html(site, search_term, health)
+        if html:
+            progress(PARSING)
+        results, page_links = parse_page(site, html) if html else (None, [])
 
-            if not all([title_tag, link_tag, poster_tag]):
-                continue
+    # Health tracks the first page only, like every other site
+    record_outcome(site, results is not None, time.monotonic() - started)
+
+    # Pages 2 and up (see pagination.py). The requester gets each page as it
+    # lands, so the first page goes out now rather than after the others.
+    if results and is_paginated(site) and not (site.max_results and len(results) >= site.max_results):
+        def send_page(batch):
+            if channel_name:
+                async_to_sync(send_results)(channel_layer, [channel_name], batch, search_term)
+
+        if streamed_to is None:
+            send_page(results)
+        streamed_to = channel_name
+        try:
+            results = results + fetch_more_pages(
+                site, search_term, channel_name, build_search_url(site, search_term), page_links,
+                len(results), health, deadline or page_deadline(None), send_page,
+            )
+        except ScrapeCancelled:
+            cancel_scrape(channel_layer, site, search_term, channel_name)
+            return
+
+    if results is None:
+        set_outcome('failed')
+        async_to_sync(send_error)(
+            channel_layer, finish_flight(site, search_term, channel_name),
+            f"Failed to fetch data from {site.name}", search_term, site
+        )
+        return
+
+    # Posters download in the background while the results go out
+    prefetch_posters(results)
+    store_results(site, search_term, results)
+    index_results(site, results)
+
+    # One sync->async bridge per site, results go out in batches.
+    # The requester already got streamed results; only waiters need them.
+    followers = finish_flight(site, search_term, channel_name)
+    recipients = [r for r in followers if r != streamed_to]
 
-            title = title_tag.text.strip()
-            link = link_tag['href']
-            poster = poster_tag[site.result_poster_attribute]
+    async def deliver():
+        await send_results(channel_layer, recipients, results, search_term)
+        await send_progress(channel_layer, followers, site, DONE, search_term, len(results))
 
-            if not link.startswith('http'):
-                link = urllib.parse.urljoin(site.base_url, link)
-            if not poster.startswith('http'):
-                poster = urllib.parse.urljoin(site.base_url, poster)
+    async_to_sync(deliver)()
 
-            result = {
-                'source': site.name,
-                'title': title,
-                'link': link,
-                'poster': poster,
-            }
+    print(f"[Task] Finished scraping: {site.name}")
 
-            async_to_sync(channel_layer.send)(channel_name, {
-                'type': 'send_search_result', 
-                'result': result
-            })
 
-        except Exception as e:
-            print(f"[Parsing Error] Failed to parse item from {site.name}: {e}")
-            continue
+@shared_task
+def scrape_search(site_ids, search_term, channel_name=None, enqueued_at=None, configs=None):
+    """
+    Async fan-out mode: one task fetches every site in site_ids
+    concurrently (see engine.py) instead of one scrape_site per site.
+    With channel_name=None it only refreshes the result cache.
+    """
+    run_on_worker_loop(run_search(site_ids, search_term, channel_name, enqueued_at, configs))
+
+
+def dispatch_scrapes(sites, search_term, channel_name, priority=None):
+    """
+    Sends the scrape jobs for these sites to Celery.
+    channel_name=None means "refresh the cache only".
+    """
+    if not sites:
+        return
+
+    # Browser-backed and plain sites run on separate queues, and
+    # live searches jump ahead of refreshes (see scheduling.py)
+    if priority is None:
+        priority = priority_for(channel_name)
+    enqueued_at = time.time()
+
+    # Jobs carry their sites' configs, so workers don't query them (see site_config.py)
+    if settings.SCRAPER_EXECUTION_MODE == 'async_fanout':
+        # One job per queue fetches its sites concurrently (see engine.py)
+        for queue, queue_sites in group_by_queue(sites).items():
+            scrape_search.apply_async(
+                ([site.id for site in queue_sites], search_term, channel_name),
+                {'enqueued_at': enqueued_at, 'configs': [site_to_config(site) for site in queue_sites]},
+                queue=queue, priority=priority,
+            )
+        return
+
+    for site in sites:
+        scrape_site.apply_async(
+            (site.id, search_term, channel_name),
+            {'enqueued_at': enqueued_at, 'config': site_to_config(site)},
+            queue=queue_for_site(site), priority=priority,
+        )
+
+
+def needs_prewarm(site, search_term):
+    state, _ = get_cached_results(site, search_term)
+    if state == FRESH:
+        return False
+    if not site.cache_ttl and settings.SCRAPER_SEARCH_MODE != 'index_first':
+        return False  # Nothing would keep the results
+    return allow_request(site)
+
+
+@shared_task
+def prewarm_trending():
+    """
+    Run by Celery beat every SCRAPER_PREWARM_INTERVAL seconds: re-scrapes
+    the trending terms (see trending.py) on every active site whose cached
+    results aren't fresh, at SCRAPER_PREWARM_PRIORITY, so popular searches
+    find a warm cache and index.
+    """
+    if not settings.SCRAPER_PREWARM_TRENDING:
+        return
+
+    # Pre-warming can wait: leave backed-up queues to live searches (see capacity.py)
+    busy = busy_queues(settings.SCRAPER_PREWARM_PRIORITY)
+    terms = trending_terms()
+    sites = [site for site in get_active_sites() if queue_for_site(site) not in busy]
+    dispatched = 0
+    for term, count in terms:
+        # A live scrape of the same term already fills the cache: only lead new flights
+        prewarm_sites = [
+            site for site in sites
+            if needs_prewarm(site, term) and join_flight(site, term, None)
+        ]
+        dispatch_scrapes(prewarm_sites, term, None, priority=settings.SCRAPER_PREWARM_PRIORITY)
+        dispatched += len(prewarm_sites)
 
-    print(f"[Task] Finished scraping: {site.name}")
\ No newline at end of file
+    print(f"[Task] Pre-warm: {len(terms)} trending terms, {dispatched} scrapes dispatched")
@@ -0,0 +1,147 @@
+# File: backend/scraper_api/trending.py
+
+# What people search for, so popular terms can be scraped before anyone waits.
+#
+# Every search the consumer runs is counted in a count-min sketch in Redis:
+# SCRAPER_TRENDING_DEPTH rows of SCRAPER_TRENDING_WIDTH counters, one hash
+# per row picking the counter a term increments. A term's count is the
+# smallest of its counters. Collisions can only inflate it. Updates are
+# conservative: only counters below the new estimate are raised, which keeps
+# that inflation down.
+#
+# The SCRAPER_TRENDING_TOP_K best terms are kept in a sorted set used as a
+# bounded min-heap: when it overflows the lowest entry is dropped, so a
+# new term gets in only by beating the current minimum.
+#
+# Counts decay with a half-life of SCRAPER_TRENDING_HALF_LIFE seconds, so
+# yesterday's hits fade out. The decay is applied in one pass whenever the
+# pre-warmer reads the list (see tasks.prewarm_trending).
+#
+# Redis layout:
+#   trending:sketch      hash {"<row>:<column>": count}
+#   trending:top         sorted set term -> estimated count
+#   trending:decayed_at  unix time of the last decay
+#
+# If Redis is unreachable nothing is counted and nothing is pre-warmed.
+
+import hashlib
+import time
+
+import redis
+from django.conf import settings
+
+from .cache import normalize_term
+from .redis_client import get_async_script, get_redis, get_script
+
+KEYS = ['trending:sketch', 'trending:top', 'trending:decayed_at']
+
+# ARGV: term, top-k size, then the term's counter fields.
+# Returns the term's new estimate.
+RECORD = """
+local estimate = math.huge
+local counts = {}
+for i = 3, #ARGV do
+    counts[i] = tonumber(redis.call('HGET', KEYS[1], ARGV[i])) or 0
+    estimate = math.min(estimate, counts[i])
+end
+estimate = estimate + 1
+for i = 3, #ARGV do
+    if counts[i] < estimate then
+        redis.call('HSET', KEYS[1], ARGV[i], estimate)
+    end
+end
+redis.call('ZADD', KEYS[2], estimate, ARGV[1])
+if redis.call('ZCARD', KEYS[2]) > tonumber(ARGV[2]) then
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, 0)
+end
+return tostring(estimate)
+"""
+
+# ARGV: now, half-life, floor. Scales every count by the decay since the
+# last call and forgets counts that fall below floor.
+DECAY = """
+local now = tonumber(ARGV[1])
+local last = tonumber(redis.call('GET', KEYS[3])) or now
+redis.call('SET', KEYS[3], now)
+local factor = 0.5 ^ ((now - last) / tonumber(ARGV[2]))
+local floor = tonumber(ARGV[3])
+if factor >= 1 then
+    return 0
+end
+local counters = redis.call('HGETALL', KEYS[1])
+for i = 1, #counters, 2 do
+    local value = tonumber(counters[i + 1]) * factor
+    if value < floor then
+        redis.call('HDEL', KEYS[1], counters[i])
+    else
+        redis.call('HSET', KEYS[1], counters[i], tostring(value))
+    end
+end
+local top = redis.call('ZRANGE', KEYS[2], 0, -1, 'WITHSCORES')
+for i = 1, #top, 2 do
+    local value = tonumber(top[i + 1]) * factor
+    if value < floor then
+        redis.call('ZREM', KEYS[2], top[i])
+    else
+        redis.call('ZADD', KEYS[2], value, top[i])
+    end
+end
+return #counters / 2
+"""
+
+def _client():
+    return get_redis(settings.SCRAPER_TRENDING_REDIS_URL)
+
+
+def sketch_fields(term):
+    """The counter ("row:column") term increments in each row of the sketch."""
+    fields = []
+    for row in range(settings.SCRAPER_TRENDING_DEPTH):
+        digest = hashlib.blake2b(term.encode(), digest_size=8, person=f"cms-row-{row}".encode()).digest()
+        fields.append(f"{row}:{int.from_bytes(digest, 'big') % settings.SCRAPER_TRENDING_WIDTH}")
+    return fields
+
+
+def _record_args(search_term):
+    term = normalize_term(search_term)
+    if not settings.SCRAPER_PREWARM_TRENDING or len(term) < settings.SCRAPER_TRENDING_MIN_CHARS:
+        return None
+    return [term, settings.SCRAPER_TRENDING_TOP_K] + sketch_fields(term)
+
+
+def record_search(search_term):
+    """Counts one search for search_term."""
+    args = _record_args(search_term)
+    if args is None:
+        return
+    try:
+        get_script(settings.SCRAPER_TRENDING_REDIS_URL, RECORD)(keys=KEYS, args=args)
+    except redis.RedisError as e:
+        print(f"[Trending] Could not record '{args[0]}': {e}")
+
+
+async def arecord_search(search_term):
+    """Async version of record_search, for the consumer."""
+    args = _record_args(search_term)
+    if args is None:
+        return
+    try:
+        await get_async_script(settings.SCRAPER_TRENDING_REDIS_URL, RECORD)(keys=KEYS, args=args)
+    except redis.RedisError as e:
+        print(f"[Trending] Could not record '{args[0]}': {e}")
+
+
+def trending_terms(limit=None, min_count=None):
+    """[(term, count)], most searched first, after applying the decay."""
+    limit = limit or settings.SCRAPER_PREWARM_TERMS
+    min_count = settings.SCRAPER_PREWARM_MIN_COUNT if min_count is None else min_count
+    client = _client()
+    try:
+        get_script(settings.SCRAPER_TRENDING_REDIS_URL, DECAY)(
+            keys=KEYS, args=[time.time(), settings.SCRAPER_TRENDING_HALF_LIFE, settings.SCRAPER_TRENDING_FLOOR]
+        )
+        top = client.zrevrangebyscore(KEYS[1], '+inf', min_count, start=0, num=limit, withscores=True)
+    except redis.RedisError as e:
+        print(f"[Trending] Could not read trending terms: {e}")
+        return []
+    return [(term.decode(), count) for term, count in top]
@@ -1,3 +1,66 @@
-from django.shortcuts import render
+# File: backend/scraper_api/views.py
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, HttpResponseNotFound
+from django.views.decorators.http import require_GET
+
+from .metrics import POSTERS, render_metrics
+from .posters import PosterError, aget_thumbnail, verify
+
+
+@require_GET
+async def poster(request):
+    """
+    Serves a cached WebP thumbnail of a result's poster (see posters.py).
+    ?url=<original poster URL>&w=<width>&sig=<signature>
+    Async, so cold posters are fetched and transcoded side by side instead
+    of queueing on Daphne's thread for sync views.
+    """
+    url = request.GET.get('url', '')
+    if not url.startswith(('http://', 'https://')) or not verify(url, request.GET.get('sig')):
+        return HttpResponseNotFound()
+
+    try:
+        width = int(request.GET.get('w') or settings.SCRAPER_POSTER_WIDTHS[0])
+    except ValueError:
+        return HttpResponseBadRequest()
+    if width not in settings.SCRAPER_POSTER_WIDTHS:
+        return HttpResponseBadRequest()
+
+    try:
+        path = await aget_thumbnail(url, width)
+    except PosterError:
+        # The client falls back to its placeholder
+        POSTERS.labels('failed').inc()
+        response = HttpResponse(status=502)
+        response['Cache-Control'] = f"public, max-age={settings.SCRAPER_POSTER_FAILURE_TTL}"
+        return response
+
+    try:
+        image = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    except (TypeError, FileNotFoundError):
+        # Evicted between the lookup and the read; the next request re-fetches it
+        POSTERS.labels('evicted').inc()
+        return HttpResponse(status=503)
+
+    POSTERS.labels('served').inc()
+
+    response = FileResponse(image, content_type='image/webp')
+    # The URL names the original poster, which is never re-fetched
+    response['Cache-Control'] = f"public, max-age={settings.SCRAPER_POSTER_BROWSER_MAX_AGE}, immutable"
+    return response
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint (see metrics.py). With SCRAPER_METRICS_TOKEN
+    set, requests need "Authorization: Bearer <token>".
+    """
+    token = settings.SCRAPER_METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return HttpResponse(status=401)
+
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,97 @@
+# File: backend/scraper_api/wire.py
+
+# Compact binary frames for the search WebSocket.
+#
+# The client picks the format when it connects, by WebSocket subprotocol:
+#   scraper.msgpack.v1   binary frames, described below
+#   scraper.json         plain JSON text frames (also used with no subprotocol)
+# The page offers both; the server picks msgpack unless it is turned off
+# (SCRAPER_WIRE_MSGPACK=0) or msgpack isn't installed. Client -> server
+# messages stay JSON text either way, they are tiny.
+#
+# A binary frame is one flag byte, then a MessagePack map:
+#   0x00 | msgpack                  stored
+#   0x01 | zlib(msgpack)            deflated, for frames over SCRAPER_WIRE_COMPRESS_MIN bytes
+#   {"d": [new strings], "m": message}
+# Each connection keeps a string table that only grows. Repeated values
+# are sent once, in "d", and referred to by their position afterwards:
+#   "source": "Vegamovies"                -> "source": 3
+#   "link": "https://vegamovies.xx/dune/" -> "link": [4, "dune/"]
+# URL fields are split into a prefix (origin, plus the original poster's
+# origin for /posters/ proxy URLs, see posters.poster_url) and the rest.
+# Everything else is sent as is, so the decoder in frontend/src/wire.js
+# only has to undo those two rules.
+#
+# Daphne doesn't negotiate permessage-deflate, which is why frames are
+# deflated here. Under a server that does (uvicorn), JSON clients get
+# compressed too, and msgpack frames are already compressed.
+
+import re
+import zlib
+
+from django.conf import settings
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_SUBPROTOCOL = 'scraper.msgpack.v1'
+JSON_SUBPROTOCOL = 'scraper.json'
+
+STORED = b'\x00'
+DEFLATED = b'\x01'
+
+INTERNED_FIELDS = ('source',)
+URL_FIELDS = ('link', 'poster', 'poster_2x')
+
+# The origin, and for proxied posters the quoted origin of the original URL
+URL_PREFIX = re.compile(r'https?://[^/?#]+/(?:posters/\?url=https?%3A%2F%2F[^%&]+%2F)?')
+
+
+def choose_subprotocol(offered):
+    """The subprotocol to accept from the client's list; None for plain JSON."""
+    if MSGPACK_SUBPROTOCOL in offered and MSGPACK_AVAILABLE and settings.SCRAPER_WIRE_MSGPACK:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+class MsgpackWire:
+    """One connection's encoder and its string table."""
+
+    def __init__(self):
+        self.strings = {}
+        self.new_strings = []
+
+    def intern(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+            self.new_strings.append(value)
+        return index
+
+    def compact(self, value, key=None):
+        if isinstance(value, dict):
+            return {k: self.compact(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.compact(item) for item in value]
+        if isinstance(value, str):
+            if key in INTERNED_FIELDS:
+                return self.intern(value)
+            if key in URL_FIELDS:
+                match = URL_PREFIX.match(value)
+                if match:
+                    return [self.intern(match.group()), value[match.end():]]
+        return value
+
+    def encode(self, content):
+        """content as a binary frame; the string table is updated as it goes."""
+        message = self.compact(content)
+        packed = msgpack.packb({'d': self.new_strings, 'm': message}, use_bin_type=True)
+        self.new_strings = []
+        if len(packed) < settings.SCRAPER_WIRE_COMPRESS_MIN:
+            return STORED + packed
+        return DEFLATED + zlib.compress(packed, settings.SCRAPER_WIRE_COMPRESS_LEVEL)
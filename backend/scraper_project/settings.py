@@ -37,7 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Whitenoise middleware
+    'scraper_api.middleware.AsyncWhiteNoiseMiddleware', # Whitenoise, async-capable (see scraper_api/middleware.py)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.common.CommonMiddleware',
@@ -69,12 +69,54 @@ TEMPLATES = [
 WSGI_APPLICATION = 'scraper_project.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE='sqlite' (default, single node) or 'postgres' (several nodes, or
+# many workers). See "Database" in the README.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+if DB_ENGINE == 'postgres':
+    DB_POOL = os.environ.get('DB_POOL', '1') == '1' # psycopg connection pool, per process
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'scraper'),
+            'USER': os.environ.get('DB_USER', 'scraper'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # The pool keeps connections open itself; Django refuses CONN_MAX_AGE with it
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)), # Seconds to wait for a free connection
+                },
+            } if DB_POOL else {},
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': float(os.environ.get('DB_SQLITE_TIMEOUT', 5)), # Seconds to wait for a lock
+            },
+        }
+    }
+    # WAL: readers (consumers) never wait for writers (workers), and
+    # IMMEDIATE transactions queue for the write lock instead of failing
+    # with "database is locked" when two of them try to upgrade at once.
+    if os.environ.get('DB_SQLITE_WAL', '1') == '1':
+        DATABASES['default']['OPTIONS'].update({
+            'timeout': float(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                f"PRAGMA synchronous={os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL')};"
+                'PRAGMA temp_store=MEMORY'
+            ),
+        })
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -105,22 +147,238 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 ASGI_APPLICATION = 'scraper_project.asgi.application'
 
 # CHANNEL_LAYERS (for WebSockets)
+# Several comma-separated URLs shard the channels and groups across those
+# Redis servers (by consistent hash), so no single Redis carries every
+# result frame. Every Daphne and worker must list them in the same order.
+CHANNEL_REDIS_URLS = [url.strip() for url in os.environ.get('CHANNEL_REDIS_URLS', 'redis://127.0.0.1:6379/0').split(',') if url.strip()]
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+            "hosts": CHANNEL_REDIS_URLS,
+            "prefix": os.environ.get('CHANNEL_PREFIX', 'asgi'),
+            "capacity": int(os.environ.get('CHANNEL_CAPACITY', 100)), # Messages a channel holds before sends fail
+            "expiry": int(os.environ.get('CHANNEL_EXPIRY', 60)), # Seconds an unread message is kept
+            "group_expiry": int(os.environ.get('CHANNEL_GROUP_EXPIRY', 86400)),
         },
     },
 }
 
+# CACHES (Redis tier of the search-result cache, see scraper_api/cache.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
 # CELERY (for Background Tasks)
-CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
-CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
+# The broker can live on its own Redis, away from the channel layer's traffic
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', "redis://127.0.0.1:6379/0")
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
-# --- QUEUE SETTINGS ARE NO LONGER NEEDED ---
-# We can run everything in one fast queue now
-CELERY_TASK_DEFAULT_QUEUE = 'celery'
\ No newline at end of file
+# QUEUES + PRIORITY (see scraper_api/scheduling.py)
+# Browser-backed (FlareSolverr) sites get their own queue and workers
+SCRAPER_FAST_QUEUE = os.environ.get('SCRAPER_FAST_QUEUE', 'fast_queue')
+SCRAPER_BROWSER_QUEUE = os.environ.get('SCRAPER_BROWSER_QUEUE', 'browser_queue')
+CELERY_TASK_DEFAULT_QUEUE = SCRAPER_FAST_QUEUE
+# Redis broker: lower priority number is served first
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1 # Don't let a worker hoard low-priority jobs
+SCRAPER_INTERACTIVE_PRIORITY = int(os.environ.get('SCRAPER_INTERACTIVE_PRIORITY', 0))
+SCRAPER_REFRESH_PRIORITY = int(os.environ.get('SCRAPER_REFRESH_PRIORITY', 6))
+
+# SEARCH EXECUTION MODE
+# 'per_site'     -> one scrape_site task per active SiteSource
+# 'async_fanout' -> one scrape_search task fetches every site concurrently
+SCRAPER_EXECUTION_MODE = os.environ.get('SCRAPER_EXECUTION_MODE', 'per_site')
+SCRAPER_MAX_CONCURRENCY = int(os.environ.get('SCRAPER_MAX_CONCURRENCY', 20)) # Per search
+SCRAPER_MAX_PER_HOST = int(os.environ.get('SCRAPER_MAX_PER_HOST', 4))
+SCRAPER_PAGE_CONCURRENCY = int(os.environ.get('SCRAPER_PAGE_CONCURRENCY', 4)) # Result pages 2+ fetched at once per site (see scraper_api/pagination.py)
+
+
+# HTTP CONNECTION POOL (see scraper_api/http_pool.py)
+SCRAPER_HTTP_POOL_SIZE = int(os.environ.get('SCRAPER_HTTP_POOL_SIZE', 10)) # Connections per host
+# Per-host overrides, e.g. "localhost:8191=4,vegamovies.talk=20"
+SCRAPER_HTTP_HOST_POOL_SIZES = {
+    host.strip(): int(size)
+    for host, size in (
+        pair.split('=', 1) for pair in os.environ.get('SCRAPER_HTTP_HOST_POOL_SIZES', '').split(',') if '=' in pair
+    )
+}
+SCRAPER_HTTP_KEEPALIVE = float(os.environ.get('SCRAPER_HTTP_KEEPALIVE', 60)) # Seconds an idle connection is kept
+SCRAPER_HTTP2 = os.environ.get('SCRAPER_HTTP2', '1') == '1'
+SCRAPER_DNS_CACHE_TTL = int(os.environ.get('SCRAPER_DNS_CACHE_TTL', 300)) # 0 disables the DNS cache
+SCRAPER_DNS_CACHE_SIZE = int(os.environ.get('SCRAPER_DNS_CACHE_SIZE', 1024)) # Hosts per process, least recently used go first
+
+# SEARCH RESULT CACHE (see scraper_api/cache.py)
+# Freshness is per site (SiteSource.cache_ttl); these apply to every site.
+SCRAPER_RESULT_CACHE_ALIAS = 'default'
+SCRAPER_RESULT_CACHE_LOCAL_SIZE = int(os.environ.get('SCRAPER_RESULT_CACHE_LOCAL_SIZE', 1000)) # Entries in the in-process LRU
+SCRAPER_RESULT_CACHE_STALE = int(os.environ.get('SCRAPER_RESULT_CACHE_STALE', 3600)) # Seconds a stale entry may still be served
+
+# REQUEST COALESCING (see scraper_api/coalesce.py)
+SCRAPER_COALESCE_SEARCHES = os.environ.get('SCRAPER_COALESCE_SEARCHES', '1') == '1'
+SCRAPER_COALESCE_REDIS_URL = os.environ.get('SCRAPER_COALESCE_REDIS_URL', 'redis://127.0.0.1:6379/2')
+SCRAPER_COALESCE_TTL = int(os.environ.get('SCRAPER_COALESCE_TTL', 90)) # Seconds before an abandoned flight expires
+
+# HTML PARSER BACKEND (see scraper_api/extraction.py): 'lxml' or 'bs4'
+SCRAPER_PARSER_BACKEND = os.environ.get('SCRAPER_PARSER_BACKEND', 'lxml')
+
+# RESULT BATCHING (see scraper_api/delivery.py)
+SCRAPER_RESULT_BATCH_SIZE = int(os.environ.get('SCRAPER_RESULT_BATCH_SIZE', 50)) # Results per WebSocket frame
+SCRAPER_RESULT_BATCH_INTERVAL = float(os.environ.get('SCRAPER_RESULT_BATCH_INTERVAL', 0.25)) # Max seconds a result waits for its batch
+
+# STREAMING PARSE: parse GET/POST pages while they download (lxml backend only)
+SCRAPER_STREAM_PARSING = os.environ.get('SCRAPER_STREAM_PARSING', '1') == '1'
+
+# SITE HEALTH: adaptive timeouts, circuit breakers, hedging (see scraper_api/resilience.py)
+SCRAPER_HEALTH_REDIS_URL = os.environ.get('SCRAPER_HEALTH_REDIS_URL', 'redis://127.0.0.1:6379/2')
+SCRAPER_REQUEST_TIMEOUT = float(os.environ.get('SCRAPER_REQUEST_TIMEOUT', 10)) # Max seconds for a plain GET/POST
+SCRAPER_FLARESOLVERR_TIMEOUT = float(os.environ.get('SCRAPER_FLARESOLVERR_TIMEOUT', 60)) # Max seconds for a FlareSolverr solve
+SCRAPER_ADAPTIVE_TIMEOUTS = os.environ.get('SCRAPER_ADAPTIVE_TIMEOUTS', '1') == '1'
+SCRAPER_TIMEOUT_MULTIPLIER = float(os.environ.get('SCRAPER_TIMEOUT_MULTIPLIER', 3)) # Timeout = p95 x this...
+SCRAPER_TIMEOUT_MIN = float(os.environ.get('SCRAPER_TIMEOUT_MIN', 2)) # ...but never below this
+SCRAPER_LATENCY_WINDOW = int(os.environ.get('SCRAPER_LATENCY_WINDOW', 100)) # Latency samples kept per site
+SCRAPER_LATENCY_MIN_SAMPLES = int(os.environ.get('SCRAPER_LATENCY_MIN_SAMPLES', 5)) # Before adapting
+SCRAPER_BREAKER_THRESHOLD = int(os.environ.get('SCRAPER_BREAKER_THRESHOLD', 5)) # Consecutive failures to open
+SCRAPER_BREAKER_COOLDOWN = int(os.environ.get('SCRAPER_BREAKER_COOLDOWN', 60)) # Seconds before a probe
+SCRAPER_HEDGE_DEFAULT_DELAY = float(os.environ.get('SCRAPER_HEDGE_DEFAULT_DELAY', 3)) # Until the site has enough samples
+SCRAPER_HEDGE_MIN_DELAY = float(os.environ.get('SCRAPER_HEDGE_MIN_DELAY', 0.5))
+
+# PLAYWRIGHT BROWSER POOL (see scraper_api/browser_pool.py), for sites with renderer=playwright
+SCRAPER_BROWSER_POOL_SIZE = int(os.environ.get('SCRAPER_BROWSER_POOL_SIZE', 4)) # Warm contexts (= concurrent renders) per worker process
+SCRAPER_BROWSER_MAX_PAGES = int(os.environ.get('SCRAPER_BROWSER_MAX_PAGES', 50)) # Renders before a context is replaced
+SCRAPER_BROWSER_TIMEOUT = float(os.environ.get('SCRAPER_BROWSER_TIMEOUT', 20)) # Max seconds for a render
+SCRAPER_BROWSER_HEADLESS = os.environ.get('SCRAPER_BROWSER_HEADLESS', '1') == '1'
+SCRAPER_BROWSER_BLOCKED_TYPES = tuple(filter(None, os.environ.get('SCRAPER_BROWSER_BLOCKED_TYPES', 'image,font,media').split(',')))
+SCRAPER_BROWSER_BLOCKED_DOMAINS = tuple(filter(None, os.environ.get(
+    'SCRAPER_BROWSER_BLOCKED_DOMAINS',
+    'doubleclick.net,googlesyndication.com,google-analytics.com,googletagmanager.com,adservice.google.com,'
+    'facebook.net,scorecardresearch.com,quantserve.com,popads.net,propellerads.com,adsterra.com,'
+    'onclickads.net,histats.com,disqus.com,hotjar.com,clarity.ms',
+).split(',')))
+
+# FLARESOLVERR SESSIONS + CLEARANCE REUSE (see scraper_api/flaresolverr.py)
+SCRAPER_FLARESOLVERR_URL = os.environ.get('SCRAPER_FLARESOLVERR_URL', 'http://localhost:8191/v1')
+SCRAPER_FLARESOLVERR_SESSIONS = os.environ.get('SCRAPER_FLARESOLVERR_SESSIONS', '1') == '1' # One browser session per site
+SCRAPER_FLARESOLVERR_SESSION_TTL = int(os.environ.get('SCRAPER_FLARESOLVERR_SESSION_TTL', 30)) # Minutes before FlareSolverr recycles it
+SCRAPER_CLEARANCE_REUSE = os.environ.get('SCRAPER_CLEARANCE_REUSE', '1') == '1' # Reuse cf_clearance over plain HTTP
+SCRAPER_CLEARANCE_MAX_AGE = int(os.environ.get('SCRAPER_CLEARANCE_MAX_AGE', 1800)) # Seconds, if the cookie doesn't say
+SCRAPER_CLEARANCE_REDIS_URL = os.environ.get('SCRAPER_CLEARANCE_REDIS_URL', 'redis://127.0.0.1:6379/2')
+
+# PER-DOMAIN RATE LIMITS (see scraper_api/ratelimit.py)
+SCRAPER_RATE_LIMITS = os.environ.get('SCRAPER_RATE_LIMITS', '1') == '1'
+SCRAPER_RATE_LIMIT_REDIS_URL = os.environ.get('SCRAPER_RATE_LIMIT_REDIS_URL', 'redis://127.0.0.1:6379/2')
+SCRAPER_RATE_LIMIT_RATE = float(os.environ.get('SCRAPER_RATE_LIMIT_RATE', 2)) # Requests per second per host
+SCRAPER_RATE_LIMIT_BURST = int(os.environ.get('SCRAPER_RATE_LIMIT_BURST', 10))
+# Per-host overrides, e.g. "slowsite.com=0.5,fastsite.net=5"
+SCRAPER_HOST_RATE_LIMITS = {
+    host.strip(): float(rate)
+    for host, rate in (
+        pair.split('=', 1) for pair in os.environ.get('SCRAPER_HOST_RATE_LIMITS', '').split(',') if '=' in pair
+    )
+}
+SCRAPER_RATE_LIMIT_RESERVE = int(os.environ.get('SCRAPER_RATE_LIMIT_RESERVE', 2)) # Tokens only live searches may use
+SCRAPER_RATE_LIMIT_MAX_WAIT = float(os.environ.get('SCRAPER_RATE_LIMIT_MAX_WAIT', 5)) # Seconds, live searches
+SCRAPER_RATE_LIMIT_REFRESH_MAX_WAIT = float(os.environ.get('SCRAPER_RATE_LIMIT_REFRESH_MAX_WAIT', 60))
+
+# RESULT INDEX (see scraper_api/index.py)
+# 'live'        -> every search goes through the result cache / live scrapes
+# 'index_first' -> indexed hits are sent first; only sites with missing or
+#                  stale hits are scraped
+SCRAPER_SEARCH_MODE = os.environ.get('SCRAPER_SEARCH_MODE', 'live')
+SCRAPER_INDEX_RESULTS = os.environ.get('SCRAPER_INDEX_RESULTS', '1') == '1' # Upsert every scrape into ScrapedResult
+SCRAPER_INDEX_BATCH_SIZE = int(os.environ.get('SCRAPER_INDEX_BATCH_SIZE', 500))
+SCRAPER_INDEX_MAX_HITS = int(os.environ.get('SCRAPER_INDEX_MAX_HITS', 50)) # Per site, if max_results isn't set
+SCRAPER_INDEX_MAX_AGE = int(os.environ.get('SCRAPER_INDEX_MAX_AGE', 3600)) # Seconds, for sites with cache_ttl 0
+
+# CANCELLATION (see scraper_api/cancellation.py)
+SCRAPER_CANCEL_SCRAPES = os.environ.get('SCRAPER_CANCEL_SCRAPES', '1') == '1' # Stop scrapes nobody waits for
+SCRAPER_CANCEL_POLL_INTERVAL = float(os.environ.get('SCRAPER_CANCEL_POLL_INTERVAL', 0.5)) # Seconds between checks mid-fetch
+SCRAPER_ACTIVE_SEARCH_TTL = int(os.environ.get('SCRAPER_ACTIVE_SEARCH_TTL', 3600)) # Outlives the connection if Daphne dies
+
+# CROSS-SOURCE MERGING (see scraper_api/merging.py)
+SCRAPER_MERGE_RESULTS = os.environ.get('SCRAPER_MERGE_RESULTS', '1') == '1' # One card per film, mirrors as extra sources
+SCRAPER_MERGE_THRESHOLD = float(os.environ.get('SCRAPER_MERGE_THRESHOLD', 0.6)) # Title token Jaccard similarity
+
+# POSTER PROXY (see scraper_api/posters.py)
+SCRAPER_POSTER_PROXY = os.environ.get('SCRAPER_POSTER_PROXY', '1') == '1' # Serve posters as cached WebP thumbnails
+SCRAPER_POSTER_BASE_URL = os.environ.get('SCRAPER_POSTER_BASE_URL', '') # Default: the host the WebSocket connected to
+SCRAPER_POSTER_CACHE_DIR = os.environ.get('SCRAPER_POSTER_CACHE_DIR', str(BASE_DIR / 'poster_cache')) # Shared by Daphne + workers
+SCRAPER_POSTER_CACHE_MAX_BYTES = int(os.environ.get('SCRAPER_POSTER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Thumbnail widths: the card size, then its 2x version for high-DPI screens
+SCRAPER_POSTER_WIDTHS = [int(w) for w in os.environ.get('SCRAPER_POSTER_WIDTHS', '320,640').split(',')]
+SCRAPER_POSTER_QUALITY = int(os.environ.get('SCRAPER_POSTER_QUALITY', 75)) # WebP quality
+SCRAPER_POSTER_TIMEOUT = float(os.environ.get('SCRAPER_POSTER_TIMEOUT', 10))
+SCRAPER_POSTER_MAX_SOURCE_BYTES = int(os.environ.get('SCRAPER_POSTER_MAX_SOURCE_BYTES', 10 * 1024 * 1024))
+SCRAPER_POSTER_FAILURE_TTL = int(os.environ.get('SCRAPER_POSTER_FAILURE_TTL', 300)) # Don't retry a broken poster for this long
+SCRAPER_POSTER_BROWSER_MAX_AGE = int(os.environ.get('SCRAPER_POSTER_BROWSER_MAX_AGE', 30 * 24 * 3600))
+SCRAPER_POSTER_PREFETCH_CONCURRENCY = int(os.environ.get('SCRAPER_POSTER_PREFETCH_CONCURRENCY', 8))
+
+# TYPE-AHEAD (see scraper_api/suggest.py)
+SCRAPER_SUGGEST_LIMIT = int(os.environ.get('SCRAPER_SUGGEST_LIMIT', 8)) # Suggestions per keystroke
+SCRAPER_SUGGEST_SETTLE_DELAY = float(os.environ.get('SCRAPER_SUGGEST_SETTLE_DELAY', 0.6)) # Quiet time before the live search
+SCRAPER_SUGGEST_MIN_SEARCH_CHARS = int(os.environ.get('SCRAPER_SUGGEST_MIN_SEARCH_CHARS', 3)) # Shorter queries only get suggestions
+SCRAPER_SUGGEST_MAX_TITLES = int(os.environ.get('SCRAPER_SUGGEST_MAX_TITLES', 100000)) # Most recently seen index rows kept in memory
+SCRAPER_SUGGEST_REFRESH_INTERVAL = int(os.environ.get('SCRAPER_SUGGEST_REFRESH_INTERVAL', 60)) # Seconds between rebuilds
+
+# TRENDING PRE-WARM (see scraper_api/trending.py + tasks.prewarm_trending)
+# Needs Celery beat: celery -A scraper_project beat
+SCRAPER_PREWARM_TRENDING = os.environ.get('SCRAPER_PREWARM_TRENDING', '1') == '1'
+SCRAPER_TRENDING_REDIS_URL = os.environ.get('SCRAPER_TRENDING_REDIS_URL', 'redis://127.0.0.1:6379/2')
+SCRAPER_TRENDING_WIDTH = int(os.environ.get('SCRAPER_TRENDING_WIDTH', 2048)) # Count-min sketch counters per row
+SCRAPER_TRENDING_DEPTH = int(os.environ.get('SCRAPER_TRENDING_DEPTH', 4)) # Count-min sketch rows
+SCRAPER_TRENDING_TOP_K = int(os.environ.get('SCRAPER_TRENDING_TOP_K', 100)) # Terms tracked as trending
+SCRAPER_TRENDING_HALF_LIFE = int(os.environ.get('SCRAPER_TRENDING_HALF_LIFE', 6 * 3600)) # Seconds for a count to halve
+SCRAPER_TRENDING_FLOOR = float(os.environ.get('SCRAPER_TRENDING_FLOOR', 0.1)) # Decayed counts below this are dropped
+SCRAPER_TRENDING_MIN_CHARS = int(os.environ.get('SCRAPER_TRENDING_MIN_CHARS', 3))
+SCRAPER_PREWARM_INTERVAL = int(os.environ.get('SCRAPER_PREWARM_INTERVAL', 900)) # Seconds between pre-warm runs
+SCRAPER_PREWARM_TERMS = int(os.environ.get('SCRAPER_PREWARM_TERMS', 20)) # Terms re-scraped per run
+SCRAPER_PREWARM_MIN_COUNT = float(os.environ.get('SCRAPER_PREWARM_MIN_COUNT', 3)) # Decayed searches a term needs
+SCRAPER_PREWARM_PRIORITY = int(os.environ.get('SCRAPER_PREWARM_PRIORITY', 9)) # Behind live searches and refreshes
+CELERY_BEAT_SCHEDULE = {
+    'prewarm-trending': {
+        'task': 'scraper_api.tasks.prewarm_trending',
+        'schedule': SCRAPER_PREWARM_INTERVAL,
+        'options': {'queue': SCRAPER_FAST_QUEUE, 'priority': SCRAPER_PREWARM_PRIORITY},
+    },
+}
+
+# SITE CONFIG SNAPSHOT (see scraper_api/site_config.py)
+SCRAPER_SITE_CONFIG_REDIS_URL = os.environ.get('SCRAPER_SITE_CONFIG_REDIS_URL', 'redis://127.0.0.1:6379/2') # Version counter + change pub/sub
+SCRAPER_SITE_CONFIG_MAX_AGE = int(os.environ.get('SCRAPER_SITE_CONFIG_MAX_AGE', 300)) # Reload at least this often, in case a change was missed
+
+# SEARCH DEADLINE (see scraper_api/progress.py)
+SCRAPER_SEARCH_DEADLINE = float(os.environ.get('SCRAPER_SEARCH_DEADLINE', 20)) # Seconds before unfinished sites are timed_out and the search completes
+
+# WIRE FORMAT (see scraper_api/wire.py)
+SCRAPER_WIRE_MSGPACK = os.environ.get('SCRAPER_WIRE_MSGPACK', '1') == '1' # Binary frames for clients offering scraper.msgpack.v1
+SCRAPER_WIRE_COMPRESS_MIN = int(os.environ.get('SCRAPER_WIRE_COMPRESS_MIN', 512)) # Bytes; smaller frames aren't deflated
+SCRAPER_WIRE_COMPRESS_LEVEL = int(os.environ.get('SCRAPER_WIRE_COMPRESS_LEVEL', 6)) # zlib level, 1-9
+
+# QUEUE LOAD + SHEDDING (see scraper_api/capacity.py)
+SCRAPER_QUEUE_STATS_REDIS_URL = os.environ.get('SCRAPER_QUEUE_STATS_REDIS_URL', 'redis://127.0.0.1:6379/2')
+SCRAPER_QUEUE_SHEDDING = os.environ.get('SCRAPER_QUEUE_SHEDDING', '1') == '1' # Skip sites whose queue is backed up
+SCRAPER_QUEUE_MAX_WAIT = float(os.environ.get('SCRAPER_QUEUE_MAX_WAIT', 10)) # Expected queue wait (s) that counts as backed up
+SCRAPER_QUEUE_LOAD_TTL = float(os.environ.get('SCRAPER_QUEUE_LOAD_TTL', 1.0)) # Seconds Daphne reuses a load reading
+
+# WORKER AUTOSCALER (see scraper_api/management/commands/autoscale_workers.py)
+SCRAPER_AUTOSCALE_INTERVAL = float(os.environ.get('SCRAPER_AUTOSCALE_INTERVAL', 5)) # Seconds between checks
+SCRAPER_AUTOSCALE_TARGET_WAIT = float(os.environ.get('SCRAPER_AUTOSCALE_TARGET_WAIT', 2)) # Grow when a live search would wait longer
+SCRAPER_AUTOSCALE_MIN = int(os.environ.get('SCRAPER_AUTOSCALE_MIN', 2)) # Pool processes per worker
+SCRAPER_AUTOSCALE_MAX = int(os.environ.get('SCRAPER_AUTOSCALE_MAX', 16))
+SCRAPER_AUTOSCALE_STEP = int(os.environ.get('SCRAPER_AUTOSCALE_STEP', 2)) # Processes added or removed at a time
+SCRAPER_AUTOSCALE_COOLDOWN = float(os.environ.get('SCRAPER_AUTOSCALE_COOLDOWN', 60)) # Idle seconds before shrinking
+
+# METRICS (see scraper_api/metrics.py)
+# Set PROMETHEUS_MULTIPROC_DIR (same empty dir for Daphne and every worker)
+# so /metrics includes the workers' timings.
+SCRAPER_METRICS_TOKEN = os.environ.get('SCRAPER_METRICS_TOKEN', '') # Optional bearer token for /metrics
@@ -19,9 +19,12 @@ from django.contrib import admin
 from django.urls import path, re_path
 from django.views.generic import TemplateView  # Import this
 from django.urls import re_path
+from scraper_api import views as scraper_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('posters/', scraper_views.poster, name='poster'),
+    path('metrics', scraper_views.metrics, name='metrics'),
 ]
 
 urlpatterns += [
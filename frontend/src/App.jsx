@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
+import { SUBPROTOCOLS, createDecoder } from './wire';
 
 // You would typically install this with: npm install lucide-react
 // For this single-file setup, I'll use simple SVG icons.
@@ -72,54 +73,76 @@ function MovieCardSkeleton() {
  * @param {string} props.movie.title - The title of the movie
  * @param {string} props.movie.link - The direct URL to the movie
  * @param {string} props.movie.poster - The URL for the movie's poster image
+ * @param {string} [props.movie.poster_2x] - The same poster for high-DPI screens (poster proxy)
  * @param {string} props.movie.source - The name of the source website
+ * @param {Array} [props.movie.sources] - Every source carrying this film (merged results)
  */
 function MovieCard({ movie }) {
-  const { title, link, poster, source } = movie;
+  const { title, link, poster, poster_2x, source } = movie;
+  // Other sites carrying the same film (the first entry is this card's own link)
+  const mirrors = (movie.sources || []).slice(1);
 
   // Fallback image in case the poster URL is broken
   const handleImageError = (e) => {
     const bgColor = '343a40'; // A dark gray
     const textColor = 'ffffff';
     const placeholderText = title.split(' ').slice(0, 2).join('+');
+    e.target.srcset = '';
     e.target.src = `https://placehold.co/500x750/${bgColor}/${textColor}?text=${placeholderText}&font=roboto`;
   };
 
   return (
-    <a
-      href={link}
-      target="_blank"
-      rel="noopener noreferrer"
-      className="group block bg-white/5 backdrop-blur-sm rounded-lg overflow-hidden shadow-lg hover:shadow-2xl transition-all duration-300 ease-in-out transform hover:-translate-y-1"
-    >
-      <div className="relative">
-        {/* Source Badge */}
-        <span className="absolute top-2 left-2 z-10 bg-indigo-600 text-white px-2 py-1 text-xs font-bold rounded">
-          {source}
-        </span>
-
-        {/* Poster Image */}
-        <img
-          src={poster}
-          alt={`Poster for ${title}`}
-          onError={handleImageError}
-          className="w-full h-auto aspect-[2/3] object-cover transition-transform duration-300 group-hover:scale-105"
-          loading="lazy"
-        />
-        <div className="absolute inset-0 bg-gradient-to-t from-black/50 to-transparent"></div>
-      </div>
+    <div className="group bg-white/5 backdrop-blur-sm rounded-lg overflow-hidden shadow-lg hover:shadow-2xl transition-all duration-300 ease-in-out transform hover:-translate-y-1">
+      <a href={link} target="_blank" rel="noopener noreferrer" className="block">
+        <div className="relative">
+          {/* Source Badge */}
+          <span className="absolute top-2 left-2 z-10 bg-indigo-600 text-white px-2 py-1 text-xs font-bold rounded">
+            {source}
+            {mirrors.length > 0 && ` +${mirrors.length}`}
+          </span>
+
+          {/* Poster Image */}
+          <img
+            src={poster}
+            srcSet={poster_2x ? `${poster} 1x, ${poster_2x} 2x` : undefined}
+            alt={`Poster for ${title}`}
+            onError={handleImageError}
+            className="w-full h-auto aspect-[2/3] object-cover transition-transform duration-300 group-hover:scale-105"
+            loading="lazy"
+          />
+          <div className="absolute inset-0 bg-gradient-to-t from-black/50 to-transparent"></div>
+        </div>
 
-      {/* Card Content */}
-      <div className="p-4">
-        <h3 className="font-semibold text-gray-100 text-base truncate group-hover:text-indigo-300 transition-colors">
-          {title}
-        </h3>
-        <div className="flex items-center text-sm text-gray-400 mt-1 group-hover:text-white">
-          Visit Source
-          <ExternalLinkIcon />
+        {/* Card Content */}
+        <div className="p-4 pb-2">
+          <h3 className="font-semibold text-gray-100 text-base truncate group-hover:text-indigo-300 transition-colors">
+            {title}
+          </h3>
+          <div className="flex items-center text-sm text-gray-400 mt-1 group-hover:text-white">
+            Visit Source
+            <ExternalLinkIcon />
+          </div>
         </div>
-      </div>
-    </a>
+      </a>
+
+      {/* Mirrors */}
+      {mirrors.length > 0 && (
+        <div className="px-4 pb-4 flex flex-wrap gap-1">
+          {mirrors.map((mirror) => (
+            <a
+              key={mirror.link}
+              href={mirror.link}
+              target="_blank"
+              rel="noopener noreferrer"
+              title={mirror.title}
+              className="bg-gray-700 hover:bg-indigo-600 text-gray-200 px-2 py-0.5 text-xs rounded"
+            >
+              {mirror.source}
+            </a>
+          ))}
+        </div>
+      )}
+    </div>
   );
 }
 
@@ -132,9 +155,13 @@ function App() {
   const [isSearching, setIsSearching] = useState(false);
   const [connectionStatus, setConnectionStatus] = useState('Disconnected');
   const [error, setError] = useState(null);
+  const [suggestions, setSuggestions] = useState([]);
+  // Per-site state of the current search: { name: 'fetching' | 'done' | ... }
+  const [siteProgress, setSiteProgress] = useState({});
 
   const ws = useRef(null);
   const searchTimeout = useRef(null); // Ref to store timeout
+  const searchId = useRef(null); // Id of the search the progress belongs to
 
   const WEBSOCKET_URL = 'ws://localhost:8000/ws/search/';
 
@@ -160,7 +187,13 @@ function App() {
     }
 
     setConnectionStatus('Connecting...');
-    ws.current = new WebSocket(WEBSOCKET_URL);
+    // The server answers in binary MessagePack frames if it supports them,
+    // JSON text frames otherwise (see wire.js)
+    ws.current = new WebSocket(WEBSOCKET_URL, SUBPROTOCOLS);
+    ws.current.binaryType = 'arraybuffer';
+    const decode = createDecoder();
+    // Deflated frames decode asynchronously; this keeps them in order
+    let received = Promise.resolve();
 
     ws.current.onopen = () => {
       setConnectionStatus('Connected');
@@ -169,15 +202,39 @@ function App() {
     };
 
     ws.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+      received = received
+        .then(() => (typeof event.data === 'string' ? JSON.parse(event.data) : decode(event.data)))
+        .then(handleMessage)
+        .catch((err) => console.error('Could not read a frame:', err));
+    };
 
-      if (data.error) {
+    const handleMessage = (data) => {
+      if (data.suggestions) {
+        // Type-ahead answers from the server's title index
+        setSuggestions(data.suggestions);
+      } else if (data.searching) {
+        // The server started a live search once the typing settled
+        resetResults();
+      } else if (Array.isArray(data)) {
+        // A batch of results (one frame per site/chunk)
+        addResults(data);
+      } else if (data.updates) {
+        // Merged results: more sources for cards already shown
+        applyUpdates(data.updates);
+      } else if (data.progress) {
+        // Only the sites that changed; a new search id starts over
+        applyProgress(data.search, data.progress);
+      } else if (data.search_complete) {
+        // Every site is done, failed or timed out: the search is over
+        const { search, sites } = data.search_complete;
+        applyProgress(search, Object.fromEntries(Object.entries(sites).map(([name, site]) => [name, site.state])));
+        finishSearch();
+      } else if (data.error) {
         console.error('WebSocket Error:', data.message);
         // You could set a specific error message for this source
       } else if (data.source) {
-        // Handle a successful result
-        setResults((prevResults) => [...prevResults, data]);
-        setSources((prevSources) => new Set(prevSources).add(data.source));
+        // Handle a single successful result
+        addResults([data]);
       }
     };
 
@@ -195,9 +252,65 @@ function App() {
     };
   };
 
+  // Best match first when the server ranks results; arrival order otherwise
+  const byScore = (a, b) => (b.score ?? 0) - (a.score ?? 0);
+
+  const sourcesOf = (result) => (result.sources ? result.sources.map((entry) => entry.source) : [result.source]);
+
+  const addSources = (names) => {
+    setSources((prevSources) => {
+      const nextSources = new Set(prevSources);
+      names.forEach((name) => nextSources.add(name));
+      return nextSources;
+    });
+  };
+
+  // Append a list of results in one state update
+  const addResults = (newResults) => {
+    if (newResults.length === 0) return;
+    // The same link can arrive twice (index hit, then the live scrape)
+    setResults((prevResults) => {
+      const seen = new Set(prevResults.map((result) => result.link));
+      const unseen = newResults.filter((result) => !seen.has(result.link) && seen.add(result.link));
+      return unseen.length ? [...prevResults, ...unseen].sort(byScore) : prevResults;
+    });
+    addSources(newResults.flatMap(sourcesOf));
+  };
+
+  // Add sources to merged cards ({ id, sources, score } per card)
+  const applyUpdates = (updates) => {
+    const byId = new Map(updates.map((update) => [update.id, update]));
+    setResults((prevResults) =>
+      prevResults
+        .map((result) => {
+          const update = byId.get(result.id);
+          if (!update) return result;
+          return { ...result, score: update.score, sources: [...(result.sources || []), ...update.sources] };
+        })
+        .sort(byScore)
+    );
+    addSources(updates.flatMap((update) => update.sources.map((entry) => entry.source)));
+  };
+
+  const applyProgress = (id, states) => {
+    const isNew = searchId.current !== id;
+    searchId.current = id;
+    setSiteProgress((prevProgress) => ({ ...(isNew ? {} : prevProgress), ...states }));
+  };
+
+  const finishSearch = () => {
+    setIsSearching(false);
+    if (searchTimeout.current) {
+      clearTimeout(searchTimeout.current);
+      searchTimeout.current = null;
+    }
+  };
+
   const handleSearch = (e) => {
     e.preventDefault();
-    if (!searchTerm.trim() || isSearching) return; // Don't search if already searching
+    // A new search may start while one is running: the server cancels the
+    // old one's scrapes and drops its late results
+    if (!searchTerm.trim()) return;
 
     // Ensure connection is open before sending
     if (!ws.current || ws.current.readyState !== WebSocket.OPEN) {
@@ -216,35 +329,72 @@ function App() {
     }
   };
 
-  const sendSearch = () => {
-    // Clear previous search
-    setResults([]);
-    setSources(new Set());
-    setSelectedSource('all');
-    setIsSearching(true);
-    setError(null);
+  // Typing asks for suggestions only: the server debounces and starts the
+  // live search itself once the term stops changing
+  const handleTyping = (e) => {
+    const term = e.target.value;
+    setSearchTerm(term);
+    if (ws.current && ws.current.readyState === WebSocket.OPEN) {
+      ws.current.send(JSON.stringify({ action: 'suggest', term }));
+    }
+  };
+
+  const pickSuggestion = (suggestion) => {
+    setSearchTerm(suggestion.title);
+    if (!ws.current || ws.current.readyState !== WebSocket.OPEN) return;
+    sendSearch(suggestion.title);
+  };
+
+  const sendSearch = (term = searchTerm) => {
+    resetResults();
 
     // Send search message
     ws.current.send(
       JSON.stringify({
         action: 'search',
-        term: searchTerm,
+        term,
       })
     );
+  };
 
-    // Set a timeout to re-enable the search button after 10 seconds
+  // Clear the previous search
+  const resetResults = () => {
+    setResults([]);
+    setSources(new Set());
+    setSelectedSource('all');
+    setSuggestions([]);
+    setSiteProgress({});
+    searchId.current = null;
+    setIsSearching(true);
+    setError(null);
+
+    // The server ends every search with search_complete; this is only a
+    // fallback in case that frame never arrives (e.g. the socket dropped)
+    if (searchTimeout.current) {
+      clearTimeout(searchTimeout.current);
+    }
     searchTimeout.current = setTimeout(() => {
       setIsSearching(false);
-    }, 10000); // 10-second cooldown
+    }, 60000);
   };
 
   // --- Filtering ---
   const filteredResults =
     selectedSource === 'all'
       ? results
-      : results.filter((r) => r.source === selectedSource);
+      : results.filter((r) => sourcesOf(r).includes(selectedSource));
 
   const sourceList = Array.from(sources);
+  const progressList = Object.entries(siteProgress);
+
+  const progressColors = {
+    queued: 'bg-gray-700 text-gray-300',
+    fetching: 'bg-indigo-800 text-indigo-200',
+    parsing: 'bg-indigo-700 text-indigo-100',
+    done: 'bg-green-800 text-green-200',
+    failed: 'bg-red-800 text-red-200',
+    timed_out: 'bg-yellow-800 text-yellow-200',
+  };
 
   return (
     <div className="min-h-screen bg-gray-900 text-gray-200 font-sans p-4 md:p-8">
@@ -279,14 +429,14 @@ function App() {
           <input
             type="text"
             value={searchTerm}
-            onChange={(e) => setSearchTerm(e.target.value)}
+            onChange={handleTyping}
             placeholder="Search for 'Dune', 'Oppenheimer'..."
             className="flex-grow bg-transparent text-white placeholder-gray-400 text-lg px-6 py-3 border-none outline-none rounded-full"
           />
           <button
             type="submit"
             className="bg-indigo-600 text-white rounded-full px-6 py-3 hover:bg-indigo-500 transition-colors duration-300 flex items-center disabled:bg-gray-500 disabled:cursor-not-allowed"
-            disabled={connectionStatus !== 'Connected' || isSearching}
+            disabled={connectionStatus !== 'Connected'}
           >
             <SearchIcon />
             <span className="ml-2 hidden md:inline">
@@ -295,6 +445,24 @@ function App() {
           </button>
         </form>
 
+        {/* --- Suggestions (titles already in the index) --- */}
+        {suggestions.length > 0 && (
+          <ul className="max-w-2xl mx-auto -mt-6 mb-8 bg-gray-800 border border-gray-700 rounded-lg overflow-hidden">
+            {suggestions.map((suggestion) => (
+              <li key={suggestion.link}>
+                <button
+                  type="button"
+                  onClick={() => pickSuggestion(suggestion)}
+                  className="w-full text-left px-4 py-2 hover:bg-gray-700 flex justify-between"
+                >
+                  <span className="truncate">{suggestion.title}</span>
+                  <span className="text-xs text-gray-400 ml-4">{suggestion.source}</span>
+                </button>
+              </li>
+            ))}
+          </ul>
+        )}
+
         {/* --- Error Display --- */}
         {error && (
           <div className="max-w-2xl mx-auto text-center bg-red-800/50 border border-red-700 text-red-200 px-4 py-3 rounded-lg mb-8">
@@ -302,6 +470,17 @@ function App() {
           </div>
         )}
 
+        {/* --- Per-site progress of the search --- */}
+        {progressList.length > 0 && (
+          <div className="flex flex-wrap justify-center gap-2 mb-6 text-xs">
+            {progressList.map(([name, state]) => (
+              <span key={name} className={`px-2 py-1 rounded-full ${progressColors[state] || progressColors.queued}`}>
+                {name}: {state.replace('_', ' ')}
+              </span>
+            ))}
+          </div>
+        )}
+
         {/* --- Controls: Filter & Count --- */}
         <div className="flex flex-col md:flex-row justify-between items-center mb-6">
           <h2 className="text-2xl font-semibold text-white">
@@ -353,7 +532,7 @@ function App() {
               <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 xl:grid-cols-5 gap-4 md:gap-6">
                 {filteredResults.map((movie, index) => (
                   <MovieCard
-                    key={`${movie.link}-${movie.title}-${index}`}
+                    key={movie.id ?? `${movie.link}-${movie.title}-${index}`}
                     movie={movie}
                   />
                 ))}
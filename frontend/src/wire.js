@@ -0,0 +1,121 @@
+// Decoder for the server's binary frames (backend/scraper_api/wire.py).
+//
+// A frame is one flag byte (0 = stored, 1 = deflated) and a MessagePack map
+// { d: [new strings], m: message }. The strings extend this connection's
+// table; in the message, `source` fields are table positions and URL fields
+// are [prefix position, rest].
+
+export const SUBPROTOCOLS = ['scraper.msgpack.v1', 'scraper.json'];
+
+const INTERNED_FIELDS = new Set(['source']);
+const URL_FIELDS = new Set(['link', 'poster', 'poster_2x']);
+
+const textDecoder = new TextDecoder();
+
+// Minimal MessagePack decoder: everything the server's msgpack.packb emits
+// for JSON-like data (no extension types)
+const unpack = (bytes) => {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  let offset = 0;
+
+  const str = (length) => {
+    const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+    offset += length;
+    return value;
+  };
+  const bin = (length) => {
+    const value = bytes.slice(offset, offset + length);
+    offset += length;
+    return value;
+  };
+  const array = (length) => {
+    const value = new Array(length);
+    for (let i = 0; i < length; i++) value[i] = read();
+    return value;
+  };
+  const map = (length) => {
+    const value = {};
+    for (let i = 0; i < length; i++) {
+      const key = read();
+      value[key] = read();
+    }
+    return value;
+  };
+  const next = (size, get) => {
+    const value = get(offset);
+    offset += size;
+    return value;
+  };
+
+  const read = () => {
+    const type = view.getUint8(offset++);
+    if (type <= 0x7f) return type;
+    if (type <= 0x8f) return map(type & 0x0f);
+    if (type <= 0x9f) return array(type & 0x0f);
+    if (type <= 0xbf) return str(type & 0x1f);
+    if (type >= 0xe0) return type - 0x100;
+    switch (type) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(next(1, (at) => view.getUint8(at)));
+      case 0xc5: return bin(next(2, (at) => view.getUint16(at)));
+      case 0xc6: return bin(next(4, (at) => view.getUint32(at)));
+      case 0xca: return next(4, (at) => view.getFloat32(at));
+      case 0xcb: return next(8, (at) => view.getFloat64(at));
+      case 0xcc: return next(1, (at) => view.getUint8(at));
+      case 0xcd: return next(2, (at) => view.getUint16(at));
+      case 0xce: return next(4, (at) => view.getUint32(at));
+      case 0xcf: return Number(next(8, (at) => view.getBigUint64(at)));
+      case 0xd0: return next(1, (at) => view.getInt8(at));
+      case 0xd1: return next(2, (at) => view.getInt16(at));
+      case 0xd2: return next(4, (at) => view.getInt32(at));
+      case 0xd3: return Number(next(8, (at) => view.getBigInt64(at)));
+      case 0xd9: return str(next(1, (at) => view.getUint8(at)));
+      case 0xda: return str(next(2, (at) => view.getUint16(at)));
+      case 0xdb: return str(next(4, (at) => view.getUint32(at)));
+      case 0xdc: return array(next(2, (at) => view.getUint16(at)));
+      case 0xdd: return array(next(4, (at) => view.getUint32(at)));
+      case 0xde: return map(next(2, (at) => view.getUint16(at)));
+      case 0xdf: return map(next(4, (at) => view.getUint32(at)));
+      default: throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+    }
+  };
+
+  return read();
+};
+
+const inflate = async (bytes) => {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+};
+
+// One decoder per connection: the string table lives as long as the socket
+export const createDecoder = () => {
+  const strings = [];
+
+  const expand = (value, key) => {
+    if (Array.isArray(value)) {
+      if (URL_FIELDS.has(key) && value.length === 2 && typeof value[0] === 'number') {
+        return strings[value[0]] + value[1];
+      }
+      return value.map((item) => expand(item));
+    }
+    if (value !== null && typeof value === 'object') {
+      return Object.fromEntries(Object.entries(value).map(([k, v]) => [k, expand(v, k)]));
+    }
+    if (INTERNED_FIELDS.has(key) && typeof value === 'number') {
+      return strings[value];
+    }
+    return value;
+  };
+
+  // Resolves to the message the server sent, as plain JSON data
+  return async (buffer) => {
+    const bytes = new Uint8Array(buffer);
+    const body = bytes[0] === 1 ? await inflate(bytes.subarray(1)) : bytes.subarray(1);
+    const { d, m } = unpack(body);
+    strings.push(...d);
+    return expand(m);
+  };
+};